@@ -17,6 +17,12 @@ import logging
 from glob import glob
 from copy import deepcopy
 
+# If msgpack is installed, we ask the server for (smaller) msgpack responses
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 logger = logging.getLogger(__name__)
 
 
@@ -28,6 +34,9 @@ class SpackMonitorClient:
         self.username = os.environ.get("SPACKMON_USER", username)
         self.session = requests.Session()
         self.headers = {}
+        self.accept = "application/json"
+        if msgpack:
+            self.accept = "application/msgpack, application/json;q=0.9"
 
     def set_header(self, name, value):
         self.headers.update({name: value})
@@ -49,6 +58,7 @@ class SpackMonitorClient:
             self.headers = {"Authorization": self.headers["Authorization"]}
         else:
             self.headers = {}
+        self.headers["Accept"] = self.accept
 
     def do_request(self, endpoint, method="GET", data=None, headers=None):
         """
@@ -59,6 +69,9 @@ class SpackMonitorClient:
         self.reset()
 
         headers = headers or {}
+        headers.setdefault("Accept", self.accept)
+        if data is not None:
+            headers.setdefault("Content-Type", "application/json")
         url = "%s/%s" % (self.baseurl, endpoint)
 
         # Make the request and return to calling function, unless requires auth
@@ -70,7 +83,8 @@ class SpackMonitorClient:
 
         # Otherwise, authenticate the request and retry
         if self.authenticate_request(response):
-            return self.session.request(method, url, data=data, headers=self.headers)
+            headers.update(self.headers)
+            return self.session.request(method, url, data=data, headers=headers)
         return response
 
     def authenticate_request(self, originalResponse):
@@ -123,12 +137,22 @@ class SpackMonitorClient:
         self.headers.update({"Authorization": "Bearer %s" % token})
         return True
 
+    def load(self, response):
+        """
+        Load the data from a response, which is msgpack if we asked for it
+        and the server supports it, and otherwise json.
+        """
+        content_type = response.headers.get("Content-Type", "")
+        if msgpack and content_type.startswith("application/msgpack"):
+            return msgpack.unpackb(response.content, raw=False)
+        return response.json()
+
     # Functions correspond to endpoints
     def service_info(self):
         """get the service information endpoint"""
         # Base endpoint provides service info
         response = self.do_request("")
-        return response.json()
+        return self.load(response)
 
     def upload_specfile(self, filename, spack_version):
         """Given a spec file (must be json) and the spack version,
@@ -138,21 +162,35 @@ class SpackMonitorClient:
         data = {"spec": spec["spec"], "spack_version": spack_version}
         return self.do_request("specs/new/", "POST", data=json.dumps(data))
 
+    def get_missing_specs(self, specs, spack_version):
+        """
+        Given a list of spec full hashes and the spack version, return
+        the ones that the server doesn't have (and need to be uploaded)
+        """
+        data = {
+            "specs": [
+                {"full_hash": full_hash, "spack_version": spack_version}
+                for full_hash in specs
+            ]
+        }
+        response = self.do_request("specs/exists/", "POST", data=json.dumps(data))
+        return [x["full_hash"] for x in self.load(response)["data"]["missing"]]
+
     def get_specs_by_name(self, name):
         """
         Get specs based on te name of the package
         """
-        return self.do_request("specs/name/%s/" % name, "GET").json()
+        return self.load(self.do_request("specs/name/%s/" % name, "GET"))
 
     def get_analyzer_results_spec(self, spec_id, analyzer=None):
         """
         Get a listing of analyzer results (ids to lookup) based on a spec id)
         """
         if analyzer:
-            return self.do_request(
-                "specs/%s/attributes/%s/" % (spec_id, analyzer), "GET"
-            ).json()
-        return self.do_request("specs/%s/attributes/" % spec_id, "GET").json()
+            return self.load(
+                self.do_request("specs/%s/attributes/%s/" % (spec_id, analyzer), "GET")
+            )
+        return self.load(self.do_request("specs/%s/attributes/" % spec_id, "GET"))
 
     def download_analyzer_result(self, result_id, return_type="json"):
         """
@@ -163,7 +201,7 @@ class SpackMonitorClient:
             print("There is no result for that identifier.")
             return
         if return_type == "json":
-            return result.json()
+            return self.load(result)
         elif return_type == "binary":
             return result.content
         return result.text
@@ -174,15 +212,15 @@ class SpackMonitorClient:
         """
         result = self.do_request("specs/%s/splices/contenders/" % spec_id, "GET")
         if result.status_code == 200:
-            return result.json()
+            return self.load(result)
 
     def get_splice_contenders(self, result_id):
         """
         Get splice contenders for a result based on id.
         """
-        return self.do_request(
-            "attributes/%s/splice/contenders/" % result_id, "GET"
-        ).json()
+        return self.load(
+            self.do_request("attributes/%s/splice/contenders/" % result_id, "GET")
+        )
 
     def get_splice_predictions(self, result_id, splice_id):
         """
@@ -196,9 +234,12 @@ class SpackMonitorClient:
          'A_id': 148,
          'B_id': 358},
         """
-        return self.do_request(
-            "analysis/splices/attribute/%s/spec/%s/" % (result_id, splice_id), "GET"
-        ).json()
+        return self.load(
+            self.do_request(
+                "analysis/splices/attribute/%s/spec/%s/" % (result_id, splice_id),
+                "GET",
+            )
+        )
 
     # Functions to upload save local
     def upload_local_save(self, dirname):
@@ -219,7 +260,7 @@ class SpackMonitorClient:
         metadata = glob("%s%sbuild-metadata*" % (dirname, os.sep))[0]
         metadata = read_json(metadata)
         response = self.do_request("builds/new/", "POST", data=json.dumps(metadata))
-        build = response.json()
+        build = self.load(response)
         build_id = build["data"]["build"]["build_id"]
 
         # Next upload build phases
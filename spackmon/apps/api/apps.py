@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class ApiConfig(AppConfig):
     name = "spackmon.apps.api"
+
+    def ready(self):
+        # Connect signals that invalidate the authentication cache
+        import spackmon.apps.api.auth  # noqa
@@ -6,8 +6,11 @@
 from django.conf import settings
 from django.urls import resolve
 from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 
 from spackmon.settings import cfg
+from spackmon.apps.main.cache import TTLCache
 
 from rest_framework.authtoken.models import Token
 from rest_framework.response import Response
@@ -24,6 +27,9 @@ import jwt
 
 User = get_user_model()
 
+# Per-process cache of authenticated users, keyed by jwt subject or token key
+user_cache = TTLCache(maxsize=cfg.AUTH_CACHE_SIZE, ttl=cfg.AUTH_CACHE_SECONDS)
+
 
 def get_server(request):
     """Given a request, parse it to determine the server name and using http/https"""
@@ -48,9 +54,11 @@ def is_authenticated(request, scopes=None):
     # Scopes default to build
     scopes = scopes or ["build"]
 
-    # Derive the view name from the request PATH_INFO
-    func, two, three = resolve(request.META["PATH_INFO"])
-    view_name = "%s.%s" % (func.__module__, func.__name__)
+    # Derive the view name from the match Django already resolved for the request
+    match = getattr(request, "resolver_match", None) or resolve(
+        request.META["PATH_INFO"]
+    )
+    view_name = "%s.%s" % (match.func.__module__, match.func.__name__)
 
     # If authentication is disabled, return the original view
     if cfg.DISABLE_AUTHENTICATION or view_name not in settings.AUTHENTICATED_VIEWS:
@@ -135,8 +143,13 @@ def validate_jwt(request):
             return False, None
 
         # The user must exist
+        username = decoded.get("sub")
+        user = user_cache.get("jwt:%s" % username)
+        if user is not None:
+            return True, user
         try:
-            user = User.objects.get(username=decoded.get("sub"))
+            user = User.objects.get(username=username)
+            user_cache.set("jwt:%s" % username, user)
             return True, user
 
         except User.DoesNotExist:
@@ -164,12 +177,15 @@ def get_user(request):
         encoded = re.sub("basic", "", header, flags=re.IGNORECASE).strip()
         decoded = base64.b64decode(encoded).decode("utf-8")
         username, token = decoded.split(":", 1)
-        try:
-            token = Token.objects.get(key=token)
-            if token.user.username == username:
-                return token.user
-        except:
-            pass
+        user = user_cache.get("token:%s" % token)
+        if user is None:
+            try:
+                user = Token.objects.select_related("user").get(key=token).user
+                user_cache.set("token:%s" % token, user)
+            except Token.DoesNotExist:
+                return
+        if user.username == username:
+            return user
 
 
 def get_token(request):
@@ -216,3 +232,17 @@ def get_challenge(request, scopes=["build"]):
         DOMAIN_NAME,
         ",".join(scopes),
     )
+
+
+@receiver(post_save, sender=Token)
+@receiver(post_delete, sender=Token)
+def invalidate_token_cache(sender, instance=None, **kwargs):
+    """A regenerated (deleted) token must stop authenticating right away."""
+    user_cache.delete("token:%s" % instance.key)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_user_cache(sender, instance=None, **kwargs):
+    """Drop any cached copy of a user that is changed (e.g., deactivated)."""
+    user_cache.evict(lambda user: user.pk == instance.pk)
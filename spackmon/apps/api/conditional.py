@@ -0,0 +1,71 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.db.models import Count, Max
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from spackmon.settings import cfg
+
+from functools import wraps
+
+import hashlib
+
+
+def get_freshness(request, get_queryset, kwargs):
+    """Return the number of objects a view returns and their latest modify
+    date, with one aggregate query that is shared by the etag and last
+    modified functions for a request.
+    """
+    if not hasattr(request, "_freshness"):
+        request._freshness = get_queryset(request, **kwargs).aggregate(
+            count=Count("id"), modified=Max("modify_date")
+        )
+    return request._freshness
+
+
+def conditional(get_queryset, public=True):
+    """Decorate a GET method of a view to answer conditional requests
+    (If-None-Match or If-Modified-Since) with a 304 Not Modified, based on
+    the objects it returns. get_queryset is called with the request and the
+    view kwargs. The ETag is a digest of the url, the accepted media type, and
+    the count and latest modify date of the objects, so it changes whenever
+    an object is added or updated. Responses can be cached for
+    API_CACHE_MAX_AGE seconds, by proxies too if public is True.
+    """
+
+    def etag(request, *args, **kwargs):
+        freshness = get_freshness(request, get_queryset, kwargs)
+        content = "%s|%s|%s|%s" % (
+            request.get_full_path(),
+            request.META.get("HTTP_ACCEPT", ""),
+            freshness["count"],
+            freshness["modified"].isoformat() if freshness["modified"] else "",
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def last_modified(request, *args, **kwargs):
+        return get_freshness(request, get_queryset, kwargs)["modified"]
+
+    def decorator(func):
+        func = method_decorator(
+            condition(etag_func=etag, last_modified_func=last_modified)
+        )(func)
+
+        @wraps(func)
+        def wrapped(self, request, *args, **kwargs):
+            response = func(self, request, *args, **kwargs)
+            if response.status_code in [200, 304]:
+                scope = "public" if public else "private"
+                patch_cache_control(
+                    response, max_age=cfg.API_CACHE_MAX_AGE or 0, **{scope: True}
+                )
+                patch_vary_headers(response, ["Accept"])
+            return response
+
+        return wrapped
+
+    return decorator
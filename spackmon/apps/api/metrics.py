@@ -0,0 +1,134 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from collections import OrderedDict
+
+import bisect
+import threading
+
+# Upper bounds for histogram buckets, the last bucket (+Inf) is implied
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000)
+
+# Metric name -> (help text, buckets)
+METRICS = OrderedDict(
+    [
+        ("request_duration_seconds", ("Total request latency", SECONDS_BUCKETS)),
+        ("db_duration_seconds", ("Time spent in SQL queries", SECONDS_BUCKETS)),
+        (
+            "serialization_duration_seconds",
+            ("Time spent rendering the response", SECONDS_BUCKETS),
+        ),
+        ("db_queries", ("Number of SQL queries per request", COUNT_BUCKETS)),
+    ]
+)
+
+
+class Histogram:
+    """A cumulative histogram in the style of a Prometheus histogram."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0
+        self.count = 0
+        self.max = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def cumulative(self):
+        """Yield (upper bound, cumulative count) pairs, ending with +Inf"""
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield bound, total
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.sum,
+            "mean": self.sum / self.count if self.count else 0,
+            "max": self.max,
+        }
+
+
+class MetricsRegistry:
+    """Aggregate request metrics per view for the lifetime of the process.
+    Each worker process keeps its own registry.
+    """
+
+    prefix = "spackmon"
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.histograms = {name: {} for name in METRICS}
+            self.counters = {}
+
+    def observe(self, name, view, value):
+        with self._lock:
+            histograms = self.histograms[name]
+            if view not in histograms:
+                histograms[view] = Histogram(METRICS[name][1])
+            histograms[view].observe(value)
+
+    def increment(self, name, amount=1, **labels):
+        """Increment a named counter, e.g., a count of times a code path is taken"""
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def to_dict(self):
+        """A summary of each metric keyed by view, for the staff json endpoint"""
+        with self._lock:
+            views = {}
+            for name, histograms in self.histograms.items():
+                for view, histogram in histograms.items():
+                    views.setdefault(view, {})[name] = histogram.to_dict()
+            counters = [
+                {"name": name, "labels": dict(labels), "value": value}
+                for (name, labels), value in self.counters.items()
+            ]
+        return {"views": views, "counters": counters}
+
+    def to_prometheus(self):
+        """Render all metrics in the Prometheus text exposition format"""
+        lines = []
+        with self._lock:
+            for name, (help_text, _) in METRICS.items():
+                metric = "%s_%s" % (self.prefix, name)
+                lines.append("# HELP %s %s" % (metric, help_text))
+                lines.append("# TYPE %s histogram" % metric)
+                for view, histogram in sorted(self.histograms[name].items()):
+                    for bound, count in histogram.cumulative():
+                        lines.append(
+                            '%s_bucket{view="%s",le="%s"} %s'
+                            % (metric, view, bound, count)
+                        )
+                    lines.append('%s_sum{view="%s"} %s' % (metric, view, histogram.sum))
+                    lines.append(
+                        '%s_count{view="%s"} %s' % (metric, view, histogram.count)
+                    )
+
+            seen = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = "%s_%s_total" % (self.prefix, name)
+                if metric not in seen:
+                    lines.append("# TYPE %s counter" % metric)
+                    seen.add(metric)
+                labels = ",".join('%s="%s"' % (k, v) for k, v in labels)
+                lines.append("%s{%s} %s" % (metric, labels, value))
+        return "\n".join(lines) + "\n"
+
+
+# The registry shared by the middleware and the metrics endpoints
+registry = MetricsRegistry()
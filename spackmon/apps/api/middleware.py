@@ -0,0 +1,145 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.db import connection
+
+from spackmon.settings import cfg
+from spackmon.apps.main.models import RequestProfile
+from .metrics import registry
+
+import cProfile
+import logging
+import marshal
+import random
+import time
+import zlib
+
+logger = logging.getLogger(__name__)
+
+# Stored profiles keep at most this many queries in their query log
+MAX_LOGGED_QUERIES = 500
+
+
+def get_view_name(request):
+    """Derive a view name (module.function) from the resolved request, if any"""
+    match = getattr(request, "resolver_match", None)
+    if not match:
+        return
+    return "%s.%s" % (match.func.__module__, match.func.__name__)
+
+
+class QueryRecorder:
+    """A database execute wrapper that counts and times queries, and
+    optionally keeps a log of the sql and time for each.
+    """
+
+    def __init__(self, log=False):
+        self.count = 0
+        self.seconds = 0
+        self.queries = [] if log else None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            seconds = time.perf_counter() - start
+            self.count += 1
+            self.seconds += seconds
+            if self.queries is not None and len(self.queries) < MAX_LOGGED_QUERIES:
+                self.queries.append({"sql": sql, "seconds": seconds})
+
+
+class InstrumentationMiddleware:
+    """Record query count, database time, serialization time and total latency
+    for each view. This is enabled with ENABLE_INSTRUMENTATION in settings.yml
+    and the results are exposed at /metrics and the staff metrics endpoint.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        request._serialization_seconds = 0
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            response = self.get_response(request)
+        total = time.perf_counter() - start
+
+        view_name = get_view_name(request)
+        if view_name:
+            registry.observe("request_duration_seconds", view_name, total)
+            registry.observe("db_duration_seconds", view_name, recorder.seconds)
+            registry.observe("db_queries", view_name, recorder.count)
+            registry.observe(
+                "serialization_duration_seconds",
+                view_name,
+                request._serialization_seconds,
+            )
+        return response
+
+    def process_template_response(self, request, response):
+        """Rest framework and template responses are rendered lazily, so we
+        render here to be able to time it. Django skips rendering again.
+        """
+        start = time.perf_counter()
+        response.render()
+        request._serialization_seconds = time.perf_counter() - start
+        return response
+
+
+class ProfilingMiddleware:
+    """Profile a sample of requests (PROFILE_SAMPLE_RATE) with cProfile, and
+    store the profile for any that take longer than the threshold set by
+    PROFILE_SLOW_REQUESTS_SECONDS, along with the view and its query log.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = float(cfg.PROFILE_SLOW_REQUESTS_SECONDS)
+        self.sample_rate = (
+            1 if cfg.PROFILE_SAMPLE_RATE is None else float(cfg.PROFILE_SAMPLE_RATE)
+        )
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+
+        profiler = cProfile.Profile()
+        recorder = QueryRecorder(log=True)
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            profiler.enable()
+            try:
+                response = self.get_response(request)
+            finally:
+                profiler.disable()
+        duration = time.perf_counter() - start
+
+        if duration >= self.threshold:
+            self.save_profile(request, profiler, recorder, duration)
+        return response
+
+    def save_profile(self, request, profiler, recorder, duration):
+        """Save a compressed profile, a failure here should not fail the request"""
+        match = getattr(request, "resolver_match", None)
+        args = {"query": request.GET.dict()}
+        if match:
+            args.update({"args": list(match.args), "kwargs": match.kwargs})
+        try:
+            profiler.create_stats()
+            RequestProfile.objects.create(
+                view_name=get_view_name(request) or "unresolved",
+                path=request.path[:500],
+                method=request.method,
+                args=args,
+                duration=duration,
+                query_count=recorder.count,
+                queries=recorder.queries,
+                profile=zlib.compress(marshal.dumps(profiler.stats)),
+            )
+        except Exception as exc:
+            logger.warning("Could not save profile for %s: %s" % (request.path, exc))
@@ -0,0 +1,78 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.http import StreamingHttpResponse
+from rest_framework.decorators import action
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.encoders import JSONEncoder
+
+import json
+import zlib
+
+# The number of rows loaded (and serialized) at once for an export
+EXPORT_CHUNK_SIZE = 2000
+
+
+class IdCursorPagination(CursorPagination):
+    """Paginate by id with an opaque cursor (?cursor=) instead of an offset.
+    Unlike limit and offset, a page doesn't need to count the table or skip
+    over the rows before it, so any page is an indexed range query.
+    """
+
+    ordering = "id"
+    page_size_query_param = "limit"
+    max_page_size = 1000
+
+
+def iter_chunks(queryset, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield lists of objects ordered by id, chunk_size at a time. We page by
+    id (and not with .iterator) so prefetch_related on the queryset is still
+    used for each chunk, and no cursor is held open between chunks.
+    """
+    last_id = None
+    while True:
+        chunk = queryset.order_by("id")
+        if last_id is not None:
+            chunk = chunk.filter(id__gt=last_id)
+        chunk = list(chunk[:chunk_size])
+        if not chunk:
+            return
+        yield chunk
+        last_id = chunk[-1].id
+
+
+def iter_ndjson(queryset, get_serializer, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yield each object in a queryset serialized as a line of json"""
+    for chunk in iter_chunks(queryset, chunk_size):
+        data = get_serializer(chunk, many=True).data
+        yield "".join(json.dumps(item, cls=JSONEncoder) + "\n" for item in data)
+
+
+def gzip_stream(chunks):
+    """Compress a stream of strings as one gzip member"""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode("utf-8"))
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+class ExportMixin:
+    """Add an export (GET <prefix>/export/) to a viewset, which streams every
+    object as newline delimited json, gzip compressed if the client accepts
+    it. Memory is bounded by the chunk size however large the table is.
+    """
+
+    @action(detail=False, methods=["get"])
+    def export(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        chunks = iter_ndjson(queryset, self.get_serializer)
+        response = StreamingHttpResponse(content_type="application/x-ndjson")
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            chunks = gzip_stream(chunks)
+            response["Content-Encoding"] = "gzip"
+        response.streaming_content = chunks
+        return response
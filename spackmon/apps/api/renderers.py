@@ -0,0 +1,159 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.utils.cache import patch_vary_headers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import BaseParser
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+from datetime import timezone
+import gzip
+import json
+
+# msgpack and cbor2 are optional, and the settings only enable the renderers
+# and parsers for the libraries that are installed
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import cbor2
+except ImportError:
+    cbor2 = None
+
+
+def get_request_data(request):
+    """Return the data sent with a request. Clients (e.g., spack) send json
+    without a Content-Type, or with the form default of urllib, so we parse
+    those bodies as json, and other types (e.g., application/json, msgpack
+    or CBOR) with the parser for the type.
+    """
+    media_type = request.content_type.split(";")[0].strip().lower()
+    if media_type not in ["", "application/x-www-form-urlencoded"]:
+        return request.data
+    if not request.body:
+        return {}
+    try:
+        return json.loads(request.body)
+    except ValueError as exc:
+        if media_type:
+            return request.data
+        raise ParseError("JSON parse error - %s" % exc)
+
+
+def encode_value(value):
+    """Encode values that msgpack doesn't know (e.g., datetimes, decimals)
+    the same way as the json renderer.
+    """
+    return JSONEncoder().default(value)
+
+
+class MsgPackRenderer(BaseRenderer):
+    """Render a response as msgpack (Accept: application/msgpack)"""
+
+    media_type = "application/msgpack"
+    format = "msgpack"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return msgpack.packb(data, default=encode_value, use_bin_type=True)
+
+
+class CBORRenderer(BaseRenderer):
+    """Render a response as CBOR (Accept: application/cbor)"""
+
+    media_type = "application/cbor"
+    format = "cbor"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return cbor2.dumps(
+            data,
+            timezone=timezone.utc,
+            default=lambda encoder, value: encoder.encode(encode_value(value)),
+        )
+
+
+class NDJSONGzipRenderer(BaseRenderer):
+    """Render a list as newline delimited json, one item per line (Accept:
+    application/x-ndjson), gzip compressed if the client accepts it. For a
+    paginated list we render the results, and the next page is in the Link
+    header.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        request = (renderer_context or {}).get("request")
+        response = (renderer_context or {}).get("response")
+        if isinstance(data, dict) and isinstance(data.get("results"), list):
+            if response is not None and data.get("next"):
+                response["Link"] = '<%s>; rel="next"' % data["next"]
+            data = data["results"]
+        if not isinstance(data, list):
+            data = [data]
+
+        content = "".join(json.dumps(item, cls=JSONEncoder) + "\n" for item in data)
+        content = content.encode("utf-8")
+        if response is None or request is None:
+            return content
+        patch_vary_headers(response, ["Accept-Encoding"])
+        if "gzip" in request.META.get("HTTP_ACCEPT_ENCODING", ""):
+            response["Content-Encoding"] = "gzip"
+            content = gzip.compress(content)
+        return content
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Accept text/event-stream for a view that streams server-sent events.
+    The view streams the events itself, so this only renders other responses
+    (e.g., errors) as a single event.
+    """
+
+    media_type = "text/event-stream"
+    format = "sse"
+    charset = "utf-8"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        return ("data: %s\n\n" % json.dumps(data, cls=JSONEncoder)).encode("utf-8")
+
+
+class MsgPackParser(BaseParser):
+    """Parse a msgpack request body (Content-Type: application/msgpack)"""
+
+    media_type = "application/msgpack"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return msgpack.unpackb(stream.read(), raw=False)
+        except Exception as exc:
+            raise ParseError("msgpack parse error - %s" % exc)
+
+
+class CBORParser(BaseParser):
+    """Parse a CBOR request body (Content-Type: application/cbor)"""
+
+    media_type = "application/cbor"
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        try:
+            return cbor2.loads(stream.read())
+        except Exception as exc:
+            raise ParseError("CBOR parse error - %s" % exc)
@@ -75,11 +75,46 @@ urlpatterns = [
         api_views.ServiceInfo.as_view(),
         name="service_info",
     ),
+    # Request metrics (only populated with ENABLE_INSTRUMENTATION)
+    path("metrics", api_views.PrometheusMetrics.as_view(), name="metrics"),
+    path(
+        "%s/metrics/" % cfg.URL_API_PREFIX,
+        api_views.MetricsSummary.as_view(),
+        name="metrics_summary",
+    ),
+    # Profiles of slow requests (with PROFILE_SLOW_REQUESTS_SECONDS)
+    path(
+        "%s/profiles/" % cfg.URL_API_PREFIX,
+        api_views.RequestProfiles.as_view(),
+        name="request_profiles",
+    ),
+    path(
+        "%s/profiles/<int:profile_id>/" % cfg.URL_API_PREFIX,
+        api_views.RequestProfileDetail.as_view(),
+        name="request_profile_detail",
+    ),
+    path(
+        "%s/profiles/<int:profile_id>/download/" % cfg.URL_API_PREFIX,
+        api_views.DownloadRequestProfile.as_view(),
+        name="download_request_profile",
+    ),
     path(
         "%s/specs/new/" % cfg.URL_API_PREFIX,
         api_views.NewSpec.as_view(),
         name="new_spec",
     ),
+    # Given the specs a client has (full hash and spack version), which are missing?
+    path(
+        "%s/specs/exists/" % cfg.URL_API_PREFIX,
+        api_views.CheckSpecs.as_view(),
+        name="check_specs",
+    ),
+    # Register a build environment to get an id to provide for new builds
+    path(
+        "%s/environments/new/" % cfg.URL_API_PREFIX,
+        api_views.NewBuildEnvironment.as_view(),
+        name="new_build_environment",
+    ),
     # The build can already exist (e.g., if being re-run)
     path(
         "%s/builds/new/" % cfg.URL_API_PREFIX,
@@ -96,18 +131,64 @@ urlpatterns = [
         api_views.UpdatePhaseStatus.as_view(),
         name="update_phase_status",
     ),
+    # A feed of build changes (json long poll or server-sent events)
+    path(
+        "%s/builds/changes/" % cfg.URL_API_PREFIX,
+        api_views.BuildChanges.as_view(),
+        name="build_changes",
+    ),
+    # The most common errors (or warnings) across builds
+    path(
+        "%s/builds/events/top/" % cfg.URL_API_PREFIX,
+        api_views.TopBuildEvents.as_view(),
+        name="top_build_events",
+    ),
+    # Append a chunk of output (at a byte offset) to a running phase
+    path(
+        "%s/builds/phases/append/" % cfg.URL_API_PREFIX,
+        api_views.AppendPhaseOutput.as_view(),
+        name="append_phase_output",
+    ),
     # Analyze to add metadata to builds
     path(
         "%s/analyze/builds/" % cfg.URL_API_PREFIX,
         api_views.UpdateBuildMetadata.as_view(),
         name="update_build_metadata",
     ),
+    # Find specs by a name and/or full hash prefix (e.g., zlib/abc123)
+    path(
+        "%s/specs/search/" % cfg.URL_API_PREFIX,
+        api_views.SpecSearch.as_view(),
+        name="spec_search",
+    ),
     # Get all specs based on a package name
     path(
         "%s/specs/name/<str:name>/" % cfg.URL_API_PREFIX,
         api_views.SpecByName.as_view(),
         name="spec_by_name",
     ),
+    # All dependents or dependencies of a spec (at any depth, or ?depth=)
+    path(
+        "%s/specs/<int:spec_id>/dependents/" % cfg.URL_API_PREFIX,
+        api_views.SpecDependents.as_view(),
+        name="spec_dependents",
+    ),
+    path(
+        "%s/specs/<int:spec_id>/dependencies/" % cfg.URL_API_PREFIX,
+        api_views.SpecDependencies.as_view(),
+        name="spec_dependencies",
+    ),
+    # Export a spec and its dependencies in the spack nodes format
+    path(
+        "%s/specs/<int:spec_id>/nodes/" % cfg.URL_API_PREFIX,
+        api_views.SpecNodes.as_view(),
+        name="spec_nodes",
+    ),
+    path(
+        "%s/specs/hash/<str:full_hash>/nodes/" % cfg.URL_API_PREFIX,
+        api_views.SpecNodes.as_view(),
+        name="spec_nodes_by_hash",
+    ),
     # Parse through specs -> builds -> install files and return attributes
     # Optionally an analyzer can be provided to filter
     # If the requester wants data for an attribute, it must be requested by id.
@@ -146,6 +227,18 @@ urlpatterns = [
         api_views.SpecSpliceContenders.as_view(),
         name="spec_splice_contenders",
     ),
+    # Find the libraries that define or import a symbol
+    path(
+        "%s/symbols/" % cfg.URL_API_PREFIX,
+        api_views.SymbolLookup.as_view(),
+        name="symbol_lookup",
+    ),
+    # Compare the symbols that two libraries define
+    path(
+        "%s/symbols/diff/" % cfg.URL_API_PREFIX,
+        api_views.SymbolDiff.as_view(),
+        name="symbol_diff",
+    ),
 ]
 
 
@@ -1,11 +1,32 @@
 from .auth import GetAuthToken
 from .base import ServiceInfo
-from .specs import NewSpec, SpecByName, SpecAttributes, SpecSpliceContenders
+from .specs import (
+    CheckSpecs,
+    NewSpec,
+    SpecByName,
+    SpecAttributes,
+    SpecDependencies,
+    SpecDependents,
+    SpecNodes,
+    SpecSearch,
+    SpecSpliceContenders,
+)
 from .attributes import (
     AttributeSpliceContenders,
     AttributeSplicePredictions,
     DownloadAttribute,
 )
-from .builds import UpdateBuildStatus, UpdatePhaseStatus, NewBuild
+from .builds import (
+    AppendPhaseOutput,
+    BuildChanges,
+    UpdateBuildStatus,
+    UpdatePhaseStatus,
+    NewBuild,
+    NewBuildEnvironment,
+    TopBuildEvents,
+)
 from .analyze import UpdateBuildMetadata
+from .metrics import MetricsSummary, PrometheusMetrics
+from .symbols import SymbolDiff, SymbolLookup
+from .profiles import RequestProfiles, RequestProfileDetail, DownloadRequestProfile
 from .tables import BuildsTable
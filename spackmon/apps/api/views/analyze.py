@@ -16,8 +16,7 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ..auth import is_authenticated
-
-import json
+from ..renderers import get_request_data
 
 
 class UpdateBuildMetadata(APIView):
@@ -43,15 +42,13 @@ class UpdateBuildMetadata(APIView):
     def post(self, request, *args, **kwargs):
         """POST /ms1/builds/metadata/ to add or update a package metadata"""
 
-        print("POST /ms1/builds/metadata/")
-
         # If allow_continue False, return response
         allow_continue, response, _ = is_authenticated(request)
         if not allow_continue:
             return response
 
         # Get the data, including output, error, environ, manifest, config
-        data = json.loads(request.body)
+        data = get_request_data(request)
         build_id = data.get("build_id")
         if not build_id:
             return Response(status=400, data={"message": "Missing required build_id."})
@@ -14,6 +14,7 @@ from spackmon.apps.main.models import Spec, Attribute, Build
 from spackmon.apps.main.analysis.symbols import run_symbols_splice
 from rest_framework.response import Response
 from rest_framework.views import APIView
+from ..conditional import conditional
 from .serializers import SpecSerializer
 
 
@@ -70,7 +71,9 @@ class AttributeSpliceContenders(APIView):
         )
         specs = [
             SpecSerializer(x).data
-            for x in Spec.objects.filter(id__in=dep_ids).distinct()
+            for x in Spec.objects.filter(id__in=dep_ids)
+            .distinct()
+            .prefetch_related("dependencies")
             if x
         ]
         return Response(status=200, data=specs)
@@ -82,7 +85,7 @@ class DownloadAttribute(APIView):
     permission_classes = []
     allowed_methods = ("GET",)
 
-    @never_cache
+    @conditional(lambda request, attr_id=None: Attribute.objects.filter(id=attr_id))
     @method_decorator(
         ratelimit(
             key="ip",
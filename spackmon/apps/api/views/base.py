@@ -27,8 +27,6 @@ class ServiceInfo(RatelimitMixin, APIView):
     renderer_classes = (JSONRenderer,)
 
     def get(self, request):
-        print("GET /ms1/")
-
         data = {
             "id": "spackmon",
             "status": "running",
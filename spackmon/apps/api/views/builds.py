@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 from django.conf import settings
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 
 from ratelimit.decorators import ratelimit
@@ -11,22 +12,42 @@ from django.views.decorators.cache import never_cache
 from django.utils.decorators import method_decorator
 
 from spackmon.apps.main.tasks import (
+    append_build_phase_output,
+    get_build_changes,
+    get_top_build_events,
     update_build_status,
     update_build_phase,
     get_build,
     import_configuration,
+    register_build_environment,
 )
 from spackmon.apps.main.utils import BUILD_STATUS
 from spackmon.apps.main.models import Build
+from spackmon.settings import cfg
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from ..auth import is_authenticated
+from ..renderers import EventStreamRenderer, get_request_data
 
 import json
+import threading
+import time
 
 BUILD_STATUSES = [x[0] for x in BUILD_STATUS]
 
+# The most events and the longest window for the top errors and warnings
+TOP_EVENTS_MAX = 100
+TOP_EVENTS_MAX_DAYS = 90
+BUILD_ENVIRONMENT_FIELDS = [
+    "host_os",
+    "platform",
+    "host_target",
+    "hostname",
+    "kernel_version",
+]
+
 
 def get_build_environment(data):
     """Given a request, get the build environment. Return None if we are missing
@@ -52,6 +73,66 @@ def get_build_environment(data):
     return build_environment
 
 
+def get_build_environment_id(data):
+    """Given a request with a build_environment_id (from registering the build
+    environment), get the spec and environment id. Return None if we are
+    missing something.
+    """
+    build_environment = {}
+    for field in ["build_environment_id", "spack_version", "full_hash"]:
+        value = data.get(field)
+        if not value:
+            return
+        build_environment[field] = value
+    try:
+        build_environment["build_environment_id"] = int(
+            build_environment["build_environment_id"]
+        )
+    except (TypeError, ValueError):
+        return
+    return build_environment
+
+
+class NewBuildEnvironment(APIView):
+    """Register a build environment, and return a stable id for it. A client
+    can provide the id to create builds instead of the environment, so many
+    builds from the same host only resolve the environment once.
+    """
+
+    permission_classes = []
+    allowed_methods = ("POST",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="POST",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def post(self, request, *args, **kwargs):
+        """POST /ms1/environments/new/ to register a build environment"""
+
+        # If allow_continue False, return response
+        allow_continue, response, _ = is_authenticated(request)
+        if not allow_continue:
+            return response
+
+        data = get_request_data(request)
+        build_environment = {}
+        for field in BUILD_ENVIRONMENT_FIELDS:
+            if not data.get(field):
+                return Response(
+                    status=400,
+                    data={"message": "Missing required build environment data."},
+                )
+            build_environment[field] = data[field]
+
+        result = register_build_environment(**build_environment)
+        return Response(status=result["code"], data=result)
+
+
 class UpdateBuildStatus(APIView):
     """Given a spec, update the status of the BuildTask."""
 
@@ -76,7 +157,7 @@ class UpdateBuildStatus(APIView):
             return response
 
         # Get the task id and status to cancel
-        data = json.loads(request.body)
+        data = get_request_data(request)
         status = data.get("status")
         build_id = data.get("build_id")
 
@@ -132,10 +213,13 @@ class NewBuild(APIView):
         if not allow_continue:
             return response
 
-        # Get the complete build environment
-        data = json.loads(request.body)
+        # Get the complete build environment, or a registered environment id
+        data = get_request_data(request)
         tags = data.get("tags")
-        build_environment = get_build_environment(data)
+        if data.get("build_environment_id"):
+            build_environment = get_build_environment_id(data)
+        else:
+            build_environment = get_build_environment(data)
         if not build_environment:
             return Response(
                 status=400, data={"message": "Missing required build environment data."}
@@ -173,15 +257,13 @@ class UpdatePhaseStatus(APIView):
     def post(self, request, *args, **kwargs):
         """POST /ms1/phases/metadata/ to update one or more tasks"""
 
-        print("POST /ms1/builds/phases/update/")
-
         # If allow_continue False, return response
         allow_continue, response, user = is_authenticated(request)
         if not allow_continue:
             return response
 
         # Extra data here includes output, phase_name, and status
-        data = json.loads(request.body)
+        data = get_request_data(request)
         build_id = data.get("build_id")
         if not build_id:
             return Response(status=400, data={"message": "Missing required build_id."})
@@ -209,3 +291,197 @@ class UpdatePhaseStatus(APIView):
         # Update the phase
         data = update_build_phase(build, phase_name, status, output)
         return Response(status=data["code"], data=data)
+
+
+class AppendPhaseOutput(APIView):
+    """Given a chunk of output for a phase that is running, append it."""
+
+    permission_classes = []
+    allowed_methods = ("POST",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="POST",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def post(self, request, *args, **kwargs):
+        """POST /ms1/builds/phases/append/ to append output to a phase"""
+
+        # If allow_continue False, return response
+        allow_continue, response, user = is_authenticated(request)
+        if not allow_continue:
+            return response
+
+        data = get_request_data(request)
+        build_id = data.get("build_id")
+        phase_name = data.get("phase_name")
+        offset = data.get("offset")
+        output = data.get("output")
+
+        # All of the above are required!
+        if not build_id or not phase_name:
+            return Response(
+                status=400,
+                data={"message": "build_id and phase_name are required."},
+            )
+        if not isinstance(offset, int) or offset < 0 or not isinstance(output, str):
+            return Response(
+                status=400,
+                data={"message": "A byte offset and the output string are required."},
+            )
+
+        build = get_object_or_404(Build, pk=build_id)
+
+        # The requesting user must own the build
+        if build.owner != user:
+            return Response(
+                status=400,
+                data={"message": "You do not own the build and cannot update it."},
+            )
+
+        data = append_build_phase_output(build, phase_name, offset, output)
+        return Response(status=data["code"], data=data)
+
+
+# Seconds between checks for new changes, the longest a client can wait for
+# changes (a long poll), between keepalives of a stream, and before a client
+# reconnects to a stream that ended
+CHANGES_POLL_SECONDS = 1
+CHANGES_MAX_WAIT_SECONDS = 60
+CHANGES_KEEPALIVE_SECONDS = 15
+CHANGES_RETRY_SECONDS = 10
+
+# A request that waits for changes holds a worker (or thread), so each process
+# only serves a few at once, and the rest return what they have right away
+waiting = threading.BoundedSemaphore(max(int(cfg.CHANGES_MAX_WAITING), 0))
+
+
+def stream_build_changes(after, wait, **filters):
+    """Yield server-sent events for build changes for up to wait seconds. The
+    id of each event is the resume token, so a client (e.g., EventSource)
+    that reconnects continues where it left off with Last-Event-ID.
+    """
+    result = get_build_changes(after, **filters)
+    yield "retry: %s\n" % (CHANGES_RETRY_SECONDS * 1000)
+    yield "event: ready\nid: %s\ndata: {}\n\n" % (
+        result["after"] if after is None else after
+    )
+    acquired = wait > 0 and waiting.acquire(blocking=False)
+    try:
+        started = last_sent = time.monotonic()
+        while True:
+            for change in result["changes"]:
+                yield "id: %s\ndata: %s\n\n" % (
+                    change["id"],
+                    json.dumps(change, default=str),
+                )
+                last_sent = time.monotonic()
+            if not acquired or time.monotonic() - started >= wait:
+                return
+            if time.monotonic() - last_sent >= CHANGES_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+            time.sleep(CHANGES_POLL_SECONDS)
+            result = get_build_changes(result["after"], **filters)
+    finally:
+        if acquired:
+            waiting.release()
+
+
+class BuildChanges(APIView):
+    """A feed of changes to builds, optionally for a tag or owner."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+    renderer_classes = (JSONRenderer, EventStreamRenderer)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/builds/changes/?after=<token>&tag=<tag>&owner=<username>"""
+        streaming = request.accepted_renderer.format == "sse"
+        after = request.GET.get("after", request.META.get("HTTP_LAST_EVENT_ID"))
+        longest = (
+            float(cfg.CHANGES_STREAM_SECONDS) if streaming else CHANGES_MAX_WAIT_SECONDS
+        )
+        wait = request.GET.get("wait", longest if streaming else 0)
+        try:
+            after = int(after) if after not in [None, ""] else None
+            wait = min(max(float(wait), 0), longest)
+        except ValueError:
+            return Response(
+                status=400, data={"message": "after and wait must be numbers."}
+            )
+        filters = {"tag": request.GET.get("tag"), "owner": request.GET.get("owner")}
+
+        # Server-sent events are streamed until the wait is over
+        if streaming:
+            response = StreamingHttpResponse(
+                stream_build_changes(after, wait, **filters),
+                content_type="text/event-stream",
+            )
+            response["X-Accel-Buffering"] = "no"
+            return response
+
+        # Otherwise we long poll, returning as soon as there are changes
+        started = time.monotonic()
+        result = get_build_changes(after, **filters)
+        if result["changes"] or not wait or not waiting.acquire(blocking=False):
+            return Response(status=200, data=result)
+        try:
+            while not result["changes"] and time.monotonic() - started < wait:
+                time.sleep(CHANGES_POLL_SECONDS)
+                result = get_build_changes(result["after"], **filters)
+        finally:
+            waiting.release()
+        return Response(status=200, data=result)
+
+
+class TopBuildEvents(APIView):
+    """The most common errors or warnings across builds in the last days."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/builds/events/top/?kind=error&days=7&package=&compiler="""
+        kind = request.GET.get("kind", "error")
+        if kind not in ["error", "warning"]:
+            return Response(
+                status=400, data={"message": "kind must be error or warning."}
+            )
+        try:
+            days = min(max(int(request.GET.get("days", 7)), 1), TOP_EVENTS_MAX_DAYS)
+            limit = min(max(int(request.GET.get("limit", 10)), 1), TOP_EVENTS_MAX)
+        except ValueError:
+            return Response(
+                status=400, data={"message": "days and limit must be integers."}
+            )
+        result = get_top_build_events(
+            kind,
+            days=days,
+            package=request.GET.get("package"),
+            compiler=request.GET.get("compiler"),
+            limit=limit,
+        )
+        return Response(status=200, data=result)
@@ -0,0 +1,49 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.http import HttpResponse
+from django.views.decorators.cache import never_cache
+
+from spackmon.settings import cfg
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from ..metrics import registry
+
+
+class PrometheusMetrics(APIView):
+    """Expose request metrics in the Prometheus text format for scraping."""
+
+    permission_classes = []
+    throttle_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    def get(self, request, *args, **kwargs):
+        """GET /metrics"""
+        if not cfg.ENABLE_INSTRUMENTATION:
+            return HttpResponse("Instrumentation is not enabled.\n", status=404)
+        return HttpResponse(
+            registry.to_prometheus(), content_type="text/plain; version=0.0.4"
+        )
+
+
+class MetricsSummary(APIView):
+    """Return a json summary of request metrics per view (staff only)."""
+
+    permission_classes = (IsAdminUser,)
+    allowed_methods = ("GET",)
+    renderer_classes = (JSONRenderer,)
+
+    @never_cache
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/metrics/"""
+        if not cfg.ENABLE_INSTRUMENTATION:
+            return Response(
+                status=404, data={"message": "Instrumentation is not enabled."}
+            )
+        return Response(status=200, data=registry.to_dict())
@@ -0,0 +1,89 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.cache import never_cache
+
+from spackmon.apps.main.models import RequestProfile
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+import zlib
+
+# Valid pstats sort keys a staff user can ask for
+PROFILE_SORT_KEYS = ["cumulative", "tottime", "ncalls", "pcalls", "filename"]
+
+
+class RequestProfiles(APIView):
+    """List profiles of slow requests, optionally filtered to a view (staff only)."""
+
+    permission_classes = (IsAdminUser,)
+    allowed_methods = ("GET",)
+
+    @never_cache
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/profiles/"""
+        profiles = RequestProfile.objects.defer("profile", "queries").order_by(
+            "-add_date"
+        )
+        view_name = request.GET.get("view")
+        if view_name:
+            profiles = profiles.filter(view_name=view_name)
+        try:
+            limit = min(max(int(request.GET.get("limit", 100)), 1), 1000)
+        except ValueError:
+            return Response(status=400, data={"message": "limit must be an integer."})
+        return Response(status=200, data=[x.to_dict() for x in profiles[:limit]])
+
+
+class RequestProfileDetail(APIView):
+    """Show the stats, arguments and query log for a profile (staff only)."""
+
+    permission_classes = (IsAdminUser,)
+    allowed_methods = ("GET",)
+
+    @never_cache
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/profiles/<profile_id>/"""
+        profile = get_object_or_404(RequestProfile, id=kwargs.get("profile_id"))
+        sort = request.GET.get("sort", "cumulative")
+        if sort not in PROFILE_SORT_KEYS:
+            return Response(
+                status=400,
+                data={
+                    "message": "Invalid sort. Choices are %s"
+                    % ",".join(PROFILE_SORT_KEYS)
+                },
+            )
+        data = profile.to_dict()
+        data.update(
+            {
+                "args": profile.args,
+                "queries": profile.queries,
+                "stats": profile.stats_text(sort=sort),
+            }
+        )
+        return Response(status=200, data=data)
+
+
+class DownloadRequestProfile(APIView):
+    """Download a profile as a pstats file, e.g., for snakeviz (staff only)."""
+
+    permission_classes = (IsAdminUser,)
+    allowed_methods = ("GET",)
+
+    @never_cache
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/profiles/<profile_id>/download/"""
+        profile = get_object_or_404(RequestProfile, id=kwargs.get("profile_id"))
+        response = HttpResponse(
+            zlib.decompress(profile.profile), content_type="application/octet-stream"
+        )
+        response["Content-Disposition"] = (
+            'attachment; filename="spackmon-profile-%s.prof"' % profile.id
+        )
+        return response
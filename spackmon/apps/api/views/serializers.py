@@ -3,6 +3,7 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+from django.core.exceptions import FieldDoesNotExist
 
 from spackmon.apps.main.models import (
     Attribute,
@@ -23,8 +24,91 @@ from spackmon.apps.main.models import (
 
 from taggit.models import Tag
 
+from ..conditional import conditional
+from ..pagination import ExportMixin
 from .permissions import IsAuthenticated
 from rest_framework import serializers, viewsets
+from rest_framework.exceptions import ValidationError
+
+################################################################################
+# Sparse fieldsets
+################################################################################
+
+
+def get_sparse_fields(request, fields):
+    """Given a request and the fields of a serializer, return the fields that
+    are asked for with ?fields= (a comma separated list) minus any in ?omit=,
+    or None to serialize all fields.
+    """
+    if request is None:
+        return None
+    selected = request.query_params.get("fields")
+    omit = request.query_params.get("omit")
+    if not selected and not omit:
+        return None
+
+    selected = [x.strip() for x in selected.split(",")] if selected else list(fields)
+    omit = [x.strip() for x in omit.split(",")] if omit else []
+    unknown = [x for x in selected + omit if x and x not in fields]
+    if unknown:
+        raise ValidationError(
+            {
+                "message": "Unknown fields %s, choices are %s"
+                % (",".join(unknown), ",".join(fields))
+            }
+        )
+    return [x for x in fields if x in selected and x not in omit]
+
+
+class SparseFieldsSerializer(serializers.ModelSerializer):
+    """A model serializer that only serializes the fields in ?fields= (or
+    all but those in ?omit=) if the request asks for them.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = get_sparse_fields(self.context.get("request"), self.Meta.fields)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class SparseFieldsMixin:
+    """Push ?fields= and ?omit= down to the query for a viewset, so we only
+    load the columns (and prefetch the many to many fields) that are asked for.
+    """
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        fields = get_sparse_fields(
+            self.request, self.get_serializer_class().Meta.fields
+        )
+        if fields is None:
+            return queryset
+
+        # Some fields are computed from other columns
+        for name in list(fields):
+            fields += getattr(self.get_serializer_class(), "sparse_columns", {}).get(
+                name, []
+            )
+
+        columns = []
+        for name in fields:
+            try:
+                field = queryset.model._meta.get_field(name)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.append(name)
+
+        prefetches = [
+            x for x in queryset._prefetch_related_lookups if x.split("__")[0] in fields
+        ]
+        return (
+            queryset.only("id", *columns)
+            .prefetch_related(None)
+            .prefetch_related(*prefetches)
+        )
 
 
 ################################################################################
@@ -34,7 +118,7 @@ from rest_framework import serializers, viewsets
 # Attribute
 
 
-class AttributeSerializer(serializers.ModelSerializer):
+class AttributeSerializer(SparseFieldsSerializer):
     install_file = serializers.PrimaryKeyRelatedField(
         queryset=InstallFile.objects.all(), required=False
     )
@@ -57,10 +141,14 @@ class AttributeSerializer(serializers.ModelSerializer):
         )
 
 
-class AttributeViewSet(viewsets.ModelViewSet):
+class AttributeViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return Attribute.objects.all()
 
+    @conditional(lambda request, pk=None: Attribute.objects.filter(pk=pk), public=False)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
+
     serializer_class = AttributeSerializer
     permission_classes = (IsAuthenticated,)
     http_method_names = ["get", "head"]
@@ -69,7 +157,7 @@ class AttributeViewSet(viewsets.ModelViewSet):
 # Architecture
 
 
-class ArchitectureSerializer(serializers.ModelSerializer):
+class ArchitectureSerializer(SparseFieldsSerializer):
     target = serializers.PrimaryKeyRelatedField(queryset=Target.objects.all())
     label = serializers.SerializerMethodField("get_label")
 
@@ -89,7 +177,7 @@ class ArchitectureSerializer(serializers.ModelSerializer):
         )
 
 
-class ArchitectureViewSet(viewsets.ModelViewSet):
+class ArchitectureViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return Architecture.objects.all()
 
@@ -101,7 +189,7 @@ class ArchitectureViewSet(viewsets.ModelViewSet):
 # Builds
 
 
-class BuildSerializer(serializers.ModelSerializer):
+class BuildSerializer(SparseFieldsSerializer):
 
     tags = serializers.PrimaryKeyRelatedField(
         queryset=Tag.objects.all(), required=False, many=True
@@ -136,9 +224,9 @@ class BuildSerializer(serializers.ModelSerializer):
         )
 
 
-class BuildViewSet(viewsets.ModelViewSet):
+class BuildViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
-        return Build.objects.all()
+        return Build.objects.prefetch_related("tags", "envars")
 
     serializer_class = BuildSerializer
     permission_classes = (IsAuthenticated,)
@@ -148,7 +236,7 @@ class BuildViewSet(viewsets.ModelViewSet):
 # Build Environment
 
 
-class BuildEnvironmentSerializer(serializers.ModelSerializer):
+class BuildEnvironmentSerializer(SparseFieldsSerializer):
 
     label = serializers.SerializerMethodField("get_label")
 
@@ -172,7 +260,7 @@ class BuildEnvironmentSerializer(serializers.ModelSerializer):
         )
 
 
-class BuildEnvironmentViewSet(viewsets.ModelViewSet):
+class BuildEnvironmentViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     permission_classes = (IsAuthenticated,)
 
     def get_queryset(self):
@@ -183,10 +271,39 @@ class BuildEnvironmentViewSet(viewsets.ModelViewSet):
     http_method_names = ["get", "head"]
 
 
-# BuildError
+# BuildError and BuildWarning
+
+
+class BuildEventSerializer(SparseFieldsSerializer):
+    """The context of an event is read from the phase log, so the events of
+    a phase that are serialized together share the phase (and its log).
+    """
+
+    pre_context = serializers.SerializerMethodField()
+    post_context = serializers.SerializerMethodField()
+
+    # The columns the context needs, when the fields are sparse
+    sparse_columns = {
+        name: ["phase", "line_no", "start", "end", "stream", "start_offset"]
+        for name in ["pre_context", "post_context"]
+    }
 
+    def share_phase(self, instance):
+        phases = self.context.setdefault("phases", {})
+        if instance.phase_id not in phases:
+            phases[instance.phase_id] = instance.phase
+        instance.phase = phases[instance.phase_id]
 
-class BuildErrorSerializer(serializers.ModelSerializer):
+    def get_pre_context(self, instance):
+        self.share_phase(instance)
+        return instance.pre_context
+
+    def get_post_context(self, instance):
+        self.share_phase(instance)
+        return instance.post_context
+
+
+class BuildErrorSerializer(BuildEventSerializer):
 
     phase = serializers.PrimaryKeyRelatedField(queryset=BuildPhase.objects.all())
     label = serializers.SerializerMethodField("get_label")
@@ -206,6 +323,9 @@ class BuildErrorSerializer(serializers.ModelSerializer):
             "start",
             "end",
             "text",
+            "stream",
+            "start_offset",
+            "end_offset",
             "pre_context",
             "post_context",
             "add_date",
@@ -214,7 +334,7 @@ class BuildErrorSerializer(serializers.ModelSerializer):
         )
 
 
-class BuildErrorViewSet(viewsets.ModelViewSet):
+class BuildErrorViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return BuildError.objects.all()
 
@@ -223,10 +343,7 @@ class BuildErrorViewSet(viewsets.ModelViewSet):
     http_method_names = ["get", "head"]
 
 
-# BuildWarning
-
-
-class BuildWarningSerializer(serializers.ModelSerializer):
+class BuildWarningSerializer(BuildEventSerializer):
 
     phase = serializers.PrimaryKeyRelatedField(queryset=BuildPhase.objects.all())
     label = serializers.SerializerMethodField("get_label")
@@ -246,6 +363,9 @@ class BuildWarningSerializer(serializers.ModelSerializer):
             "start",
             "end",
             "text",
+            "stream",
+            "start_offset",
+            "end_offset",
             "pre_context",
             "post_context",
             "add_date",
@@ -254,7 +374,7 @@ class BuildWarningSerializer(serializers.ModelSerializer):
         )
 
 
-class BuildWarningViewSet(viewsets.ModelViewSet):
+class BuildWarningViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return BuildWarning.objects.all()
 
@@ -266,7 +386,7 @@ class BuildWarningViewSet(viewsets.ModelViewSet):
 # Build Phase
 
 
-class BuildPhaseSerializer(serializers.ModelSerializer):
+class BuildPhaseSerializer(SparseFieldsSerializer):
     build = serializers.PrimaryKeyRelatedField(queryset=Build.objects.all())
     label = serializers.SerializerMethodField("get_label")
 
@@ -289,7 +409,7 @@ class BuildPhaseSerializer(serializers.ModelSerializer):
         )
 
 
-class BuildPhaseViewSet(viewsets.ModelViewSet):
+class BuildPhaseViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return BuildPhase.objects.all()
 
@@ -301,7 +421,7 @@ class BuildPhaseViewSet(viewsets.ModelViewSet):
 # Compiler
 
 
-class CompilerSerializer(serializers.ModelSerializer):
+class CompilerSerializer(SparseFieldsSerializer):
 
     label = serializers.SerializerMethodField("get_label")
 
@@ -313,7 +433,7 @@ class CompilerSerializer(serializers.ModelSerializer):
         fields = ("id", "version", "name", "add_date", "modify_date", "label")
 
 
-class CompilerViewSet(viewsets.ModelViewSet):
+class CompilerViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return Compiler.objects.all()
 
@@ -325,7 +445,7 @@ class CompilerViewSet(viewsets.ModelViewSet):
 # Dependency
 
 
-class DependencySerializer(serializers.ModelSerializer):
+class DependencySerializer(SparseFieldsSerializer):
 
     spec = serializers.PrimaryKeyRelatedField(queryset=Spec.objects.all())
     label = serializers.SerializerMethodField("get_label")
@@ -338,7 +458,7 @@ class DependencySerializer(serializers.ModelSerializer):
         fields = ("id", "spec", "dependency_type", "add_date", "modify_date", "label")
 
 
-class DependencyViewSet(viewsets.ModelViewSet):
+class DependencyViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return Dependency.objects.all()
 
@@ -350,7 +470,7 @@ class DependencyViewSet(viewsets.ModelViewSet):
 # EnvironmentVariable
 
 
-class EnvironmentVariableSerializer(serializers.ModelSerializer):
+class EnvironmentVariableSerializer(SparseFieldsSerializer):
 
     label = serializers.SerializerMethodField("get_label")
 
@@ -362,7 +482,7 @@ class EnvironmentVariableSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "value", "add_date", "modify_date", "label")
 
 
-class EnvironmentVariableViewSet(viewsets.ModelViewSet):
+class EnvironmentVariableViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return EnvironmentVariable.objects.all()
 
@@ -374,7 +494,7 @@ class EnvironmentVariableViewSet(viewsets.ModelViewSet):
 # Install Files
 
 
-class InstallFileSerializer(serializers.ModelSerializer):
+class InstallFileSerializer(SparseFieldsSerializer):
 
     label = serializers.SerializerMethodField("get_label")
     build = serializers.PrimaryKeyRelatedField(queryset=Build.objects.all())
@@ -400,7 +520,7 @@ class InstallFileSerializer(serializers.ModelSerializer):
         )
 
 
-class InstallFileViewSet(viewsets.ModelViewSet):
+class InstallFileViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return InstallFile.objects.all()
 
@@ -412,7 +532,7 @@ class InstallFileViewSet(viewsets.ModelViewSet):
 # Feature
 
 
-class FeatureSerializer(serializers.ModelSerializer):
+class FeatureSerializer(SparseFieldsSerializer):
 
     label = serializers.SerializerMethodField("get_label")
 
@@ -424,7 +544,7 @@ class FeatureSerializer(serializers.ModelSerializer):
         fields = ("id", "name", "add_date", "modify_date", "label")
 
 
-class FeatureViewSet(viewsets.ModelViewSet):
+class FeatureViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
         return Feature.objects.all()
 
@@ -436,7 +556,7 @@ class FeatureViewSet(viewsets.ModelViewSet):
 # Target
 
 
-class TargetSerializer(serializers.ModelSerializer):
+class TargetSerializer(SparseFieldsSerializer):
 
     features = serializers.PrimaryKeyRelatedField(
         queryset=Feature.objects.all(), required=False, many=True
@@ -464,9 +584,9 @@ class TargetSerializer(serializers.ModelSerializer):
         )
 
 
-class TargetViewSet(viewsets.ModelViewSet):
+class TargetViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
-        return Target.objects.all()
+        return Target.objects.prefetch_related("features", "parents")
 
     serializer_class = TargetSerializer
     permission_classes = (IsAuthenticated,)
@@ -476,7 +596,7 @@ class TargetViewSet(viewsets.ModelViewSet):
 # Spec
 
 
-class SpecSerializer(serializers.ModelSerializer):
+class SpecSerializer(SparseFieldsSerializer):
 
     dependencies = serializers.PrimaryKeyRelatedField(
         queryset=Dependency.objects.all(), many=True
@@ -510,9 +630,13 @@ class SpecSerializer(serializers.ModelSerializer):
         )
 
 
-class SpecViewSet(viewsets.ModelViewSet):
+class SpecViewSet(SparseFieldsMixin, ExportMixin, viewsets.ModelViewSet):
     def get_queryset(self):
-        return Spec.objects.all()
+        return Spec.objects.prefetch_related("dependencies")
+
+    @conditional(lambda request, pk=None: Spec.objects.filter(pk=pk), public=False)
+    def retrieve(self, request, *args, **kwargs):
+        return super().retrieve(request, *args, **kwargs)
 
     serializer_class = SpecSerializer
     permission_classes = (IsAuthenticated,)
@@ -4,7 +4,9 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 from django.conf import settings
+from django.core import cache
 from django.db.models import F
+from django.http import HttpResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django.urls import reverse
 
@@ -14,14 +16,16 @@ from django.utils.decorators import method_decorator
 
 from spackmon.settings import cfg
 from spackmon.apps.main.models import Spec, Attribute, Build
-from spackmon.apps.main.tasks import import_configuration
+from spackmon.apps.main.graph import SpecGraph, get_nodes_cache_key
+from spackmon.apps.main.search import SEARCH_LIMIT, search_specs
+from spackmon.apps.main.tasks import check_specs, import_configuration
 from rest_framework.response import Response
 from rest_framework.views import APIView
 
 from .serializers import SpecSerializer
 from ..auth import is_authenticated
-
-import json
+from ..renderers import get_request_data
+from ..conditional import conditional
 
 
 class SpecByName(APIView):
@@ -30,7 +34,7 @@ class SpecByName(APIView):
     permission_classes = []
     allowed_methods = ("GET",)
 
-    @never_cache
+    @conditional(lambda request, name=None: Spec.objects.filter(name=name))
     @method_decorator(
         ratelimit(
             key="ip",
@@ -46,18 +50,58 @@ class SpecByName(APIView):
         if not name:
             return Response(status=400, data={"message": "A package name is required."})
         specs = [
-            SpecSerializer(x).data for x in Spec.objects.filter(name=name).distinct()
+            SpecSerializer(x).data
+            for x in Spec.objects.filter(name=name)
+            .distinct()
+            .prefetch_related("dependencies")
         ]
         return Response(status=200, data=specs)
 
 
+class SpecSearch(APIView):
+    """Find specs by a prefix of the name and/or full hash (for autocomplete)."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/specs/search/?q=zlib/abc123"""
+        try:
+            limit = int(request.GET.get("limit", SEARCH_LIMIT))
+        except ValueError:
+            return Response(status=400, data={"message": "limit must be an integer."})
+        specs = search_specs(
+            request.GET.get("q"),
+            limit=limit,
+            analyzed=request.GET.get("analyzed") in ["1", "true"],
+        )
+        return Response(status=200, data=specs)
+
+
+def get_spec_attributes(request, spec_id=None, analyzer=None):
+    """Get the attributes for a spec, optionally for one analyzer"""
+    attributes = Attribute.objects.filter(install_file__build__spec__id=spec_id)
+    if analyzer:
+        attributes = attributes.filter(analyzer=analyzer)
+    return attributes
+
+
 class SpecAttributes(APIView):
     """Get a list of attribute (install analyses) for a spec."""
 
     permission_classes = []
     allowed_methods = ("GET",)
 
-    @never_cache
+    @conditional(get_spec_attributes)
     @method_decorator(
         ratelimit(
             key="ip",
@@ -73,17 +117,9 @@ class SpecAttributes(APIView):
             return Response(status=400, data={"message": "A spec id is required."})
 
         # Can optionally provide an analyzer
-        analyzer = kwargs.get("analyzer")
         results = []
-
-        if analyzer:
-            attributes = Attribute.objects.filter(
-                install_file__build__spec__id=spec_id, analyzer=analyzer
-            )
-        else:
-            attributes = Attribute.objects.filter(install_file__build__spec__id=spec_id)
-
-        for attribute in attributes.all():
+        attributes = get_spec_attributes(request, spec_id, kwargs.get("analyzer"))
+        for attribute in attributes.select_related("install_file"):
             results.append(
                 {
                     "filename": attribute.install_file.name,
@@ -173,7 +209,7 @@ class NewSpec(APIView):
             return response
 
         # Generate the config
-        data = json.loads(request.body)
+        data = get_request_data(request)
         spack_version = data.get("spack_version")
 
         # The spack version is required
@@ -192,3 +228,158 @@ class NewSpec(APIView):
             result["data"]["spec"] = result["data"]["spec"].to_dict_ids()
 
         return Response(status=result["code"], data=result)
+
+
+class CheckSpecs(APIView):
+    """Given a list of specs (full_hash and spack_version) that a client has,
+    return the ones that are missing, so the client only uploads those.
+    """
+
+    permission_classes = []
+    allowed_methods = ("POST",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="POST",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def post(self, request, *args, **kwargs):
+        """POST /ms1/specs/exists/ to find the specs that are missing"""
+
+        # If allow_continue False, return response
+        allow_continue, response, _ = is_authenticated(request)
+        if not allow_continue:
+            return response
+
+        result = check_specs(get_request_data(request).get("specs"))
+        return Response(status=result["code"], data=result)
+
+
+def get_spec_closure(request, spec_id, dependents=False):
+    """Shared function to return all dependents or dependencies of a spec,
+    optionally up to a ?depth=, from the closure table.
+    """
+    if not Spec.objects.filter(id=spec_id).exists():
+        return Response(status=404, data={"message": "This spec does not exist."})
+
+    max_depth = request.GET.get("depth")
+    if max_depth is not None:
+        try:
+            max_depth = int(max_depth)
+        except ValueError:
+            return Response(status=400, data={"message": "depth must be an integer."})
+
+    spec = Spec(id=spec_id)
+    if dependents:
+        specs = spec.get_dependents(max_depth=max_depth)
+    else:
+        specs = spec.get_dependencies(max_depth=max_depth)
+    specs = specs.values("id", "name", "version", "full_hash", "spack_version", "depth")
+    return Response(status=200, data=list(specs))
+
+
+class SpecDependents(APIView):
+    """Get all specs that depend on a spec, at any depth."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/specs/<spec_id>/dependents/"""
+        return get_spec_closure(request, kwargs.get("spec_id"), dependents=True)
+
+
+class SpecDependencies(APIView):
+    """Get all specs that a spec depends on, at any depth."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/specs/<spec_id>/dependencies/"""
+        return get_spec_closure(request, kwargs.get("spec_id"))
+
+
+def cache_stream(key, chunks, timeout=86400):
+    """Yield chunks of a streaming response, and cache the joined content
+    once they are all sent.
+    """
+    content = []
+    for chunk in chunks:
+        content.append(chunk)
+        yield chunk
+    cache.caches["spackmon_api"].set(key, "".join(content), timeout=timeout)
+
+
+class SpecNodes(APIView):
+    """Export a spec and all of its dependencies in the spack nodes format,
+    the same format that is used to import (POST) a new spec.
+    """
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/specs/<spec_id>/nodes/ or /ms1/specs/hash/<full_hash>/nodes/"""
+        if "spec_id" in kwargs:
+            spec = get_object_or_404(Spec, id=kwargs["spec_id"])
+        else:
+            specs = Spec.objects.filter(full_hash=kwargs.get("full_hash"))
+            spack_version = request.GET.get("spack_version")
+            if spack_version:
+                specs = specs.filter(spack_version=spack_version)
+            specs = list(specs[:2])
+            if not specs:
+                return Response(
+                    status=404, data={"message": "This spec does not exist."}
+                )
+            if len(specs) > 1:
+                return Response(
+                    status=400,
+                    data={
+                        "message": "There is more than one spec with this hash, "
+                        "please provide a spack_version."
+                    },
+                )
+            spec = specs[0]
+
+        # The export is cached until a spec in the DAG changes
+        key = get_nodes_cache_key(spec)
+        content = cache.caches["spackmon_api"].get(key)
+        if content is not None:
+            return HttpResponse(content, content_type="application/json")
+        graph = SpecGraph([spec])
+        return StreamingHttpResponse(
+            cache_stream(key, graph.iter_json()), content_type="application/json"
+        )
@@ -0,0 +1,70 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+
+from ratelimit.decorators import ratelimit
+from django.views.decorators.cache import never_cache
+from django.utils.decorators import method_decorator
+
+from spackmon.apps.main.models import SymbolCorpus
+from spackmon.apps.main.analysis.index import diff_libraries, lookup_symbol
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+
+class SymbolLookup(APIView):
+    """Find the libraries that define (export) or import a symbol."""
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/symbols/?name=<symbol>"""
+        name = request.GET.get("name")
+        if not name:
+            return Response(status=400, data={"message": "name is required."})
+        return Response(status=200, data=lookup_symbol(name))
+
+
+class SymbolDiff(APIView):
+    """Compare the symbols that two libraries define, and find the libraries
+    that import the symbols that only the first defines.
+    """
+
+    permission_classes = []
+    allowed_methods = ("GET",)
+
+    @never_cache
+    @method_decorator(
+        ratelimit(
+            key="ip",
+            rate=settings.VIEW_RATE_LIMIT,
+            method="GET",
+            block=settings.VIEW_RATE_LIMIT_BLOCK,
+        )
+    )
+    def get(self, request, *args, **kwargs):
+        """GET /ms1/symbols/diff/?a=<library_id>&b=<library_id>"""
+        try:
+            libraryA = int(request.GET["a"])
+            libraryB = int(request.GET["b"])
+        except (KeyError, ValueError):
+            return Response(
+                status=400, data={"message": "a and b must be library ids."}
+            )
+        libraryA = get_object_or_404(SymbolCorpus, pk=libraryA)
+        libraryB = get_object_or_404(SymbolCorpus, pk=libraryB)
+        return Response(status=200, data=diff_libraries(libraryA, libraryB))
@@ -10,6 +10,7 @@ from django.db.models import Count, Case, When, IntegerField, Q
 from ratelimit.mixins import RatelimitMixin
 
 from spackmon.apps.main.models import Build
+from spackmon.apps.main.search import parse_query
 from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 from rest_framework.views import APIView
@@ -51,8 +52,6 @@ class BuildsTable(RatelimitMixin, APIView):
     renderer_classes = (JSONRenderer,)
 
     def get(self, request, year=None):
-        print("GET BuildsTable")
-
         # Start and length to return
         start = int(request.GET["start"])
         length = int(request.GET["length"])
@@ -65,8 +64,15 @@ class BuildsTable(RatelimitMixin, APIView):
         if tag:
             queryset = queryset.filter(tags__name=tag)
 
-        # First do the search to reduce the size of the set
-        if query:
+        # First do the search to reduce the size of the set. A spack style
+        # spec query (zlib/abc123 or /abc123) is an indexed prefix search
+        if "/" in query:
+            name, full_hash = parse_query(query)
+            if name:
+                queryset = queryset.filter(spec__name__startswith=name)
+            if full_hash:
+                queryset = queryset.filter(spec__full_hash__startswith=full_hash)
+        elif query:
             queryset = queryset.filter(
                 Q(spec__name__icontains=query)
                 | Q(spec__version__icontains=query)
@@ -105,7 +111,6 @@ class BuildsTable(RatelimitMixin, APIView):
 
         order_by = "%s%s" % (order, direction)
         if order_by in order_lookup:
-            print(f"Ordering by {order_by}")
             queryset = queryset.order_by(order_lookup[order_by])
             count = queryset.count()
 
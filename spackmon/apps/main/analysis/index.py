@@ -0,0 +1,205 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""An inverted index of the symbols in symbolator corpora: for each symbol,
+the libraries that define (export) or import it. The index is updated as
+symbolator results are uploaded, so questions about symbols across the fleet
+are answered with joins over the index, without loading any corpora.
+"""
+
+from django.db import transaction
+from django.db.models import Count
+
+from spackmon.apps.main.models import (
+    Spec,
+    Symbol,
+    SymbolCorpus,
+    SymbolReference,
+)
+
+import hashlib
+
+# The number of symbols looked up (or created) at once
+SYMBOL_CHUNK_SIZE = 500
+
+# The most libraries (or symbols) returned for a lookup or a difference
+SYMBOL_RESULTS_LIMIT = 1000
+
+
+def get_symbol_digest(name):
+    """Return the digest used to look up a symbol (or a library path)"""
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def get_symbol_name(name):
+    """Return the name a symbol is indexed and compared by. Versions (after @
+    or @@, e.g., memcpy@@GLIBC_2.14) are dropped, like symbolator does when it
+    loads a corpus.
+    """
+    return name.split("@")[0]
+
+
+def get_symbol_ids(names):
+    """Return a lookup of symbol name to id for a list of names, creating the
+    symbols that we don't have yet.
+    """
+    ids = {}
+    names = list(names)
+    for i in range(0, len(names), SYMBOL_CHUNK_SIZE):
+        digests = {get_symbol_digest(x): x for x in names[i : i + SYMBOL_CHUNK_SIZE]}
+        found = dict(
+            Symbol.objects.filter(digest__in=digests).values_list("digest", "id")
+        )
+        missing = [
+            Symbol(name=name, digest=digest)
+            for digest, name in digests.items()
+            if digest not in found
+        ]
+        if missing:
+            Symbol.objects.bulk_create(missing, ignore_conflicts=True)
+            found = dict(
+                Symbol.objects.filter(digest__in=digests).values_list("digest", "id")
+            )
+        ids.update({name: found[digest] for digest, name in digests.items()})
+    return ids
+
+
+def index_corpus(corpus):
+    """Add a library from a corpus (the "corpus" of a symbolator entry) to the
+    index, unless we already have it, and return it.
+    """
+    path = corpus["metadata"]["path"]
+    library, created = SymbolCorpus.objects.get_or_create(
+        digest=get_symbol_digest(path),
+        defaults={"path": path, "name": corpus["metadata"]["corpus_name"]},
+    )
+    if not created:
+        return library
+
+    # A corpus begins with an empty (NULL) symbol, which we skip
+    symbols = {}
+    for name, meta in corpus.get("symbols", {}).items():
+        name = get_symbol_name(name)
+        if not name:
+            continue
+        symbols[name] = symbols.get(name, False) or meta.get("defined") != "UND"
+
+    ids = get_symbol_ids(symbols)
+    SymbolReference.objects.bulk_create(
+        [
+            SymbolReference(corpus=library, symbol_id=ids[name], defined=defined)
+            for name, defined in symbols.items()
+        ],
+        batch_size=SYMBOL_CHUNK_SIZE,
+    )
+    return library
+
+
+def index_symbols(attribute):
+    """Index the libraries in a symbolator result (attribute). Libraries that
+    are already indexed (e.g., a dependency shared with another spec) are
+    only linked to the attribute.
+    """
+    if attribute.name != "symbolator-json" or not attribute.json_value:
+        return []
+    with transaction.atomic():
+        libraries = [
+            index_corpus(entry["corpus"])
+            for entry in attribute.json_value
+            if "corpus" in entry
+        ]
+        for library in libraries:
+            library.attributes.add(attribute)
+    return libraries
+
+
+def get_library_specs(libraries, limit=SYMBOL_RESULTS_LIMIT):
+    """Return the specs with symbolator results that include a library, by
+    library id
+    """
+    links = list(
+        SymbolCorpus.attributes.through.objects.filter(symbolcorpus__in=libraries)
+        .values_list("symbolcorpus_id", "attribute__install_file__build__spec_id")
+        .distinct()[:limit]
+    )
+    found = {
+        x["id"]: x
+        for x in Spec.objects.filter(id__in=[x[1] for x in links]).values(
+            "id", "name", "version", "full_hash"
+        )
+    }
+    specs = {}
+    for library_id, spec_id in links:
+        specs.setdefault(library_id, []).append(found[spec_id])
+    return specs
+
+
+def lookup_symbol(name, limit=SYMBOL_RESULTS_LIMIT):
+    """Return the libraries that define (export) and import a symbol. A
+    versioned name (e.g., memcpy@@GLIBC_2.14) is looked up without its version,
+    like it is indexed.
+    """
+    name = get_symbol_name(name)
+    result = {"symbol": name, "defined": [], "imported": []}
+    symbol = Symbol.objects.filter(digest=get_symbol_digest(name)).first()
+    if not symbol:
+        return result
+
+    references = (
+        SymbolReference.objects.filter(symbol=symbol)
+        .select_related("corpus")
+        .order_by("corpus__name", "corpus_id")[:limit]
+    )
+    for reference in references:
+        key = "defined" if reference.defined else "imported"
+        result[key].append(reference.corpus.to_dict())
+    return result
+
+
+def diff_libraries(libraryA, libraryB, limit=SYMBOL_RESULTS_LIMIT):
+    """Compare the symbols that two libraries (e.g., two versions of libfoo)
+    define. We return the symbols that only A defines (that a splice of B in
+    place of A would remove), the symbols that only B defines, and the
+    libraries (with the specs that include them) that import any of the
+    removed symbols, with the number they import.
+    """
+    definedA = SymbolReference.objects.filter(corpus=libraryA, defined=True)
+    definedB = SymbolReference.objects.filter(corpus=libraryB, defined=True)
+    removed = definedA.exclude(symbol__in=definedB.values("symbol")).values("symbol")
+    added = definedB.exclude(symbol__in=definedA.values("symbol")).values("symbol")
+
+    importers = list(
+        SymbolReference.objects.filter(defined=False, symbol__in=removed)
+        .values("corpus")
+        .annotate(count=Count("id"))
+        .order_by("-count", "corpus")[:limit]
+    )
+    libraries = {
+        x.id: x
+        for x in SymbolCorpus.objects.filter(id__in=[x["corpus"] for x in importers])
+    }
+    specs = get_library_specs(list(libraries))
+    return {
+        "A": libraryA.to_dict(),
+        "B": libraryB.to_dict(),
+        "removed": list(
+            Symbol.objects.filter(id__in=removed)
+            .order_by("name")
+            .values_list("name", flat=True)[:limit]
+        ),
+        "added": list(
+            Symbol.objects.filter(id__in=added)
+            .order_by("name")
+            .values_list("name", flat=True)[:limit]
+        ),
+        "importers": [
+            dict(
+                libraries[x["corpus"]].to_dict(),
+                missing=x["count"],
+                specs=specs.get(x["corpus"], []),
+            )
+            for x in importers
+        ],
+    }
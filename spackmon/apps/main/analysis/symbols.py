@@ -6,8 +6,18 @@
 from symbolator.asp import PyclingoDriver, ABIGlobalSolverSetup
 from symbolator.facts import get_facts
 from symbolator.corpus import JsonCorpusLoader
+from spackmon.apps.main.analysis.index import get_symbol_name
+from spackmon.apps.api.metrics import registry
+
+import numpy as np
 import os
 
+import logging
+
+logger = logging.getLogger(__name__)
+
+NO_SYMBOLS = np.array([], dtype=np.int64)
+
 
 def run_symbol_solver(corpora):
     """
@@ -26,6 +36,100 @@ def run_symbol_solver(corpora):
     )
 
 
+def get_library_name(corpus):
+    """The name a library is matched (and missing symbols reported) by,
+    e.g., libz for /opt/zlib/lib/libz.so.1.2.8
+    """
+    return os.path.basename(corpus.path).split(".")[0]
+
+
+def get_symbol_sets(corpus, ids):
+    """Return sorted arrays of the ids of the symbols that a corpus defines,
+    and that it needs (undefined). Names are given ids in the ids lookup,
+    which is shared by the corpora we compare.
+    """
+    defined = []
+    undefined = []
+    for name, meta in corpus.symbols.items():
+        name = get_symbol_name(name)
+        if not name:
+            continue
+        symbol = ids.setdefault(name, len(ids))
+        if meta.get("defined") == "UND":
+            undefined.append(symbol)
+        else:
+            defined.append(symbol)
+    return (
+        np.unique(np.array(defined, dtype=np.int64)),
+        np.unique(np.array(undefined, dtype=np.int64)),
+    )
+
+
+def get_splice_corpora(before, after):
+    """Compare the corpora before and after a splice as sets of symbol ids.
+    A symbol is missing if a corpus needs it and no corpus defines it, so a
+    library that was not spliced in, and does not need a symbol the splice
+    removed, cannot be missing a new symbol. Nor can one that needs only
+    symbols that are defined (or were already missing) after the splice.
+    We return None if no library can be missing a new symbol, and otherwise
+    the corpora the solver needs before and after the splice: the libraries
+    that can, and those that define any symbol they need.
+    """
+    ids = {}
+    symbols = {id(x): get_symbol_sets(x, ids) for x in before + after}
+
+    def union(corpora, index):
+        found = [symbols[id(x)][index] for x in corpora]
+        return np.unique(np.concatenate(found)) if found else NO_SYMBOLS
+
+    defined_before = union(before, 0)
+    defined_after = union(after, 0)
+    removed = np.setdiff1d(defined_before, defined_after, assume_unique=True)
+
+    unchanged = {id(x) for x in before}
+    affected = [
+        x
+        for x in after
+        if id(x) not in unchanged
+        or np.isin(symbols[id(x)][1], removed, assume_unique=True).any()
+    ]
+
+    # Symbols already missing before the splice are not new
+    names = {get_library_name(x) for x in affected}
+    missing = {}
+    for corpus in before:
+        name = get_library_name(corpus)
+        if name in names:
+            needed = np.setdiff1d(symbols[id(corpus)][1], defined_before, True)
+            missing[name] = np.union1d(missing.get(name, NO_SYMBOLS), needed)
+
+    affected = [
+        x
+        for x in affected
+        if np.setdiff1d(
+            np.setdiff1d(symbols[id(x)][1], defined_after, True),
+            missing.get(get_library_name(x), NO_SYMBOLS),
+            True,
+        ).size
+    ]
+    if not affected:
+        return None
+
+    def with_definers(corpora, candidates):
+        needed = union(corpora, 1)
+        selected = {id(x) for x in corpora}
+        return corpora + [
+            x
+            for x in candidates
+            if id(x) not in selected
+            and np.isin(symbols[id(x)][0], needed, assume_unique=True).any()
+        ]
+
+    names = {get_library_name(x) for x in affected}
+    original = [x for x in before if get_library_name(x) in names]
+    return with_definers(original, before), with_definers(affected, after), names
+
+
 def run_symbols_splice(resultA, resultB):
     """
     Given two results, each a corpora with json values, perform a splice
@@ -40,25 +144,22 @@ def run_symbols_splice(resultA, resultB):
     }
 
     if not resultA.json_value or not resultB.json_value:
-        result[
-            "message"
-        ] = "One of the results does not have corpora, so the splice cannot be performed."
+        result["message"] = (
+            "One of the results does not have corpora, so the splice cannot be performed."
+        )
         return result
 
     # Spliced libraries will be added as corpora here
     loader = JsonCorpusLoader()
     loader.load(resultA.json_value)
     corpora = loader.get_lookup()
-    print("Corpora without Splice %s" % corpora)
-
-    # original set of symbols without splice
-    corpora_result = run_symbol_solver(list(corpora.values()))
+    logger.debug("Corpora without splice %s", corpora)
 
     # Now load the splices separately, and select what we need
     splice_loader = JsonCorpusLoader()
     splice_loader.load(resultB.json_value)
     splices = splice_loader.get_lookup()
-    print("Splices %s" % splices)
+    logger.debug("Splices %s", splices)
 
     # If we have the library in corpora, delete it, add spliced libraries
     # E.g., libz.so.1.2.8 is just "libz" and will be replaced by anything with the same prefix
@@ -83,21 +184,42 @@ def run_symbols_splice(resultA, resultB):
             selected.append([splices_libnames[lib], corpora_libnames[lib]])
             corpora_lookup[lib] = corp
 
-    spliced_result = run_symbol_solver(list(corpora_lookup.values()))
-    print("After splicing %s" % corpora_lookup)
+    logger.debug("After splicing %s", corpora_lookup)
+    result["selected"] = selected
+
+    # Only run the solver if the splice can introduce missing symbols, and
+    # then only for the libraries it can introduce them for
+    splice_corpora = get_splice_corpora(
+        list(corpora.values()), list(corpora_lookup.values())
+    )
+    result["fast_path"] = splice_corpora is None
+    registry.increment(
+        "symbol_splices", path="fast" if splice_corpora is None else "solver"
+    )
+    if splice_corpora is None:
+        return result
+    before, after, names = splice_corpora
+
+    # original set of symbols without splice
+    corpora_result = run_symbol_solver(before)
+    spliced_result = run_symbol_solver(after)
 
     # Compare sets of missing symbols
-    result_missing = [
+    result_missing = {
         "%s %s" % (os.path.basename(x[0]).split(".")[0], x[1])
         for x in corpora_result.answers.get("missing_symbols", [])
-    ]
+    }
     spliced_missing = [
         "%s %s" % (os.path.basename(x[0]).split(".")[0], x[1])
         for x in spliced_result.answers.get("missing_symbols", [])
     ]
 
-    # these are new missing symbols after the splice
-    missing = [x for x in spliced_missing if x not in result_missing]
+    # these are new missing symbols after the splice (for the libraries that
+    # we solved for, a library that defines a symbol can be missing others)
+    missing = [
+        x
+        for x in spliced_missing
+        if x not in result_missing and x.split(" ")[0] in names
+    ]
     result["missing"] = missing
-    result["selected"] = selected
     return result
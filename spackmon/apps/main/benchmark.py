@@ -0,0 +1,591 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+"""A benchmark suite for the core spackmon paths. A FleetGenerator creates a
+reproducible, synthetic fleet of specs, builds, phase logs, install manifests
+and symbolator corpora, and each registered benchmark case times one path
+against it. Results are returned as a dictionary to be saved to json, so
+performance regressions show up between releases.
+"""
+
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings
+
+from spackmon.apps.main.analysis.symbols import run_symbols_splice
+from spackmon.apps.main.logparser import parse_build_logs, reparse_batch
+from spackmon.apps.main.models import Attribute, Build, BuildPhase
+from spackmon.apps.main.tasks import (
+    get_build,
+    import_configuration,
+    update_build_metadata,
+    update_build_phase,
+    update_build_status,
+)
+from spackmon.apps.api.middleware import QueryRecorder
+from spackmon.apps.users.models import User
+from spackmon.version import __version__
+
+from collections import OrderedDict
+from contextlib import contextmanager, redirect_stdout
+from datetime import datetime
+
+import base64
+import django
+import hashlib
+import io
+import json
+import os
+import platform
+import random
+import time
+
+# Registered benchmark cases, run in order (later cases use earlier data)
+BENCHMARKS = OrderedDict()
+
+# The phases per second that parsing logs again should reach
+LOG_REPARSE_TARGET = 20
+
+
+def benchmark(name):
+    """Register a function as a benchmark case. The function is given the
+    runner, and should time each operation with runner.timings[name].
+    """
+
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+
+    return register
+
+
+class Timings:
+    """Collect the duration and query count of each timed operation."""
+
+    def __init__(self):
+        self.samples = []
+        self.queries = 0
+
+        # For a throughput, the number of items (e.g., phases) processed, and
+        # the items per second that we want
+        self.items = 0
+        self.target = None
+
+    @contextmanager
+    def time(self):
+        recorder = QueryRecorder()
+        start = time.perf_counter()
+        with connection.execute_wrapper(recorder):
+            yield
+        self.samples.append(time.perf_counter() - start)
+        self.queries += recorder.count
+
+    def percentile(self, percent):
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self):
+        count = len(self.samples)
+        if not count:
+            return {"count": 0}
+        total = sum(self.samples)
+        result = {
+            "count": count,
+            "total": total,
+            "mean": total / count,
+            "min": min(self.samples),
+            "max": max(self.samples),
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "queries": self.queries,
+            "queries_per_op": self.queries / count,
+        }
+        if self.items:
+            result["items"] = self.items
+            result["items_per_second"] = self.items / total if total else 0
+            result["target"] = self.target
+        return result
+
+
+class FleetGenerator:
+    """Deterministically generate a synthetic fleet. Each package has a number
+    of variants (a version and compiler), and each concrete node depends on
+    nodes of lower numbered packages, so the specs form realistic DAGs with
+    shared dependencies. The same seed and sizes always generate the same
+    fleet, so results are comparable between runs.
+    """
+
+    spack_version = "0.17.0-benchmark"
+    compilers = [("gcc", "9.3.0"), ("gcc", "10.2.0"), ("clang", "12.0.0")]
+    versions = ["1.0.0", "1.2.0", "2.0.0"]
+    phases = ["autoreconf", "configure", "build", "install"]
+    features = ["avx", "avx2", "fma", "sse4_2", "popcnt", "bmi2"]
+
+    def __init__(
+        self,
+        seed=0,
+        specs=50,
+        builds=100,
+        packages=None,
+        log_lines=1000,
+        install_files=50,
+        symbols=100,
+        max_deps=4,
+        failure_rate=0.2,
+    ):
+        self.seed = seed
+        self.packages = ["pkg-%s" % i for i in range(packages or max(5, specs // 4))]
+        self.variants = len(self.compilers) * len(self.versions)
+        self.max_deps = max_deps
+        self.num_builds = builds
+        self.log_lines = log_lines
+        self.install_files = install_files
+        self.symbols = symbols
+        self.failure_rate = failure_rate
+        self._nodes = {}
+        self._hashes = {}
+
+        if specs > len(self.packages) * self.variants:
+            raise ValueError(
+                "%s packages can only generate %s specs, ask for more packages."
+                % (len(self.packages), len(self.packages) * self.variants)
+            )
+
+        # Choose the (package, variant) of each top level spec
+        choices = [
+            (index, variant)
+            for index in range(len(self.packages))
+            for variant in range(self.variants)
+        ]
+        self.random("roots").shuffle(choices)
+        self.roots = choices[:specs]
+
+    def random(self, *args):
+        """A random number generator for a named part of the fleet, so one
+        part does not change if the sizes of another change.
+        """
+        return random.Random("-".join(str(x) for x in (self.seed,) + args))
+
+    def make_hash(self, *args):
+        digest = hashlib.sha1(json.dumps(args, sort_keys=True).encode("utf-8"))
+        return base64.b32encode(digest.digest()).decode("utf-8").lower()[:32]
+
+    def node(self, index, variant):
+        """Get a concrete node (in the spack nodes format) for a package"""
+        key = (index, variant)
+        if key in self._nodes:
+            return self._nodes[key]
+
+        rng = self.random("node", index, variant)
+        compiler = self.compilers[variant % len(self.compilers)]
+        version = self.versions[variant // len(self.compilers)]
+
+        # Dependencies are always lower numbered packages, so we have a DAG
+        deps = sorted(
+            rng.sample(range(index), rng.randint(0, min(index, self.max_deps)))
+        )
+        dependencies = []
+        for dep in deps:
+            dep_node = self.node(dep, rng.randrange(self.variants))
+            dependencies.append(
+                {
+                    "name": dep_node["name"],
+                    "build_hash": dep_node["build_hash"],
+                    "full_hash": dep_node["full_hash"],
+                    "type": rng.choice([["build", "link"], ["build"], ["run"]]),
+                }
+            )
+
+        name = self.packages[index]
+        full_hash = self.make_hash(
+            name, version, compiler, [x["full_hash"] for x in dependencies]
+        )
+        node = {
+            "name": name,
+            "version": version,
+            "arch": {
+                "platform": "linux",
+                "platform_os": "ubuntu20.04",
+                "target": {
+                    "name": "skylake",
+                    "vendor": "GenuineIntel",
+                    "features": self.features,
+                    "generation": 0,
+                    "parents": ["broadwell"],
+                },
+            },
+            "compiler": {"name": compiler[0], "version": compiler[1]},
+            "namespace": "builtin",
+            "parameters": {"shared": True, "cflags": [], "ldflags": []},
+            "dependencies": dependencies,
+            "hash": self.make_hash("hash", full_hash),
+            "full_hash": full_hash,
+            "build_hash": self.make_hash("build_hash", full_hash),
+            "package_hash": self.make_hash("package_hash", name, version),
+        }
+        self._nodes[key] = node
+        self._hashes[full_hash] = node
+        return node
+
+    def dag(self, node):
+        """Return a node and all of its dependency nodes (each once)"""
+        seen = OrderedDict()
+        stack = [node]
+        while stack:
+            current = stack.pop()
+            if current["full_hash"] in seen:
+                continue
+            seen[current["full_hash"]] = current
+            for dep in current["dependencies"]:
+                stack.append(self._hashes[dep["full_hash"]])
+        return list(seen.values())
+
+    def root(self, i):
+        return self.node(*self.roots[i])
+
+    def spec(self, i):
+        """Get the ith top level spec, as spack would upload it"""
+        return {"spec": {"nodes": self.dag(self.root(i))}}
+
+    def environment(self, i):
+        """Builds of the same spec are done on different hosts"""
+        return {
+            "hostname": "node-%s" % (i // len(self.roots)),
+            "kernel_version": "#1 SMP Tue Oct 19 2021",
+            "host_os": "ubuntu20.04",
+            "host_target": "skylake",
+            "platform": "linux",
+        }
+
+    def tags(self, i):
+        return "benchmark,batch-%s" % (i % 10)
+
+    def failed(self, i):
+        return self.random("status", i).random() < self.failure_rate
+
+    def prefix(self, node):
+        return (
+            "/home/spack/spack/opt/spack/linux-ubuntu20.04-skylake/%s-%s/%s-%s-%s"
+            % (
+                node["compiler"]["name"],
+                node["compiler"]["version"],
+                node["name"],
+                node["version"],
+                node["full_hash"],
+            )
+        )
+
+    def library(self, node):
+        return "lib%s.so.%s" % (node["name"], node["version"])
+
+    def phase_log(self, i, phase, failed=False):
+        """Generate the output for a build phase, with compile lines and a
+        sprinkling of warnings. A failed phase ends with errors.
+        """
+        rng = self.random("log", i, phase)
+        lines = []
+        for _ in range(self.log_lines):
+            source = "src/file%s.c" % rng.randrange(100)
+            if rng.random() < 0.02:
+                lines.append(
+                    "%s:%s:%s: warning: unused variable 'x%s' [-Wunused-variable]"
+                    % (
+                        source,
+                        rng.randrange(1000),
+                        rng.randrange(80),
+                        rng.randrange(50),
+                    )
+                )
+            else:
+                lines.append(
+                    "gcc -DHAVE_CONFIG_H -I. -O2 -fPIC -c %s -o %s.o"
+                    % (source, source[:-2])
+                )
+        if failed:
+            lines += [
+                "%s:%s:5: error: 'undefined_%s' undeclared (first use in this function)"
+                % (source, rng.randrange(1000), rng.randrange(50)),
+                "make[1]: *** [Makefile:%s: all] Error 1" % rng.randrange(500),
+                "make: *** [Makefile:12: all] Error 2",
+            ]
+        return "\n".join(lines)
+
+    def corpus(self, node):
+        """Generate a symbolator corpus for the library of a node. Later versions
+        drop symbols, and the library needs symbols from its dependencies,
+        so splices can introduce missing symbols.
+        """
+        path = os.path.join(self.prefix(node), "lib", self.library(node))
+        dropped = self.versions.index(node["version"])
+        symbols = {}
+        for k in range(self.symbols - dropped):
+            symbols["%s_symbol_%s" % (node["name"], k)] = {
+                "type": "STT_FUNC",
+                "version_info": "VER_NDX_GLOBAL",
+                "binding": "STB_GLOBAL",
+                "visibility": "STV_DEFAULT",
+                "defined": "12",
+            }
+        rng = self.random("symbols", node["full_hash"])
+        for dep in node["dependencies"]:
+            for k in rng.sample(range(self.symbols), min(5, self.symbols)):
+                symbols["%s_symbol_%s" % (dep["name"], k)] = {
+                    "type": "STT_FUNC",
+                    "version_info": "VER_NDX_GLOBAL",
+                    "binding": "STB_GLOBAL",
+                    "visibility": "STV_DEFAULT",
+                    "defined": "UND",
+                }
+        return {
+            "corpus": {
+                "metadata": {
+                    "path": path,
+                    "corpus_name": self.library(node),
+                    "corpus_elf_machine": "EM_X86_64",
+                    "corpus_elf_class": 64,
+                },
+                "header": {
+                    "e_ident": {
+                        "EI_CLASS": "ELFCLASS64",
+                        "EI_DATA": "ELFDATA2LSB",
+                        "EI_VERSION": "EV_CURRENT",
+                        "EI_OSABI": "ELFOSABI_SYSV",
+                        "EI_ABIVERSION": 0,
+                    },
+                    "e_type": "ET_DYN",
+                    "e_machine": "EM_X86_64",
+                    "e_version": "EV_CURRENT",
+                },
+                "dynamic_tags": {
+                    "soname": "lib%s.so" % node["name"],
+                    "needed": ["lib%s.so" % x["name"] for x in node["dependencies"]],
+                },
+                "symbols": symbols,
+            }
+        }
+
+    def metadata(self, node):
+        """Generate analyzer metadata for a build: an install manifest,
+        environment variables, config args and symbolator corpora.
+        """
+        prefix = self.prefix(node)
+        manifest = {
+            prefix: {"type": "dir", "mode": 16877, "owner": 1000, "group": 1000}
+        }
+        for k in range(self.install_files):
+            manifest["%s/share/%s/file-%s.txt" % (prefix, node["name"], k)] = {
+                "type": "file",
+                "mode": 33188,
+                "owner": 1000,
+                "group": 1000,
+            }
+        corpora = [self.corpus(x) for x in self.dag(node)]
+        return {
+            "config_args": "--prefix=%s --enable-shared" % prefix,
+            "install_files": manifest,
+            "environment_variables": {
+                "SPACK_CC": "/usr/bin/%s" % node["compiler"]["name"],
+                "SPACK_SHORT_SPEC": "%s@%s" % (node["name"], node["version"]),
+            },
+            "symbolator": [
+                {
+                    "name": "symbolator-json",
+                    "install_file": "lib/%s" % self.library(node),
+                    "json_value": json.dumps(corpora),
+                }
+            ],
+        }
+
+    def to_dict(self):
+        return {
+            "seed": self.seed,
+            "specs": len(self.roots),
+            "builds": self.num_builds,
+            "packages": len(self.packages),
+            "log_lines": self.log_lines,
+            "install_files": self.install_files,
+            "symbols": self.symbols,
+            "max_deps": self.max_deps,
+            "failure_rate": self.failure_rate,
+        }
+
+
+class BenchmarkRunner:
+    """Run benchmark cases in order against a generated fleet. This expects
+    an empty (scratch) database, see the benchmark management command.
+    """
+
+    def __init__(self, fleet, splices=10):
+        self.fleet = fleet
+        self.splices = splices
+        self.timings = OrderedDict()
+        self.user = None
+        self.specs = []
+        self.builds = []
+        self.client = Client()
+
+    def run(self, names=None):
+        names = names or list(BENCHMARKS)
+        for name in names:
+            if name not in BENCHMARKS:
+                raise ValueError(
+                    "%s is not a known benchmark, choices are %s"
+                    % (name, ", ".join(BENCHMARKS))
+                )
+
+        self.user, _ = User.objects.get_or_create(username="benchmark")
+
+        # Later cases need the data from earlier ones, so we run all cases up
+        # to the last one asked for, and only report those asked for
+        order = list(BENCHMARKS)
+        last = max(order.index(name) for name in names)
+        with override_settings(RATELIMIT_ENABLE=False):
+            for name in order[: last + 1]:
+                self.timings[name] = Timings()
+                BENCHMARKS[name](self, self.timings[name])
+
+        return {
+            "meta": {
+                "date": datetime.now().isoformat(),
+                "spackmon_version": __version__,
+                "django_version": django.get_version(),
+                "python_version": platform.python_version(),
+                "database": connection.vendor,
+                "fleet": self.fleet.to_dict(),
+            },
+            "results": OrderedDict(
+                (name, self.timings[name].to_dict()) for name in names
+            ),
+        }
+
+
+@benchmark("spec_import")
+def benchmark_spec_import(runner, timings):
+    """Import each top level spec and its dependencies"""
+    for i in range(len(runner.fleet.roots)):
+        config = runner.fleet.spec(i)
+        with timings.time():
+            result = import_configuration(config, runner.fleet.spack_version)
+        runner.specs.append(result["data"]["spec"])
+
+
+@benchmark("build_create")
+def benchmark_build_create(runner, timings):
+    """Create builds, each spec is built on one or more hosts"""
+    for i in range(runner.fleet.num_builds):
+        spec = runner.specs[i % len(runner.specs)]
+        with timings.time():
+            result = get_build(
+                full_hash=spec.full_hash,
+                spack_version=runner.fleet.spack_version,
+                owner=runner.user,
+                tags=runner.fleet.tags(i),
+                **runner.fleet.environment(i)
+            )
+        runner.builds.append(Build.objects.get(id=result["data"]["build"]["build_id"]))
+
+
+@benchmark("phase_update")
+def benchmark_phase_update(runner, timings):
+    """Upload the output of each phase, a failed build fails its last phase"""
+    for i, build in enumerate(runner.builds):
+        failed = runner.fleet.failed(i)
+        for phase in runner.fleet.phases:
+            is_last = phase == runner.fleet.phases[-1]
+            output = runner.fleet.phase_log(i, phase, failed=failed and is_last)
+            status = "ERROR" if failed and is_last else "SUCCESS"
+            with timings.time():
+                update_build_phase(build, phase, status, output)
+
+
+@benchmark("status_update")
+def benchmark_status_update(runner, timings):
+    """Update the final status of each build"""
+    for i, build in enumerate(runner.builds):
+        status = "FAILED" if runner.fleet.failed(i) else "SUCCESS"
+        with timings.time():
+            update_build_status(build, status)
+
+
+@benchmark("metadata_upload")
+def benchmark_metadata_upload(runner, timings):
+    """Upload analyzer metadata (manifest, environment, symbolator corpora)"""
+    for i, build in enumerate(runner.builds):
+        metadata = runner.fleet.metadata(runner.fleet.root(i % len(runner.specs)))
+        with timings.time():
+            update_build_metadata(build, metadata)
+
+
+@benchmark("log_parse")
+def benchmark_log_parse(runner, timings):
+    """Parse errors and warnings out of the phase logs of each build"""
+    for build in runner.builds:
+        with timings.time():
+            parse_build_logs(build)
+
+
+@benchmark("log_reparse")
+def benchmark_log_reparse(runner, timings):
+    """Parse every phase again in batches, as after a new log parser version"""
+    phases = BuildPhase.objects.filter(build__in=runner.builds)
+    phases.update(parser_version=0)
+    phase_ids = list(phases.order_by("id").values_list("id", flat=True))
+    timings.target = LOG_REPARSE_TARGET
+    for i in range(0, len(phase_ids), 10):
+        with timings.time():
+            count, _ = reparse_batch(phase_ids[i : i + 10])
+        timings.items += count
+
+
+@benchmark("builds_table")
+def benchmark_builds_table(runner, timings):
+    """Page through the server side rendered builds table"""
+    length = 10
+    for start in range(0, len(runner.builds), length):
+        params = {
+            "start": start,
+            "length": length,
+            "draw": 1,
+            "order[0][column]": 7,
+            "order[0][dir]": "desc",
+        }
+        with timings.time():
+            response = runner.client.get("/tables/build/", params)
+        assert response.status_code == 200
+
+
+@benchmark("matrix_render")
+def benchmark_matrix_render(runner, timings):
+    """Render the build matrix for each package that was built"""
+    names = sorted(set(spec.name for spec in runner.specs))
+    for name in names:
+        with timings.time():
+            response = runner.client.get("/analysis/matrix/%s/all/" % name)
+        assert response.status_code == 200
+
+
+@benchmark("splice_prediction")
+def benchmark_splice_prediction(runner, timings):
+    """Predict missing symbols when splicing a dependency into a spec"""
+    results = {
+        x.install_file.build.spec_id: x
+        for x in Attribute.objects.filter(name="symbolator-json").select_related(
+            "install_file__build__spec"
+        )
+    }
+
+    # Splice a top level spec for a dependency into any spec that needs it
+    pairs = []
+    for spec in runner.specs:
+        for dep in spec.dependencies.all():
+            for other in runner.specs:
+                if other.name == dep.spec.name and other.id != dep.spec.id:
+                    pairs.append((results.get(spec.id), results.get(other.id)))
+
+    pairs = [x for x in pairs if x[0] and x[1]]
+    for resultA, resultB in pairs[: runner.splices]:
+        with timings.time(), redirect_stdout(io.StringIO()):
+            run_symbols_splice(resultA, resultB)
@@ -0,0 +1,201 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.db.models import Count, Max
+
+from spackmon.apps.main.models import Spec, SpecClosure
+
+import json
+
+# The version of the spack nodes format that we export
+NODES_FORMAT_VERSION = 2
+
+
+class SpecGraph:
+    """Load one or more specs and their dependencies (all of them, or up to
+    a depth) with a fixed number of queries, and serialize them in memory.
+    A spec serialized with Spec.to_dict costs a few queries for each of its
+    dependencies, so anything that serializes more than one spec should use
+    a graph instead. The documents are the same as Spec.to_dict.
+    """
+
+    def __init__(self, specs, depth=None):
+        root_ids = [spec.id if isinstance(spec, Spec) else spec for spec in specs]
+
+        # The closure gives us every dependency (up to depth) in one query,
+        # and we keep the shortest depth from any root
+        self.depths = {x: 0 for x in root_ids}
+        if depth != 0:
+            closure = SpecClosure.objects.filter(ancestor__in=root_ids)
+            if depth is not None:
+                closure = closure.filter(depth__lte=depth)
+            for spec_id, spec_depth in closure.values_list("descendant_id", "depth"):
+                self.depths[spec_id] = min(
+                    spec_depth, self.depths.get(spec_id, spec_depth)
+                )
+        ids = set(self.depths)
+
+        self.specs = {
+            spec.id: spec
+            for spec in Spec.objects.filter(id__in=ids)
+            .select_related("compiler", "arch__target")
+            .prefetch_related("arch__target__features", "arch__target__parents")
+        }
+        self.roots = [self.specs[x] for x in root_ids if x in self.specs]
+
+        # Direct dependencies of every loaded spec, including the name and
+        # hashes of dependencies that are past the depth we loaded
+        self.edges = {spec_id: [] for spec_id in self.specs}
+        for spec_id, dep_id, name, build_hash, full_hash, dtype in (
+            Spec.dependencies.through.objects.filter(spec_id__in=ids)
+            .order_by("dependency_id")
+            .values_list(
+                "spec_id",
+                "dependency__spec_id",
+                "dependency__spec__name",
+                "dependency__spec__build_hash",
+                "dependency__spec__full_hash",
+                "dependency__dependency_type",
+            )
+        ):
+            self.edges[spec_id].append(
+                {
+                    "id": dep_id,
+                    "name": name,
+                    "build_hash": build_hash,
+                    "full_hash": full_hash,
+                    "type": dtype,
+                }
+            )
+
+    def __len__(self):
+        return len(self.specs)
+
+    def __iter__(self):
+        return iter(self.specs.values())
+
+    def get(self, spec):
+        """Return the loaded spec for a spec or spec id"""
+        return self.specs[spec.id if isinstance(spec, Spec) else spec]
+
+    def list_dependencies(self, spec):
+        """Return the direct dependencies of a spec as a single dictionary,
+        with the key as the dependency name (see Spec.list_dependencies)
+        """
+        spec = self.get(spec)
+        return {
+            dep["name"]: {"hash": dep["build_hash"], "type": dep["type"]}
+            for dep in self.edges[spec.id]
+        }
+
+    def to_dict_dependencies(self, spec):
+        """Return the serialized direct dependencies of a spec. These must
+        have been loaded, meaning a depth of at least one.
+        """
+        spec = self.get(spec)
+        return {dep["name"]: self.to_dict(dep["id"]) for dep in self.edges[spec.id]}
+
+    def to_dict_ids(self, spec):
+        """Return the spec with the full hash of each direct dependency"""
+        spec = self.get(spec)
+        return {
+            "full_hash": spec.full_hash,
+            "name": spec.name,
+            "version": spec.version,
+            "spack_version": spec.spack_version,
+            "specs": {dep["name"]: dep["full_hash"] for dep in self.edges[spec.id]},
+        }
+
+    def to_dict(self, spec, include_deps=False):
+        """Return the same dictionary as Spec.to_dict, optionally including
+        the serialized direct dependencies.
+        """
+        spec = self.get(spec)
+        result = {
+            spec.name: {
+                "version": spec.version,
+                "arch": spec.arch.to_dict() if spec.arch else None,
+                "compiler": spec.compiler.to_dict() if spec.compiler else None,
+                "namespace": spec.namespace,
+                "parameters": spec.parameters,
+                "dependencies": self.list_dependencies(spec),
+                "hash": spec.hash,
+                "full_hash": spec.full_hash,
+                "build_hash": spec.build_hash,
+                "package_hash": spec.package_hash,
+            }
+        }
+        if include_deps:
+            result.update(self.to_dict_dependencies(spec))
+        return result
+
+    def to_json(self, spec, include_deps=True):
+        return json.dumps(self.to_dict(spec, include_deps), indent=4).lstrip()
+
+    def to_node(self, spec):
+        """Return a spec as a node in the spack nodes format, which is how it
+        was imported. Fields that we don't have (e.g., the arch of a spec
+        that failed concretization) are left out.
+        """
+        spec = self.get(spec)
+        node = {
+            "name": spec.name,
+            "version": spec.version,
+            "arch": spec.arch.to_dict() if spec.arch else None,
+            "compiler": spec.compiler.to_dict() if spec.compiler else None,
+            "namespace": spec.namespace,
+            "parameters": spec.parameters,
+            "dependencies": [
+                {
+                    "name": dep["name"],
+                    "build_hash": dep["build_hash"],
+                    "full_hash": dep["full_hash"],
+                    "type": dep["type"],
+                }
+                for dep in self.edges[spec.id]
+            ],
+            "hash": spec.hash,
+            "full_hash": spec.full_hash,
+            "build_hash": spec.build_hash,
+            "package_hash": spec.package_hash,
+        }
+        for dep in node["dependencies"]:
+            if dep["build_hash"] is None:
+                del dep["build_hash"]
+        return {key: value for key, value in node.items() if value not in [None, []]}
+
+    def iter_nodes(self):
+        """Yield the loaded specs as nodes, roots first and then dependencies
+        by depth, so the first node is the spec to import.
+        """
+        order = sorted(
+            self.specs.values(), key=lambda x: (self.depths[x.id], x.name, x.id)
+        )
+        for spec in order:
+            yield self.to_node(spec)
+
+    def iter_json(self):
+        """Yield the nodes document ({"spec": {"nodes": [...]}}) in chunks"""
+        yield '{"spec": {"_meta": {"version": %s}, "nodes": [' % NODES_FORMAT_VERSION
+        for i, node in enumerate(self.iter_nodes()):
+            yield ("" if i == 0 else ", ") + json.dumps(node)
+        yield "]}}"
+
+
+def get_nodes_cache_key(spec):
+    """Return the cache key for the nodes export of a spec. The export only
+    changes when a spec in the DAG is updated, or the DAG grows, so the key
+    includes the size of the DAG and the most recent modify date in it.
+    """
+    stamp = SpecClosure.objects.filter(ancestor=spec).aggregate(
+        count=Count("id"), modified=Max("descendant__modify_date")
+    )
+    modified = max(filter(None, [stamp["modified"], spec.modify_date]))
+    return "spec-nodes-%s-%s-%s-%s" % (
+        spec.full_hash,
+        spec.spack_version,
+        stamp["count"],
+        modified.timestamp(),
+    )
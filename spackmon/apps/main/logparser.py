@@ -65,66 +65,299 @@ algorithms that duplicate the way CTest scrapes log files.  To keep this
 up to date with CTest, just make sure the ``*_matches`` and
 ``*_exceptions`` lists are kept up to date with CTest's build handler.
 """
+
 from __future__ import print_function
 from __future__ import division
 
 import re
 import math
+import hashlib
 import multiprocessing
 import time
-from spackmon.apps.main.models import BuildWarning as BW, BuildError as BE
+from django.db import IntegrityError, connections, transaction
+from django.db.models import Count, F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+from spackmon.apps.main.models import (
+    BuildWarning as BW,
+    BuildError as BE,
+    BuildEventRollup,
+    BuildPhase,
+)
+from spackmon.apps.main.utils import get_line_offsets
 from contextlib import contextmanager
 
 from six import StringIO
 
+# The version of the parser (the regular expressions and the fingerprints).
+# Bump it when they change, so phases parsed by an older version are parsed
+# again (see the reparse_logs command).
+LOG_PARSER_VERSION = 1
+
+# The parts of an event that change from build to build, in the order they
+# are replaced: paths, temporary names, hashes and then any other numbers
+_fingerprint_subs = [
+    (re.compile(r"[^\s'\"`(\[<]*/[^\s'\"`)\]>:,;]*"), "<path>"),
+    (re.compile(r"\b(tmp|cc)[a-zA-Z0-9_]{6,}\b"), "<tmp>"),
+    (re.compile(r"\b(?=[a-z0-9]*[0-9])[a-z0-9]{32}\b|\b[0-9a-fA-F]{7,}\b"), "<hash>"),
+    (re.compile(r"\b\d+(\.\d+)*\b"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
 
-def parse_build_logs(build):
-    """
-    Given a build, generate log objects for it
+
+def normalize_event(text):
+    """Strip the parts of an event's text that differ between builds with
+    the same problem (paths, line numbers, hashes and temporary names), so
+    the same error in any build normalizes to the same text.
     """
-    parser = CTestLogParser()
+    for regex, replacement in _fingerprint_subs:
+        text = regex.sub(replacement, text)
+    return text.strip()
 
-    for phase in build.buildphase_set.all():
-        for output in [phase.output, phase.error]:
-            if not output:
-                continue
-            errors, warnings = parser.parse(output)
-
-            # Create errors and warning objects
-            for warning in warnings:
-                try:
-                    source_line_no = warning.source_line_no[0]
-                except:
-                    source_line_no = None
-                log = BW.objects.create(
-                    phase=phase,
-                    source_file=warning.source_file,
-                    source_line_no=source_line_no or 0,
-                    line_no=warning.line_no,
-                    repeat_count=warning.repeat_count,
-                    start=warning.start,
-                    end=warning.end,
-                    text=warning.text,
-                    pre_context="\n".join(warning.pre_context),
-                    post_context="\n".join(warning.post_context),
+
+def get_fingerprint(text):
+    """Return the normalized text of an event, and its fingerprint"""
+    text = normalize_event(text)
+    return text, hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def update_event_rollups(phase, kind, events, day=None):
+    """Add events (of a kind, error or warning) parsed for a phase to the
+    rollups for their fingerprint, package, compiler and day. events is a
+    list of normalized text and fingerprint pairs. A rollup is updated in
+    place, so counting doesn't depend on the number of events stored.
+    """
+    counts = {}
+    for text, fingerprint in events:
+        counts.setdefault(fingerprint, [text, 0])[1] += 1
+    if not counts:
+        return
+
+    spec = phase.build.spec
+    lookup = {
+        "kind": kind,
+        "day": day or timezone.now().date(),
+        "package": spec.name,
+        "compiler": str(spec.compiler) if spec.compiler else "",
+    }
+    for fingerprint, (text, count) in counts.items():
+        rollups = BuildEventRollup.objects.filter(fingerprint=fingerprint, **lookup)
+        if rollups.update(count=F("count") + count, build=phase.build):
+            continue
+        try:
+            with transaction.atomic():
+                BuildEventRollup.objects.create(
+                    fingerprint=fingerprint,
+                    text=text,
+                    count=count,
+                    build=phase.build,
+                    **lookup
                 )
-            for error in errors:
-                try:
-                    source_line_no = error.source_line_no[0]
-                except:
-                    source_line_no = None
-                BE.objects.create(
+        except IntegrityError:
+            # Another worker created it first
+            rollups.update(count=F("count") + count, build=phase.build)
+
+
+def save_log_events(
+    phase, errors, warnings, offsets, first_line=0, context=6, day=None
+):
+    """Create the BuildWarning and BuildError objects for parsed log events,
+    with their fingerprints, and add them to the rollups (for a day, today by
+    default). offsets are the line offsets (see get_line_offsets) of the log
+    from line first_line + 1, and we store the offsets of the line of an
+    event and the range of its context lines, instead of a copy of them.
+    """
+    lines = first_line + len(offsets) - 1
+    for model, kind, events in [(BW, "warning", warnings), (BE, "error", errors)]:
+        objects = []
+        fingerprints = []
+        for event in events:
+            try:
+                source_line_no = event.source_line_no[0]
+            except:
+                source_line_no = None
+            i = event.line_no - first_line - 1
+            fingerprints.append(get_fingerprint(event.text))
+            objects.append(
+                model(
                     phase=phase,
-                    source_file=error.source_file,
+                    source_file=event.source_file,
                     source_line_no=source_line_no or 0,
-                    line_no=error.line_no,
-                    repeat_count=error.repeat_count,
-                    start=error.start,
-                    end=error.end,
-                    text=error.text,
-                    pre_context="\n".join(error.pre_context),
-                    post_context="\n".join(error.post_context),
+                    line_no=event.line_no,
+                    repeat_count=event.repeat_count,
+                    start=max(event.line_no - context, 1),
+                    end=min(event.line_no + context, lines) + 1,
+                    text=event.text,
+                    stream=getattr(event, "stream", "output"),
+                    start_offset=offsets[i],
+                    end_offset=offsets[i + 1] - 1,
+                    fingerprint=fingerprints[-1][1],
                 )
+            )
+        model.objects.bulk_create(objects, batch_size=500)
+        update_event_rollups(phase, kind, fingerprints, day)
+
+
+def remove_log_events(phase):
+    """Delete the events of a phase, and take them out of the rollups. We
+    return the day they were first counted on (or None if there were none),
+    so events that are parsed again are counted on the same day.
+    """
+    spec = phase.build.spec
+    compiler = str(spec.compiler) if spec.compiler else ""
+    days = []
+    for model, kind in [(BW, "warning"), (BE, "error")]:
+        events = model.objects.filter(phase=phase)
+        counts = (
+            events.values("fingerprint", "add_date__date")
+            .annotate(count=Count("id"))
+            .order_by()
+        )
+        for count in counts:
+            days.append(count["add_date__date"])
+            BuildEventRollup.objects.filter(
+                kind=kind,
+                day=count["add_date__date"],
+                fingerprint=count["fingerprint"],
+                package=spec.name,
+                compiler=compiler,
+            ).update(count=Greatest(F("count") - count["count"], 0))
+        events.delete()
+    BuildEventRollup.objects.filter(
+        package=spec.name, compiler=compiler, day__in=days, count=0
+    ).delete()
+    return min(days) if days else None
+
+
+def is_stale(phase):
+    """True if a phase needs to be parsed, because it was never parsed or it
+    was parsed by an older version of the parser. A streamed output that is
+    still running is parsed as it arrives, so it isn't stale.
+    """
+    streaming = phase.output is None and phase.output_size > 0
+    return phase.parser_version < LOG_PARSER_VERSION and not streaming
+
+
+def get_stale_phases(phases=None):
+    """Filter phases (all by default) to those that need to be parsed"""
+    phases = BuildPhase.objects.all() if phases is None else phases
+    return phases.filter(parser_version__lt=LOG_PARSER_VERSION).exclude(
+        output__isnull=True, output_size__gt=0
+    )
+
+
+def parse_phase(phase, parser=None, jobs=None):
+    """Parse the output and error of a phase for errors and warnings, which
+    replace any it has (e.g., from an older version of the parser). The
+    events and the parser version are saved in one transaction, so a phase
+    is either parsed again or still stale. We return the number of events.
+    """
+    parser = parser or CTestLogParser()
+    count = 0
+    with transaction.atomic():
+        day = remove_log_events(phase)
+        for stream in ["output", "error"]:
+            data, offsets = phase.get_log(stream)
+            if not data:
+                continue
+            errors, warnings = parser.parse(data.decode("utf-8"), jobs=jobs)
+            for event in errors + warnings:
+                event.stream = stream
+            save_log_events(phase, errors, warnings, offsets, day=day)
+            count += len(errors) + len(warnings)
+        phase.parser_version = LOG_PARSER_VERSION
+        BuildPhase.objects.filter(id=phase.id).update(parser_version=LOG_PARSER_VERSION)
+    return count
+
+
+def parse_build_logs(build):
+    """
+    Given a build, generate log objects for the phases that were not parsed
+    yet, or were parsed by an older version of the parser. Streamed outputs
+    are parsed as they arrive (see parse_phase_segments) so they are skipped
+    until they are finalized.
+    """
+    parser = CTestLogParser()
+    for phase in get_stale_phases(build.buildphase_set.all()):
+        parse_phase(phase, parser)
+
+
+def reparse_batch(phase_ids):
+    """Parse a batch of phases (by id) that are stale, and return the number
+    of phases and events. This runs in a worker process, which is a daemon,
+    so the parser runs in the same process.
+    """
+    parser = CTestLogParser()
+    phases = get_stale_phases(BuildPhase.objects.filter(id__in=phase_ids))
+    count = events = 0
+    for phase in phases.select_related("build__spec__compiler"):
+        events += parse_phase(phase, parser, jobs=1)
+        count += 1
+    return count, events
+
+
+def reparse_phases(phase_ids, workers=1, batch_size=50):
+    """Parse phases (by id) in batches, in worker processes if workers is more
+    than one, and yield the number of phases and events for each batch as it
+    is done. Each phase is saved with the parser version as it is parsed, so
+    an interrupted run can be resumed by parsing the phases that are still
+    stale.
+    """
+    batches = [
+        phase_ids[i : i + batch_size] for i in range(0, len(phase_ids), batch_size)
+    ]
+    if workers <= 1:
+        for batch in batches:
+            yield reparse_batch(batch)
+        return
+
+    # Workers are forked, and each opens its own database connection
+    connections.close_all()
+    pool = multiprocessing.get_context("fork").Pool(workers)
+    try:
+        for result in pool.imap_unordered(reparse_batch, batches):
+            yield result
+    finally:
+        pool.terminate()
+
+
+def parse_phase_segments(phase, final=False, context=6):
+    """
+    Parse the lines of a streamed phase output that arrived since the last
+    time, and save the errors and warnings. Only the new lines are scanned:
+    we load the segments from the first line not yet parsed. Until the phase
+    is final, a partial last line and the last context lines (which don't
+    have their post context yet) are left for the next time. The phase must
+    be locked (select_for_update) and it is saved by the caller.
+    """
+    segments = list(
+        phase.buildphasesegment_set.annotate(end=F("offset") + F("size"))
+        .filter(end__gt=phase.parsed_offset)
+        .order_by("offset")
+    )
+    if not segments:
+        return [], []
+
+    data = "".join(x.content for x in segments).encode("utf-8")
+    data = data[phase.parsed_offset - segments[0].offset :]
+    if not final:
+        data = data[: data.rfind(b"\n") + 1]
+
+    # Lines to scan, and the lines after them (the post context)
+    lines = data.decode("utf-8").split("\n")
+    if lines[-1] == "":
+        lines.pop()
+    count = len(lines) if final else len(lines) - context
+    if count <= 0:
+        return [], []
+
+    errors, warnings, _ = _parse(lines[:count], phase.parsed_lines, False)
+    offsets = get_line_offsets(data, phase.parsed_offset)
+    save_log_events(phase, errors, warnings, offsets, phase.parsed_lines, context)
+
+    phase.parsed_offset = min(offsets[count], phase.output_size)
+    phase.parsed_lines += count
+    return errors, warnings
 
 
 class prefilter(object):
@@ -533,7 +766,7 @@ class CTestLogParser(object):
         # add log context to all events
         for event in errors + warnings:
             i = event.line_no - 1
-            event.pre_context = [l.rstrip() for l in lines[i - context : i]]
+            event.pre_context = [l.rstrip() for l in lines[max(i - context, 0) : i]]
             event.post_context = [l.rstrip() for l in lines[i + 1 : i + context + 1]]
 
         return errors, warnings
@@ -0,0 +1,100 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from spackmon.apps.main.benchmark import BENCHMARKS, BenchmarkRunner, FleetGenerator
+
+import json
+
+
+class Command(BaseCommand):
+    """run the benchmark suite against a synthetic fleet in a scratch database."""
+
+    help = (
+        "Generate a synthetic fleet into a scratch database, and time the core "
+        "spackmon paths. Choices are %s" % ", ".join(BENCHMARKS)
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "benchmarks", nargs="*", help="benchmarks to run (defaults to all)"
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--specs", type=int, default=50)
+        parser.add_argument("--builds", type=int, default=100)
+        parser.add_argument("--packages", type=int, default=None)
+        parser.add_argument("--log-lines", type=int, default=1000)
+        parser.add_argument("--install-files", type=int, default=50)
+        parser.add_argument("--symbols", type=int, default=100)
+        parser.add_argument("--splices", type=int, default=10)
+        parser.add_argument(
+            "--output", "-o", default=None, help="save json results to this file"
+        )
+
+    def handle(self, *args, **options):
+        try:
+            fleet = FleetGenerator(
+                seed=options["seed"],
+                specs=options["specs"],
+                builds=options["builds"],
+                packages=options["packages"],
+                log_lines=options["log_lines"],
+                install_files=options["install_files"],
+                symbols=options["symbols"],
+            )
+        except ValueError as exc:
+            raise CommandError(str(exc))
+
+        for name in options["benchmarks"]:
+            if name not in BENCHMARKS:
+                raise CommandError(
+                    "%s is not a benchmark, choices are %s"
+                    % (name, ", ".join(BENCHMARKS))
+                )
+
+        # The scratch database is created (and destroyed) like a test database
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            runner = BenchmarkRunner(fleet, splices=options["splices"])
+            results = runner.run(options["benchmarks"])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        print(
+            "%-20s %8s %12s %12s %12s %10s"
+            % ("", "count", "mean", "p95", "total", "queries")
+        )
+        for name, result in results["results"].items():
+            if not result["count"]:
+                print("%-20s %8s" % (name, 0))
+                continue
+            print(
+                "%-20s %8s %11.2fms %11.2fms %11.2fs %10s"
+                % (
+                    name,
+                    result["count"],
+                    result["mean"] * 1000,
+                    result["p95"] * 1000,
+                    result["total"],
+                    result["queries"],
+                )
+            )
+
+        for name, result in results["results"].items():
+            if result.get("items"):
+                print(
+                    "%s: %.1f per second (target %s)"
+                    % (name, result["items_per_second"], result["target"])
+                )
+
+        if options["output"]:
+            with open(options["output"], "w") as fd:
+                fd.write(json.dumps(results, indent=4))
+            print("Results saved to %s" % options["output"])
@@ -0,0 +1,78 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from spackmon.apps.main.logparser import (
+    LOG_PARSER_VERSION,
+    get_stale_phases,
+    reparse_phases,
+)
+
+import multiprocessing
+import time
+
+
+class Command(BaseCommand):
+    """parse the logs of phases that were parsed by an older log parser."""
+
+    help = (
+        "Find build phases that were never parsed, or were parsed by an older "
+        "version of the log parser (the current is %s), and parse them again "
+        "in parallel. An interrupted run can be started again to resume."
+        % LOG_PARSER_VERSION
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=multiprocessing.cpu_count(),
+            help="worker processes (defaults to the number of cpus)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=50,
+            help="phases parsed (and written) together by a worker",
+        )
+        parser.add_argument(
+            "--limit", type=int, default=None, help="parse at most this many phases"
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        if workers < 1 or options["batch_size"] < 1:
+            raise CommandError("--workers and --batch-size must be at least 1")
+
+        # sqlite can't take writes from more than one process at once
+        if connection.vendor == "sqlite" and workers > 1:
+            print("sqlite only allows one writer, using one worker.")
+            workers = 1
+
+        phases = get_stale_phases().order_by("id").values_list("id", flat=True)
+        phase_ids = list(phases[: options["limit"]])
+        total = len(phase_ids)
+        print(
+            "%s phases to parse with log parser version %s, %s workers"
+            % (total, LOG_PARSER_VERSION, workers)
+        )
+
+        start = time.perf_counter()
+        done = events = 0
+        for count, found in reparse_phases(
+            phase_ids, workers=workers, batch_size=options["batch_size"]
+        ):
+            done += count
+            events += found
+            elapsed = time.perf_counter() - start
+            rate = done / elapsed if elapsed else 0
+            remaining = (total - done) / rate if rate else 0
+            print(
+                "%s/%s phases, %s events, %.1f phases/s, %.0fs left"
+                % (done, total, events, rate, remaining)
+            )
+        print("Parsed %s phases in %.2fs" % (done, time.perf_counter() - start))
@@ -0,0 +1,72 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0004_alter_installfile_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RequestProfile",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "add_date",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="date published"
+                    ),
+                ),
+                (
+                    "modify_date",
+                    models.DateTimeField(auto_now=True, verbose_name="date modified"),
+                ),
+                (
+                    "view_name",
+                    models.CharField(
+                        help_text="The module.view profiled", max_length=250
+                    ),
+                ),
+                ("path", models.CharField(max_length=500)),
+                ("method", models.CharField(max_length=10)),
+                (
+                    "args",
+                    models.JSONField(
+                        blank=True,
+                        default=dict,
+                        help_text="View args, kwargs and query",
+                        null=True,
+                    ),
+                ),
+                (
+                    "duration",
+                    models.FloatField(help_text="The total request time in seconds"),
+                ),
+                ("query_count", models.PositiveIntegerField(default=0)),
+                (
+                    "queries",
+                    models.JSONField(
+                        blank=True,
+                        default=list,
+                        help_text="SQL queries and timings",
+                        null=True,
+                    ),
+                ),
+                (
+                    "profile",
+                    models.BinaryField(help_text="zlib compressed (marshalled) pstats"),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,96 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+from collections import deque
+
+
+def populate_closure(apps, schema_editor):
+    """Walk the existing dependency graph breadth first from every spec, to
+    add a closure row for each spec it depends on (with the shortest depth).
+    """
+    Spec = apps.get_model("main", "Spec")
+    Dependency = apps.get_model("main", "Dependency")
+    SpecClosure = apps.get_model("main", "SpecClosure")
+
+    dependency_specs = dict(Dependency.objects.values_list("id", "spec_id"))
+    children = {}
+    for spec_id, dependency_id in Spec.dependencies.through.objects.values_list(
+        "spec_id", "dependency_id"
+    ):
+        children.setdefault(spec_id, set()).add(dependency_specs[dependency_id])
+
+    closures = []
+    for ancestor in children:
+        depths = {}
+        queue = deque((child, 1) for child in children[ancestor])
+        while queue:
+            descendant, depth = queue.popleft()
+            if descendant in depths or descendant == ancestor:
+                continue
+            depths[descendant] = depth
+            queue.extend((x, depth + 1) for x in children.get(descendant, []))
+        closures += [
+            SpecClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+            for descendant, depth in depths.items()
+        ]
+    SpecClosure.objects.bulk_create(closures, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0005_requestprofile"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="SpecClosure",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "depth",
+                    models.PositiveIntegerField(
+                        default=1,
+                        help_text="The shortest path from the ancestor to the descendant",
+                    ),
+                ),
+                (
+                    "ancestor",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dependency_closure",
+                        to="main.spec",
+                    ),
+                ),
+                (
+                    "descendant",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="dependent_closure",
+                        to="main.spec",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="specclosure",
+            index=models.Index(
+                fields=["descendant", "depth"], name="main_speccl_descend_2f0cad_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="specclosure",
+            unique_together={("ancestor", "descendant")},
+        ),
+        migrations.RunPython(populate_closure, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,95 @@
+# Generated by Django 3.2.25 on 2026-10-19 12:58
+
+from django.db import migrations, models
+import django.db.models.deletion
+import taggit.managers
+
+
+def copy_build_tags(apps, schema_editor):
+    """Move build tags from the generic taggit table to TaggedBuild"""
+    ContentType = apps.get_model("contenttypes", "ContentType")
+    TaggedItem = apps.get_model("taggit", "TaggedItem")
+    TaggedBuild = apps.get_model("main", "TaggedBuild")
+
+    content_type = ContentType.objects.filter(app_label="main", model="build").first()
+    if not content_type:
+        return
+    items = TaggedItem.objects.filter(content_type=content_type)
+    TaggedBuild.objects.bulk_create(
+        [
+            TaggedBuild(tag_id=tag_id, content_object_id=object_id)
+            for tag_id, object_id in items.values_list("tag_id", "object_id")
+        ],
+        batch_size=1000,
+        ignore_conflicts=True,
+    )
+    items.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("contenttypes", "0002_remove_content_type_name"),
+        ("taggit", "0003_taggeditem_add_unique_index"),
+        ("main", "0006_specclosure"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaggedBuild",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="build",
+            index=models.Index(
+                fields=["modify_date"], name="main_build_modify__f9effa_idx"
+            ),
+        ),
+        migrations.AddField(
+            model_name="taggedbuild",
+            name="content_object",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, to="main.build"
+            ),
+        ),
+        migrations.AddField(
+            model_name="taggedbuild",
+            name="tag",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE,
+                related_name="main_taggedbuild_items",
+                to="taggit.tag",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="build",
+            name="tags",
+            field=taggit.managers.TaggableManager(
+                help_text="A comma-separated list of tags.",
+                through="main.TaggedBuild",
+                to="taggit.Tag",
+                verbose_name="Tags",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="taggedbuild",
+            index=models.Index(
+                fields=["tag", "content_object"], name="main_tagged_tag_id_58f6b1_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="taggedbuild",
+            unique_together={("content_object", "tag")},
+        ),
+        migrations.RunPython(copy_build_tags, migrations.RunPython.noop),
+    ]
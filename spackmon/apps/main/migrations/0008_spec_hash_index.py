@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0007_taggedbuild"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="spec",
+            index=models.Index(
+                fields=["full_hash", "spack_version"],
+                name="main_spec_full_ha_fe447b_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0008_spec_hash_index"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="spec",
+            name="full_hash",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                help_text="The full hash",
+                max_length=50,
+                null=True,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="spec",
+            name="name",
+            field=models.CharField(
+                db_index=True,
+                help_text="The spec name (without version)",
+                max_length=250,
+            ),
+        ),
+    ]
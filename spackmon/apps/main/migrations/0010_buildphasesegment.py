@@ -0,0 +1,82 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:23
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0009_spec_prefix_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="buildphase",
+            name="output_size",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="The size (in bytes) of the streamed output"
+            ),
+        ),
+        migrations.AddField(
+            model_name="buildphase",
+            name="parsed_lines",
+            field=models.PositiveIntegerField(
+                default=0, help_text="The number of lines of the output that are parsed"
+            ),
+        ),
+        migrations.AddField(
+            model_name="buildphase",
+            name="parsed_offset",
+            field=models.PositiveBigIntegerField(
+                default=0, help_text="The byte offset of the first line not yet parsed"
+            ),
+        ),
+        migrations.CreateModel(
+            name="BuildPhaseSegment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "add_date",
+                    models.DateTimeField(
+                        auto_now_add=True, verbose_name="date published"
+                    ),
+                ),
+                (
+                    "modify_date",
+                    models.DateTimeField(auto_now=True, verbose_name="date modified"),
+                ),
+                (
+                    "offset",
+                    models.PositiveBigIntegerField(
+                        help_text="The byte offset of the segment in the output"
+                    ),
+                ),
+                (
+                    "size",
+                    models.PositiveIntegerField(
+                        help_text="The size of the segment in bytes"
+                    ),
+                ),
+                ("content", models.TextField(blank=True)),
+                (
+                    "phase",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="main.buildphase",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {("phase", "offset")},
+            },
+        ),
+    ]
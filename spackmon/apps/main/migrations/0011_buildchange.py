@@ -0,0 +1,64 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:26
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0010_buildphasesegment"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BuildChange",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("created", "created"),
+                            ("status", "status"),
+                            ("phase", "phase"),
+                        ],
+                        max_length=25,
+                    ),
+                ),
+                (
+                    "status",
+                    models.CharField(
+                        blank=True,
+                        help_text="The status of the build (or of the phase, for a phase change)",
+                        max_length=50,
+                        null=True,
+                    ),
+                ),
+                (
+                    "phase",
+                    models.CharField(
+                        blank=True,
+                        help_text="The name of the phase",
+                        max_length=500,
+                        null=True,
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "build",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="main.build"
+                    ),
+                ),
+            ],
+        ),
+    ]
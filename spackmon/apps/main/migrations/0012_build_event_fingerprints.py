@@ -0,0 +1,137 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:29
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import hashlib
+import re
+
+# A copy of the normalization in logparser as of this migration, so that
+# changing it later doesn't change what the migration does
+fingerprint_subs = [
+    (re.compile(r"[^\s'\"`(\[<]*/[^\s'\"`)\]>:,;]*"), "<path>"),
+    (re.compile(r"\b(tmp|cc)[a-zA-Z0-9_]{6,}\b"), "<tmp>"),
+    (re.compile(r"\b(?=[a-z0-9]*[0-9])[a-z0-9]{32}\b|\b[0-9a-fA-F]{7,}\b"), "<hash>"),
+    (re.compile(r"\b\d+(\.\d+)*\b"), "<n>"),
+    (re.compile(r"\s+"), " "),
+]
+
+
+def get_fingerprint(text):
+    """Return the normalized text of an event, and its fingerprint"""
+    for regex, replacement in fingerprint_subs:
+        text = regex.sub(replacement, text)
+    text = text.strip()
+    return text, hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def populate_fingerprints(apps, schema_editor):
+    """Fingerprint the events that were already parsed, and add them to the
+    rollups for the day they were parsed.
+    """
+    BuildEventRollup = apps.get_model("main", "BuildEventRollup")
+    rollups = {}
+    for kind, model in [("warning", "BuildWarning"), ("error", "BuildError")]:
+        Event = apps.get_model("main", model)
+        events = Event.objects.select_related("phase__build__spec__compiler")
+        updated = []
+        for event in events.iterator(chunk_size=1000):
+            text, event.fingerprint = get_fingerprint(event.text)
+            updated.append(event)
+            if len(updated) >= 1000:
+                Event.objects.bulk_update(updated, ["fingerprint"])
+                updated = []
+
+            build = event.phase.build
+            compiler = build.spec.compiler
+            key = (
+                kind,
+                event.add_date.date(),
+                event.fingerprint,
+                build.spec.name,
+                "%s %s" % (compiler.name, compiler.version) if compiler else "",
+            )
+            rollup = rollups.setdefault(key, {"text": text, "count": 0})
+            rollup["count"] += 1
+            rollup["build_id"] = build.id
+        Event.objects.bulk_update(updated, ["fingerprint"])
+
+    BuildEventRollup.objects.bulk_create(
+        [
+            BuildEventRollup(
+                kind=kind,
+                day=day,
+                fingerprint=fingerprint,
+                package=package,
+                compiler=compiler,
+                **rollup
+            )
+            for (kind, day, fingerprint, package, compiler), rollup in rollups.items()
+        ],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0011_buildchange"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="builderror",
+            name="fingerprint",
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True),
+        ),
+        migrations.AddField(
+            model_name="buildwarning",
+            name="fingerprint",
+            field=models.CharField(blank=True, db_index=True, max_length=16, null=True),
+        ),
+        migrations.CreateModel(
+            name="BuildEventRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("error", "error"), ("warning", "warning")],
+                        max_length=25,
+                    ),
+                ),
+                ("fingerprint", models.CharField(max_length=16)),
+                (
+                    "text",
+                    models.TextField(help_text="The normalized text of the event"),
+                ),
+                ("package", models.CharField(max_length=250)),
+                ("compiler", models.CharField(blank=True, default="", max_length=101)),
+                ("day", models.DateField()),
+                ("count", models.PositiveIntegerField(default=0)),
+                (
+                    "build",
+                    models.ForeignKey(
+                        blank=True,
+                        null=True,
+                        on_delete=django.db.models.deletion.SET_NULL,
+                        to="main.build",
+                    ),
+                ),
+            ],
+            options={
+                "unique_together": {
+                    ("kind", "day", "fingerprint", "package", "compiler")
+                },
+            },
+        ),
+        migrations.RunPython(populate_fingerprints, migrations.RunPython.noop),
+    ]
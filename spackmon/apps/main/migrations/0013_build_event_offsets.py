@@ -0,0 +1,144 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:34
+
+from django.db import migrations, models
+
+import re
+
+# The number of phases (with their events) loaded at once
+PHASE_CHUNK_SIZE = 100
+
+
+# A copy of get_line_offsets in utils as of this migration, so that changing
+# it later doesn't change what the migration does
+def get_line_offsets(data):
+    offsets = [0]
+    offsets += [match.end() for match in re.finditer(b"\n", data)]
+    offsets.append(len(data) + 1)
+    return offsets
+
+
+def populate_offsets(apps, schema_editor):
+    """Find the line of each event in the output (or the error) of its phase,
+    before we drop the copies of the context lines. The offsets of an event
+    that we can't find stay null, so its context is unknown.
+    """
+    BuildPhase = apps.get_model("main", "BuildPhase")
+    BuildPhaseSegment = apps.get_model("main", "BuildPhaseSegment")
+    BuildWarning = apps.get_model("main", "BuildWarning")
+    BuildError = apps.get_model("main", "BuildError")
+    models = [BuildWarning, BuildError]
+
+    phase_ids = set()
+    for model in models:
+        phase_ids |= set(model.objects.values_list("phase_id", flat=True).distinct())
+    phase_ids = sorted(phase_ids)
+
+    for i in range(0, len(phase_ids), PHASE_CHUNK_SIZE):
+        chunk = phase_ids[i : i + PHASE_CHUNK_SIZE]
+        phases = BuildPhase.objects.only("output", "error").in_bulk(chunk)
+
+        # A phase that is still running has its output in segments
+        segments = {}
+        for phase_id, content in (
+            BuildPhaseSegment.objects.filter(
+                phase_id__in=[x.id for x in phases.values() if x.output is None]
+            )
+            .order_by("phase_id", "offset")
+            .values_list("phase_id", "content")
+        ):
+            segments.setdefault(phase_id, []).append(content)
+
+        logs = {}
+        for phase in phases.values():
+            output = phase.output
+            if output is None:
+                output = "".join(segments.get(phase.id, []))
+            for stream, log in [("output", output), ("error", phase.error)]:
+                data = (log or "").encode("utf-8")
+                logs[phase.id, stream] = data, get_line_offsets(data)
+
+        for model in models:
+            updated = []
+            for event in model.objects.filter(phase_id__in=chunk).only(
+                "phase_id", "line_no", "text"
+            ):
+                line = event.line_no - 1
+                for stream in ["output", "error"]:
+                    data, offsets = logs[event.phase_id, stream]
+                    if line < 0 or line + 1 >= len(offsets):
+                        continue
+                    start, end = offsets[line], offsets[line + 1] - 1
+                    if data[start:end].decode("utf-8").strip() == event.text:
+                        event.stream = stream
+                        event.start_offset = start
+                        event.end_offset = end
+                        updated.append(event)
+                        break
+            model.objects.bulk_update(
+                updated, ["stream", "start_offset", "end_offset"], batch_size=1000
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0012_build_event_fingerprints"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="builderror",
+            name="end_offset",
+            field=models.PositiveBigIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="builderror",
+            name="start_offset",
+            field=models.PositiveBigIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="builderror",
+            name="stream",
+            field=models.CharField(
+                choices=[("output", "output"), ("error", "error")],
+                default="output",
+                max_length=10,
+            ),
+        ),
+        migrations.AddField(
+            model_name="buildwarning",
+            name="end_offset",
+            field=models.PositiveBigIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="buildwarning",
+            name="start_offset",
+            field=models.PositiveBigIntegerField(blank=True, default=None, null=True),
+        ),
+        migrations.AddField(
+            model_name="buildwarning",
+            name="stream",
+            field=models.CharField(
+                choices=[("output", "output"), ("error", "error")],
+                default="output",
+                max_length=10,
+            ),
+        ),
+        migrations.RunPython(populate_offsets, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name="builderror",
+            name="post_context",
+        ),
+        migrations.RemoveField(
+            model_name="builderror",
+            name="pre_context",
+        ),
+        migrations.RemoveField(
+            model_name="buildwarning",
+            name="post_context",
+        ),
+        migrations.RemoveField(
+            model_name="buildwarning",
+            name="pre_context",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:37
+
+from django.db import migrations, models
+
+
+def stamp_parsed_phases(apps, schema_editor):
+    """Phases with errors or warnings were parsed by the first version of the
+    parser. Any others might never have been parsed, so they are left stale.
+    """
+    BuildPhase = apps.get_model("main", "BuildPhase")
+    BuildWarning = apps.get_model("main", "BuildWarning")
+    BuildError = apps.get_model("main", "BuildError")
+    phase_ids = set(BuildWarning.objects.values_list("phase_id", flat=True))
+    phase_ids |= set(BuildError.objects.values_list("phase_id", flat=True))
+    BuildPhase.objects.filter(id__in=phase_ids).update(parser_version=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0013_build_event_offsets"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="buildphase",
+            name="parser_version",
+            field=models.PositiveIntegerField(
+                default=0,
+                help_text="The version of the log parser that found the errors and warnings, or 0 if it's not parsed",
+            ),
+        ),
+        migrations.RunPython(stamp_parsed_phases, migrations.RunPython.noop),
+    ]
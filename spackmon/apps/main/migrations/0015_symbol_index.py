@@ -0,0 +1,148 @@
+# Generated by Django 3.2.25 on 2026-10-19 13:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+import hashlib
+
+
+def populate_symbols(apps, schema_editor):
+    """Index the libraries in the symbolator results that we already have,
+    adding each library (by path) and symbol (by name) once.
+    """
+    Attribute = apps.get_model("main", "Attribute")
+    Symbol = apps.get_model("main", "Symbol")
+    SymbolCorpus = apps.get_model("main", "SymbolCorpus")
+    SymbolReference = apps.get_model("main", "SymbolReference")
+
+    def get_digest(name):
+        return hashlib.blake2b(name.encode("utf-8"), digest_size=16).hexdigest()
+
+    symbol_ids = {}
+    for attribute in Attribute.objects.filter(name="symbolator-json").iterator():
+        for entry in attribute.json_value or []:
+            corpus = entry.get("corpus")
+            if not corpus:
+                continue
+            path = corpus["metadata"]["path"]
+            library, created = SymbolCorpus.objects.get_or_create(
+                digest=get_digest(path),
+                defaults={"path": path, "name": corpus["metadata"]["corpus_name"]},
+            )
+            library.attributes.add(attribute)
+            if not created:
+                continue
+
+            symbols = {}
+            for name, meta in corpus.get("symbols", {}).items():
+                name = name.split("@")[0]
+                if not name:
+                    continue
+                symbols[name] = symbols.get(name, False) or meta.get("defined") != "UND"
+            for name in symbols:
+                if name not in symbol_ids:
+                    symbol_ids[name] = Symbol.objects.get_or_create(
+                        digest=get_digest(name), defaults={"name": name}
+                    )[0].id
+            SymbolReference.objects.bulk_create(
+                [
+                    SymbolReference(
+                        corpus=library, symbol_id=symbol_ids[name], defined=defined
+                    )
+                    for name, defined in symbols.items()
+                ],
+                batch_size=500,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("main", "0014_buildphase_parser_version"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Symbol",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.TextField()),
+                ("digest", models.CharField(max_length=32, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SymbolCorpus",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "name",
+                    models.CharField(help_text="The library file name", max_length=250),
+                ),
+                ("path", models.CharField(max_length=1000)),
+                ("digest", models.CharField(max_length=32, unique=True)),
+                ("attributes", models.ManyToManyField(blank=True, to="main.Attribute")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SymbolReference",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("defined", models.BooleanField()),
+                (
+                    "corpus",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="main.symbolcorpus",
+                    ),
+                ),
+                (
+                    "symbol",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="main.symbol"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name="symbolcorpus",
+            name="symbols",
+            field=models.ManyToManyField(
+                through="main.SymbolReference", to="main.Symbol"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="symbolreference",
+            index=models.Index(
+                fields=["symbol", "defined"], name="main_symbol_symbol__8e020a_idx"
+            ),
+        ),
+        migrations.AlterUniqueTogether(
+            name="symbolreference",
+            unique_together={("corpus", "symbol")},
+        ),
+        migrations.RunPython(populate_symbols, migrations.RunPython.noop),
+    ]
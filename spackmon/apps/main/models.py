@@ -3,14 +3,29 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+from django.core import cache
 from django.db import models
-from django.db.models import Count
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.db.models import Count, F
 from taggit.managers import TaggableManager
-from itertools import chain
-
-from .utils import BUILD_STATUS, PHASE_STATUS, FILE_CATEGORIES
-
+from taggit.models import TaggedItemBase
+from io import StringIO
+
+from .utils import (
+    BUILD_CHANGE_KINDS,
+    BUILD_STATUS,
+    PHASE_STATUS,
+    FILE_CATEGORIES,
+    get_line_offsets,
+)
+
+import bisect
 import json
+import marshal
+import pstats
+import uuid
+import zlib
 
 
 class BaseModel(models.Model):
@@ -22,7 +37,10 @@ class BaseModel(models.Model):
 
 
 class BuildEvent(BaseModel):
-    """A BuildEvent is either a warning or an error produced by a build"""
+    """A BuildEvent is either a warning or an error produced by a build. We
+    store where the event is in the phase log (the output, or error), and
+    the context lines around it are read from the log when they are needed.
+    """
 
     phase = models.ForeignKey(
         "main.BuildPhase", null=False, blank=False, on_delete=models.CASCADE
@@ -36,8 +54,45 @@ class BuildEvent(BaseModel):
     start = models.PositiveIntegerField(default=None, blank=True, null=True)
     end = models.PositiveIntegerField(default=None, blank=True, null=True)
     text = models.TextField()
-    pre_context = models.TextField()
-    post_context = models.TextField()
+
+    # The byte offsets of the line of the event in the phase log (null if we
+    # don't know it, e.g., an event parsed before we stored offsets)
+    stream = models.CharField(
+        choices=[("output", "output"), ("error", "error")],
+        max_length=10,
+        default="output",
+    )
+    start_offset = models.PositiveBigIntegerField(default=None, blank=True, null=True)
+    end_offset = models.PositiveBigIntegerField(default=None, blank=True, null=True)
+
+    # The text without paths, numbers, hashes and temporary names (hashed),
+    # so the same error in different builds has the same fingerprint
+    fingerprint = models.CharField(max_length=16, blank=True, null=True, db_index=True)
+
+    def get_lines(self, start, end):
+        """Return the lines of the phase log from start up to end, counting
+        from the line of the event (zero). The log and its line offsets are
+        loaded once for each phase instance. There are no lines if we don't
+        know where the event is.
+        """
+        if self.start_offset is None:
+            return []
+        data, offsets = self.phase.get_log(self.stream)
+        line = bisect.bisect_right(offsets, self.start_offset) - 1
+        start = max(line + start, 0)
+        end = min(line + end, len(offsets) - 1)
+        return [
+            data[offsets[i] : offsets[i + 1] - 1].decode("utf-8").rstrip()
+            for i in range(start, end)
+        ]
+
+    @property
+    def pre_context(self):
+        return "\n".join(self.get_lines(self.start - self.line_no, 0))
+
+    @property
+    def post_context(self):
+        return "\n".join(self.get_lines(1, self.end - self.line_no))
 
     @property
     def pre_context_lines(self):
@@ -61,6 +116,37 @@ class BuildError(BuildEvent):
     pass
 
 
+class BuildEventRollup(models.Model):
+    """The number of errors (or warnings) with a fingerprint that were parsed
+    for a package and compiler on a day, with the last build that had one.
+    Rollups are updated when logs are parsed, so the most common errors
+    across all builds don't need a scan of the events.
+    """
+
+    kind = models.CharField(
+        choices=[("error", "error"), ("warning", "warning")], max_length=25
+    )
+    fingerprint = models.CharField(max_length=16)
+    text = models.TextField(help_text="The normalized text of the event")
+    package = models.CharField(max_length=250)
+    compiler = models.CharField(max_length=101, blank=True, default="")
+    day = models.DateField()
+    count = models.PositiveIntegerField(default=0)
+    build = models.ForeignKey(
+        "main.Build", null=True, blank=True, on_delete=models.SET_NULL
+    )
+
+    def __str__(self):
+        return "[build-event-rollup:%s|%s|%s]" % (self.kind, self.fingerprint, self.day)
+
+    def __repr__(self):
+        return str(self)
+
+    class Meta:
+        app_label = "main"
+        unique_together = (("kind", "day", "fingerprint", "package", "compiler"),)
+
+
 class Attribute(BaseModel):
     """an attribute can be any key/value pair (e.g., an ABI feature) associated
     with an object. We allow the value to be text based (value) or binary
@@ -110,6 +196,64 @@ class Attribute(BaseModel):
         unique_together = (("name", "analyzer", "install_file"),)
 
 
+class Symbol(models.Model):
+    """A symbol name, stored once however many libraries define or import it.
+    Names can be long (e.g., mangled C++ names) so they are looked up by a
+    digest (see get_symbol_digest).
+    """
+
+    name = models.TextField()
+    digest = models.CharField(max_length=32, unique=True)
+
+    def __str__(self):
+        return "[symbol:%s]" % self.name
+
+    def __repr__(self):
+        return str(self)
+
+    class Meta:
+        app_label = "main"
+
+
+class SymbolCorpus(models.Model):
+    """A library from a symbolator corpus, identified by its path (which
+    includes the install prefix). The same library is in the corpora of every
+    spec that depends on it, so its symbols are indexed once, and we keep the
+    symbolator results (attributes) that include it.
+    """
+
+    name = models.CharField(max_length=250, help_text="The library file name")
+    path = models.CharField(max_length=1000)
+    digest = models.CharField(max_length=32, unique=True)
+    attributes = models.ManyToManyField("main.Attribute", blank=True)
+    symbols = models.ManyToManyField("main.Symbol", through="main.SymbolReference")
+
+    def __str__(self):
+        return "[symbol-corpus:%s]" % self.name
+
+    def __repr__(self):
+        return str(self)
+
+    def to_dict(self):
+        return {"id": self.id, "name": self.name, "path": self.path}
+
+    class Meta:
+        app_label = "main"
+
+
+class SymbolReference(models.Model):
+    """A symbol that a library defines (exports), or imports (undefined)"""
+
+    corpus = models.ForeignKey("main.SymbolCorpus", on_delete=models.CASCADE)
+    symbol = models.ForeignKey("main.Symbol", on_delete=models.CASCADE)
+    defined = models.BooleanField()
+
+    class Meta:
+        app_label = "main"
+        unique_together = (("corpus", "symbol"),)
+        indexes = [models.Index(fields=["symbol", "defined"])]
+
+
 class InstallFile(BaseModel):
     """An Install File is associated with a spec package install.
     An install file can be an object, in which case it will have an object_type.
@@ -206,7 +350,7 @@ class Build(BaseModel):
     )
 
     # Tags for the build to identify the experiment
-    tags = TaggableManager()
+    tags = TaggableManager(through="main.TaggedBuild")
 
     # States: succeed, fail, fail because dependency failed (cancelled), not run
     status = models.CharField(
@@ -233,13 +377,19 @@ class Build(BaseModel):
 
     config_args = models.TextField(blank=True, null=True)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """Keep the status we loaded, so a save can tell if it changed"""
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = instance.__dict__.get("status")
+        return instance
+
     @property
     def logs_parsed(self):
-        count = 0
-        for phase in self.buildphase_set.all():
-            count += phase.builderror_set.count()
-            count += phase.buildwarning_set.count()
-        return count
+        """True if every phase is parsed with the current log parser"""
+        from spackmon.apps.main.logparser import get_stale_phases
+
+        return not get_stale_phases(self.buildphase_set.all()).exists()
 
     @property
     def build_errors_parsed(self):
@@ -309,7 +459,9 @@ class Build(BaseModel):
         object name (for lookup or creation) and then we provide either
         a value or a binary_value. E.g.:
             [{"value": content, "install_file": rel_path}]
+        We return the attributes with a json value.
         """
+        attributes = []
         for result in results:
 
             # We currently only support adding attributes to install files
@@ -358,11 +510,13 @@ class Build(BaseModel):
                             analyzer=analyzer_name,
                             install_file=obj,
                         )
+                        attributes.append(attr)
                     except:
                         print(
                             "Issue loading json value, skipping for %s %s"
                             % (result["name"], obj)
                         )
+        return attributes
 
     def update_install_files(self, manifest):
         """Given a spack install manifest, update the spec to include the
@@ -402,6 +556,64 @@ class Build(BaseModel):
     class Meta:
         app_label = "main"
         unique_together = (("spec", "build_environment"),)
+        indexes = [models.Index(fields=["modify_date"])]
+
+
+class TaggedBuild(TaggedItemBase):
+    """A tag for a build. This uses a foreign key to the build instead of the
+    generic taggit relation, so filtering builds by tag is an indexed join.
+    """
+
+    content_object = models.ForeignKey(
+        "main.Build", null=False, blank=False, on_delete=models.CASCADE
+    )
+
+    class Meta:
+        app_label = "main"
+        unique_together = (("content_object", "tag"),)
+        indexes = [models.Index(fields=["tag", "content_object"])]
+
+
+class BuildChange(models.Model):
+    """An append-only log of changes to builds (a build is created, has a new
+    status, or a phase is updated) that dashboards and bots can follow
+    instead of polling the builds. The id of a change is the token to resume
+    the feed after it.
+    """
+
+    build = models.ForeignKey(
+        "main.Build", null=False, blank=False, on_delete=models.CASCADE
+    )
+    kind = models.CharField(choices=BUILD_CHANGE_KINDS, max_length=25)
+    status = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="The status of the build (or of the phase, for a phase change)",
+    )
+    phase = models.CharField(
+        max_length=500, blank=True, null=True, help_text="The name of the phase"
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return "[build-change:%s|%s|%s]" % (self.build_id, self.kind, self.status)
+
+    def __repr__(self):
+        return str(self)
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "build_id": self.build_id,
+            "kind": self.kind,
+            "status": self.status,
+            "phase": self.phase,
+            "created": self.created,
+        }
+
+    class Meta:
+        app_label = "main"
 
 
 class BuildEnvironment(BaseModel):
@@ -524,21 +736,20 @@ class Target(BaseModel):
         return str(self)
 
     def to_dict(self):
+        # Listing (instead of counting) uses features and parents if prefetched
+        features = self.list_features()
+        parents = self.list_parents()
+
         # If we only have a string, just return it
-        if (
-            not self.vendor
-            and not self.generation
-            and self.features.count() == 0
-            and self.parents.count() == 0
-        ):
+        if not self.vendor and not self.generation and not features and not parents:
             return self.name
 
         return {
             "name": self.name,
             "vendor": self.vendor,
-            "features": self.list_features(),
+            "features": features,
             "generation": self.generation,
-            "parents": self.list_parents(),
+            "parents": parents,
         }
 
     class Meta:
@@ -607,6 +818,7 @@ class Spec(BaseModel):
         max_length=250,
         blank=False,
         null=False,
+        db_index=True,
         help_text="The spec name (without version)",
     )
 
@@ -618,13 +830,14 @@ class Spec(BaseModel):
     )
 
     full_hash = models.CharField(
-        max_length=50, blank=True, null=True, help_text="The full hash"
+        max_length=50, blank=True, null=True, db_index=True, help_text="The full hash"
     )
 
     name = models.CharField(
         max_length=250,
         blank=False,
         null=False,
+        db_index=True,
         help_text="The spec name (without version)",
     )
 
@@ -678,14 +891,36 @@ class Spec(BaseModel):
     )
 
     def get_needed_by(self):
-        """Walk up the tree to find other specs that need this one"""
-        needed_by = []
-        for depgroup in Dependency.objects.filter(spec=self):
+        """Find the other specs that directly need this one"""
+        return list(self.get_dependents(max_depth=1))
 
-            # These are the other specs that need the spec here
-            specs = Spec.objects.filter(dependencies=depgroup)
-            needed_by = chain(needed_by, specs)
-        return list(needed_by)
+    def get_dependents(self, max_depth=None):
+        """Get all specs that depend on this one (at any depth, or up to
+        max_depth) from the closure table, annotated with the depth.
+        """
+        # The filters must be in one call to use the same join
+        lookup = {"dependency_closure__descendant": self}
+        if max_depth is not None:
+            lookup["dependency_closure__depth__lte"] = max_depth
+        return (
+            Spec.objects.filter(**lookup)
+            .annotate(depth=F("dependency_closure__depth"))
+            .order_by("depth", "name")
+        )
+
+    def get_dependencies(self, max_depth=None):
+        """Get all specs that this one depends on (at any depth, or up to
+        max_depth) from the closure table, annotated with the depth.
+        """
+        # The filters must be in one call to use the same join
+        lookup = {"dependent_closure__ancestor": self}
+        if max_depth is not None:
+            lookup["dependent_closure__depth__lte"] = max_depth
+        return (
+            Spec.objects.filter(**lookup)
+            .annotate(depth=F("dependent_closure__depth"))
+            .order_by("depth", "name")
+        )
 
     def print(self):
         if self.version:
@@ -711,62 +946,38 @@ class Spec(BaseModel):
     def __repr__(self):
         return str(self)
 
+    def get_graph(self, depth=0):
+        """Load this spec and its dependencies (up to depth) as a SpecGraph"""
+        from spackmon.apps.main.graph import SpecGraph
+
+        return SpecGraph([self], depth=depth)
+
     def to_dict_ids(self):
         """This function is intended to return a simple json response that
         includes the configuration and spec ids, but not additional
         metadata. It's intended to be a lookup for a calling client to make
         additional calls.
         """
-        return {
-            "full_hash": self.full_hash,
-            "name": self.name,
-            "version": self.version,
-            "spack_version": self.spack_version,
-            "specs": {p.spec.name: p.spec.full_hash for p in self.dependencies.all()},
-        }
+        return self.get_graph().to_dict_ids(self)
 
     def list_dependencies(self):
         """Loop through associated dependencies and return a single dictionary,
         with the key as the dependency name
         """
-        deps = {}
-        for dep in self.dependencies.all():
-            deps.update(dep.to_dict())
-        return deps
+        return self.get_graph().list_dependencies(self)
 
     def to_dict_dependencies(self):
         """return the serialized dependency packages"""
-        deps = {}
-        for dep in self.dependencies.all():
-            deps[dep.spec.name] = dep.spec.to_dict()
-        return deps
+        return self.get_graph(depth=1).to_dict_dependencies(self)
 
     def to_dict(self, include_deps=False):
         """We return a dictionary with the package name as key, metadata as
         another dictionary as the main item. This should mimic the original
-        spec json object imported.
+        spec json object imported. To serialize more than one spec, use a
+        SpecGraph (see graph.py) to load them together.
         """
-
-        result = {
-            self.name: {
-                "version": self.version,
-                "arch": self.arch.to_dict() if self.arch else None,
-                "compiler": self.compiler.to_dict() if self.compiler else None,
-                "namespace": self.namespace,
-                "parameters": self.parameters,
-                "dependencies": self.list_dependencies(),
-                "hash": self.hash,
-                "full_hash": self.full_hash,
-                "build_hash": self.build_hash,
-                "package_hash": self.package_hash,
-            }
-        }
-
-        # Do we want to also dump the dependency packages?
-        if include_deps:
-            result.update(self.to_dict_dependencies())
-
-        return result
+        graph = self.get_graph(depth=1 if include_deps else 0)
+        return graph.to_dict(self, include_deps)
 
     def to_json(self, include_deps=True):
         return json.dumps(self.to_dict(include_deps), indent=4).lstrip()
@@ -775,6 +986,9 @@ class Spec(BaseModel):
         app_label = "main"
         unique_together = (("name", "full_hash", "spack_version"),)
 
+        # Specs are looked up by hash without the name (e.g., for a build)
+        indexes = [models.Index(fields=["full_hash", "spack_version"])]
+
 
 class BuildPhase(BaseModel):
     """A build phase stores the name, status, output, and error for a phase.
@@ -801,6 +1015,23 @@ class BuildPhase(BaseModel):
         help_text="The status of the phase, if run.",
     )
 
+    # A streamed output is appended in segments until the phase has a status,
+    # and the lines are parsed for errors and warnings as they arrive
+    output_size = models.PositiveBigIntegerField(
+        default=0, help_text="The size (in bytes) of the streamed output"
+    )
+    parsed_offset = models.PositiveBigIntegerField(
+        default=0, help_text="The byte offset of the first line not yet parsed"
+    )
+    parsed_lines = models.PositiveIntegerField(
+        default=0, help_text="The number of lines of the output that are parsed"
+    )
+    parser_version = models.PositiveIntegerField(
+        default=0,
+        help_text="The version of the log parser that found the errors and "
+        "warnings, or 0 if it's not parsed",
+    )
+
     name = models.CharField(
         max_length=500,
         blank=False,
@@ -814,6 +1045,31 @@ class BuildPhase(BaseModel):
     def __repr__(self):
         return str(self)
 
+    def get_output(self):
+        """Return the output, which for a streamed output is assembled from the
+        segments until the phase is finalized (with a status).
+        """
+        if self.output is None and self.output_size:
+            return "".join(
+                self.buildphasesegment_set.order_by("offset").values_list(
+                    "content", flat=True
+                )
+            )
+        return self.output
+
+    def get_log(self, stream="output"):
+        """Return the output (or error) of the phase encoded as utf-8, with
+        the offsets of its lines (see get_line_offsets). Each is loaded once
+        for an instance, so the events of a phase share it.
+        """
+        if not hasattr(self, "_logs"):
+            self._logs = {}
+        if stream not in self._logs:
+            log = self.get_output() if stream == "output" else self.error
+            data = (log or "").encode("utf-8")
+            self._logs[stream] = data, get_line_offsets(data)
+        return self._logs[stream]
+
     def to_dict(self):
         return {"id": self.id, "status": self.status, "name": self.name}
 
@@ -822,6 +1078,32 @@ class BuildPhase(BaseModel):
         unique_together = (("build", "name"),)
 
 
+class BuildPhaseSegment(BaseModel):
+    """A chunk of the output of a build phase that is still running, at a byte
+    offset of the output. Segments are appended in order, and joined into the
+    output of the phase when it is finalized.
+    """
+
+    phase = models.ForeignKey(
+        "main.BuildPhase", null=False, blank=False, on_delete=models.CASCADE
+    )
+    offset = models.PositiveBigIntegerField(
+        help_text="The byte offset of the segment in the output"
+    )
+    size = models.PositiveIntegerField(help_text="The size of the segment in bytes")
+    content = models.TextField(blank=True)
+
+    def __str__(self):
+        return "[build-phase-segment:%s|%s]" % (self.phase.name, self.offset)
+
+    def __repr__(self):
+        return str(self)
+
+    class Meta:
+        app_label = "main"
+        unique_together = (("phase", "offset"),)
+
+
 class Dependency(BaseModel):
     """A dependency is actually just a link to a spec, but it also includes
     the dependency type
@@ -859,6 +1141,48 @@ class Dependency(BaseModel):
         unique_together = (("spec", "dependency_type"),)
 
 
+class SpecClosure(models.Model):
+    """The transitive closure of the spec dependency graph. There is a row for
+    each spec (the ancestor) and each spec it depends on at any depth (the
+    descendant), with the length of the shortest path between them. It is
+    maintained when dependencies are added, so that all dependents or all
+    dependencies of a spec are a single indexed query.
+    """
+
+    ancestor = models.ForeignKey(
+        "main.Spec",
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE,
+        related_name="dependency_closure",
+    )
+    descendant = models.ForeignKey(
+        "main.Spec",
+        null=False,
+        blank=False,
+        on_delete=models.CASCADE,
+        related_name="dependent_closure",
+    )
+    depth = models.PositiveIntegerField(
+        default=1, help_text="The shortest path from the ancestor to the descendant"
+    )
+
+    def __str__(self):
+        return "[spec-closure:%s|%s|%s]" % (
+            self.ancestor_id,
+            self.descendant_id,
+            self.depth,
+        )
+
+    def __repr__(self):
+        return str(self)
+
+    class Meta:
+        app_label = "main"
+        unique_together = (("ancestor", "descendant"),)
+        indexes = [models.Index(fields=["descendant", "depth"])]
+
+
 class EnvironmentVariable(BaseModel):
     """An environment variable is a key value pair that can be associated with
     one or more spec installs. We parse them from the spack-build-env.txt file,
@@ -895,3 +1219,147 @@ class EnvironmentVariable(BaseModel):
     class Meta:
         app_label = "main"
         unique_together = (("name", "value"),)
+
+
+class RequestProfile(BaseModel):
+    """A RequestProfile is a cProfile capture of a request that went over the
+    slow request threshold (PROFILE_SLOW_REQUESTS_SECONDS). The profile stats
+    are stored compressed, and can be browsed or downloaded by staff.
+    """
+
+    view_name = models.CharField(
+        max_length=250, blank=False, null=False, help_text="The module.view profiled"
+    )
+    path = models.CharField(max_length=500, blank=False, null=False)
+    method = models.CharField(max_length=10, blank=False, null=False)
+    args = models.JSONField(
+        blank=True, null=True, default=dict, help_text="View args, kwargs and query"
+    )
+    duration = models.FloatField(help_text="The total request time in seconds")
+    query_count = models.PositiveIntegerField(default=0)
+    queries = models.JSONField(
+        blank=True, null=True, default=list, help_text="SQL queries and timings"
+    )
+    profile = models.BinaryField(help_text="zlib compressed (marshalled) pstats")
+
+    def get_stats(self, stream=None):
+        """Load the stored profile into a pstats.Stats object"""
+        stats = pstats.Stats(stream=stream)
+        stats.stats = marshal.loads(zlib.decompress(self.profile))
+        stats.get_top_level_stats()
+        return stats
+
+    def stats_text(self, sort="cumulative", limit=50):
+        """Return the profile formatted as text, as pstats would print it"""
+        out = StringIO()
+        self.get_stats(stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "view_name": self.view_name,
+            "path": self.path,
+            "method": self.method,
+            "duration": self.duration,
+            "query_count": self.query_count,
+            "add_date": self.add_date,
+        }
+
+    def __str__(self):
+        return "[request-profile|%s|%.2fs]" % (self.view_name, self.duration)
+
+    def __repr__(self):
+        return str(self)
+
+    class Meta:
+        app_label = "main"
+
+
+# Cache keys for dashboard aggregates (see tasks.get_build_counts and
+# tasks.get_tag_counts), which are kept for all builds, and per owner or tag
+BUILD_COUNTS_CACHE_KEY = "build-counts"
+TAG_COUNTS_CACHE_KEY = "build-tag-counts"
+
+
+def get_aggregate_key(prefix, owner_id=None, tag_id=None):
+    """Return the cache key for an aggregate for all builds, an owner, or a tag"""
+    if owner_id is not None:
+        return "%s-owner-%s" % (prefix, owner_id)
+    if tag_id is not None:
+        return "%s-tag-%s" % (prefix, tag_id)
+    return prefix
+
+
+def invalidate_aggregates(owner_ids=None, tag_ids=None, tags=False):
+    """Delete cached build counts for all builds and the given owners and tags.
+    If tags is True, the tag counts (all builds and per owner) go too.
+    """
+    prefixes = [BUILD_COUNTS_CACHE_KEY]
+    if tags:
+        prefixes.append(TAG_COUNTS_CACHE_KEY)
+    keys = []
+    for prefix in prefixes:
+        keys.append(prefix)
+        keys += [get_aggregate_key(prefix, owner_id=x) for x in owner_ids or []]
+    keys += [get_aggregate_key(BUILD_COUNTS_CACHE_KEY, tag_id=x) for x in tag_ids or []]
+    cache.caches["spackmon_api"].delete_many(keys)
+
+
+@receiver(post_save, sender=Build)
+@receiver(post_delete, sender=Build)
+def invalidate_build_aggregates(sender, instance, created=False, **kwargs):
+    """A new or deleted build, or a status update, invalidates build counts.
+    Other updates (e.g., metadata) don't change the counts.
+    """
+    if kwargs["signal"] is post_save:
+        loaded_status = getattr(instance, "_loaded_status", None)
+        instance._loaded_status = instance.status
+        if not created and loaded_status == instance.status:
+            return
+    tag_ids = TaggedBuild.objects.filter(content_object_id=instance.id).values_list(
+        "tag_id", flat=True
+    )
+    invalidate_aggregates(owner_ids=[instance.owner_id], tag_ids=tag_ids)
+
+
+@receiver(post_save, sender=TaggedBuild)
+@receiver(post_delete, sender=TaggedBuild)
+def invalidate_tag_aggregates(sender, instance, **kwargs):
+    """Any change to build tags invalidates tag counts and counts for the tag"""
+    owner_ids = Build.objects.filter(id=instance.content_object_id).values_list(
+        "owner_id", flat=True
+    )
+    invalidate_aggregates(owner_ids=owner_ids, tag_ids=[instance.tag_id], tags=True)
+
+
+# Workers intern the rows of the small dimension tables (see tasks.py), and
+# any change to an existing row sets a new generation, after which every
+# worker drops what it has. New rows don't change what is interned.
+DIMENSIONS_GENERATION_KEY = "dimensions-generation"
+
+
+def invalidate_dimensions():
+    """Set a new generation for the interned dimension rows"""
+    cache.caches["spackmon_api"].set(
+        DIMENSIONS_GENERATION_KEY, uuid.uuid4().hex, timeout=None
+    )
+
+
+@receiver(post_save, sender=Target)
+@receiver(post_save, sender=Feature)
+@receiver(post_save, sender=Architecture)
+@receiver(post_save, sender=Compiler)
+@receiver(post_save, sender=BuildEnvironment)
+def invalidate_changed_dimension(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_dimensions()
+
+
+@receiver(post_delete, sender=Target)
+@receiver(post_delete, sender=Feature)
+@receiver(post_delete, sender=Architecture)
+@receiver(post_delete, sender=Compiler)
+@receiver(post_delete, sender=BuildEnvironment)
+def invalidate_deleted_dimension(sender, instance, **kwargs):
+    invalidate_dimensions()
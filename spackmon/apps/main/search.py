@@ -0,0 +1,75 @@
+# Copyright 2013-2021 Lawrence Livermore National Security, LLC and other
+# Spack Project Developers. See the top-level COPYRIGHT file for details.
+#
+# SPDX-License-Identifier: (Apache-2.0 OR MIT)
+
+from spackmon.apps.main.models import Spec
+
+# The number of specs returned by a search, unless fewer are asked for
+SEARCH_LIMIT = 20
+MAX_SEARCH_LIMIT = 100
+
+
+def parse_query(query):
+    """Parse a spec search query like spack find does, into a name and a
+    full hash prefix, e.g., zlib, /abc123 or zlib/abc123. Either can be empty.
+    """
+    name, _, full_hash = (query or "").strip().partition("/")
+    return name.strip(), full_hash.strip().lower()
+
+
+def search_specs(query, limit=SEARCH_LIMIT, analyzed=False):
+    """Find specs with a name (and/or full hash) that starts with the query,
+    ordered by name and version. Prefix matches are served by the indexes on
+    name and full_hash, and at most limit specs are loaded, so this is
+    cheap however many specs we have. If analyzed is True, only specs with
+    analysis results (attributes) are included.
+    """
+    name, full_hash = parse_query(query)
+    if not name and not full_hash:
+        return []
+
+    specs = Spec.objects.all()
+    if name:
+        specs = specs.filter(name__startswith=name)
+    if full_hash:
+        specs = specs.filter(full_hash__startswith=full_hash)
+    if analyzed:
+        specs = specs.filter(
+            id__in=Spec.objects.filter(build__installfile__attribute__isnull=False)
+        )
+
+    limit = max(1, min(limit, MAX_SEARCH_LIMIT))
+    specs = (
+        specs.select_related("compiler")
+        .only(
+            "id",
+            "name",
+            "version",
+            "full_hash",
+            "build_hash",
+            "spack_version",
+            "compiler__name",
+            "compiler__version",
+        )
+        .order_by("name", "version", "id")[:limit]
+    )
+    return [
+        {
+            "id": spec.id,
+            "name": spec.name,
+            "version": spec.version,
+            "full_hash": spec.full_hash,
+            "spack_version": spec.spack_version,
+            "compiler": spec.compiler.to_dict() if spec.compiler else None,
+            "label": get_label(spec),
+        }
+        for spec in specs
+    ]
+
+
+def get_label(spec):
+    """The label for a spec in a selection (e.g., zlib v1.2.11 abcdefgh gcc 9.3.0)"""
+    if spec.compiler:
+        return "%s %s" % (spec.pretty_print(), spec.compiler)
+    return spec.pretty_print()
@@ -3,36 +3,102 @@
 #
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
+from django.core import cache
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from taggit.models import Tag
+
 from spackmon.apps.main.models import (
+    BuildChange,
+    BuildEventRollup,
     BuildPhase,
+    BuildPhaseSegment,
     BuildEnvironment,
     Build,
     Spec,
+    SpecClosure,
     Architecture,
     Target,
     Dependency,
     Compiler,
     Feature,
+    TaggedBuild,
+    BUILD_COUNTS_CACHE_KEY,
+    TAG_COUNTS_CACHE_KEY,
+    DIMENSIONS_GENERATION_KEY,
+    get_aggregate_key,
+    invalidate_aggregates,
 )
+from spackmon.apps.main.analysis.index import index_symbols
+from spackmon.apps.main.cache import BloomFilter, TTLCache
+from spackmon.apps.main.logparser import LOG_PARSER_VERSION, parse_phase_segments
 from spackmon.apps.main.utils import read_json
+from spackmon.settings import cfg
+
+from datetime import timedelta
 
 import os
+import threading
+import time
 
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Build environment fields to id (and known ids), local to each worker
+environment_cache = TTLCache(maxsize=4096, ttl=3600)
+
+# Rows of the dimension tables (targets, features, architectures, compilers)
+# by their fields, local to each worker, and the generation they belong to
+dimension_cache = TTLCache(maxsize=4096, ttl=3600)
+dimension_generation = {"value": None}
+
+# The specs (full hash and spack version) that exist as a Bloom filter, local
+# to each worker, that adds the newest specs every SPEC_FILTER_SECONDS
+spec_filter = {"filter": None, "expires_at": 0, "last_id": 0}
+spec_filter_lock = threading.Lock()
+
+# Specs can commit out of order of their ids, so each update of the filter
+# reads again this many ids before the last one it read
+SPEC_FILTER_OVERLAP = 1000
+
+# The most specs that can be checked with one request
+MAX_SPECS_CHECKED = 10000
+
+# Seconds until a gap in the ids of build changes is taken to be a rolled
+# back transaction, and the most changes read (before filters) at once
+CHANGES_COMMIT_SECONDS = 10
+CHANGES_SCAN_SIZE = 500
+
 
 def update_build_phase(build, phase_name, status, output, **kwargs):
     """Given a build, and then a phase name, output, and
     status, update the phase associated with the build. Return a json response
-    with a message
+    with a message. If the output was streamed (see append_build_phase_output)
+    and no output is provided, the status finalizes it: the rest of the lines
+    are parsed and the segments are joined into the output.
     """
     try:
-        build_phase, _ = BuildPhase.objects.get_or_create(build=build, name=phase_name)
-        build_phase.status = status
-        build_phase.output = output
-        build_phase.save()
+        with transaction.atomic():
+            build_phase, _ = BuildPhase.objects.get_or_create(
+                build=build, name=phase_name
+            )
+            build_phase = BuildPhase.objects.select_for_update().get(id=build_phase.id)
+            build_phase.status = status
+            if output is None and build_phase.output_size:
+                if build_phase.output is None:
+                    parse_phase_segments(build_phase, final=True)
+                    build_phase.output = build_phase.get_output()
+                    build_phase.parser_version = LOG_PARSER_VERSION
+            else:
+                build_phase.output = output
+                build_phase.parser_version = 0
+            build_phase.save()
+            build_phase.buildphasesegment_set.all().delete()
+            BuildChange.objects.create(
+                build=build, kind="phase", status=status, phase=phase_name
+            )
         data = {"build_phase": build_phase.to_dict()}
         return {
             "message": "Phase %s was successfully updated." % phase_name,
@@ -43,21 +109,182 @@ def update_build_phase(build, phase_name, status, output, **kwargs):
         return {"message": "There was an issue updating this phase.", "code": 400}
 
 
+def check_dimensions():
+    """Drop the interned dimension rows and build environments of this worker
+    if any worker has changed or deleted one since. This is one read of the
+    shared cache, and ingest calls it once per request instead of looking up
+    each row.
+    """
+    generation = cache.caches["spackmon_api"].get(DIMENSIONS_GENERATION_KEY)
+    if generation != dimension_generation["value"]:
+        dimension_cache.clear()
+        environment_cache.clear()
+        dimension_generation["value"] = generation
+
+
+def get_dimension(model, **fields):
+    """Get or create a dimension row (e.g., a Compiler) by its fields, and
+    intern it for this worker once it is committed.
+    """
+    key = (model.__name__,) + tuple(sorted(fields.items()))
+    instance = dimension_cache.get(key)
+    if instance is None:
+        instance, _ = model.objects.get_or_create(**fields)
+        transaction.on_commit(lambda: dimension_cache.set(key, instance))
+    return instance
+
+
+def get_streamed_output(phase, offset, end):
+    """Return the bytes of a streamed output from offset to end, from the
+    segment at the offset or (when finalized) from the output.
+    """
+    if phase.output is not None:
+        return phase.output.encode("utf-8")[offset:end]
+    segment = phase.buildphasesegment_set.filter(offset=offset).first()
+    if segment is not None:
+        return segment.content.encode("utf-8")[: end - offset]
+
+
+def append_build_phase_output(build, phase_name, offset, output):
+    """Append a chunk of output to a build phase that is still running, at a
+    byte offset, which must be the size of the output so far. Sending the
+    same chunk again (e.g., a retry) is a no-op, and a chunk at any other
+    offset is a conflict (409) that includes the offset the client should
+    send from. The new lines are parsed, so errors and warnings show up while
+    the build is running.
+    """
+    content = output.encode("utf-8")
+    end = offset + len(content)
+    with transaction.atomic():
+        phase, _ = BuildPhase.objects.get_or_create(build=build, name=phase_name)
+        phase = BuildPhase.objects.select_for_update().get(id=phase.id)
+        data = {"build_phase": phase.to_dict(), "offset": phase.output_size}
+
+        # A chunk that we already have is a retry
+        if offset < phase.output_size:
+            if end <= phase.output_size and (
+                get_streamed_output(phase, offset, end) == content
+            ):
+                return {
+                    "message": "This output was already appended.",
+                    "data": data,
+                    "code": 200,
+                }
+            return {
+                "message": "The output at offset %s does not match." % offset,
+                "data": data,
+                "code": 409,
+            }
+
+        if phase.status:
+            return {
+                "message": "Phase %s is finalized." % phase_name,
+                "data": data,
+                "code": 400,
+            }
+
+        if offset > phase.output_size:
+            return {
+                "message": "The output must be appended at offset %s."
+                % phase.output_size,
+                "data": data,
+                "code": 409,
+            }
+
+        BuildPhaseSegment.objects.create(
+            phase=phase, offset=offset, size=len(content), content=output
+        )
+        phase.output_size = end
+        errors, warnings = parse_phase_segments(phase)
+        phase.save()
+
+    data["offset"] = phase.output_size
+    data["errors"] = len(errors)
+    data["warnings"] = len(warnings)
+    return {
+        "message": "Output was appended to phase %s." % phase_name,
+        "data": data,
+        "code": 201,
+    }
+
+
+def get_build_environment(hostname, kernel_version, host_os, host_target, platform):
+    """Get or create a build environment, and return its id and if it was
+    created. Environments are memoized per worker, so a batch of builds from
+    the same host only needs to resolve the environment once.
+    """
+    key = (hostname, kernel_version, host_os, host_target, platform)
+    build_environment_id = environment_cache.get(key)
+    if build_environment_id is not None:
+        return build_environment_id, False
+
+    build_environment, created = BuildEnvironment.objects.get_or_create(
+        hostname=hostname,
+        kernel_version=kernel_version,
+        host_target=host_target,
+        host_os=host_os,
+        platform=platform,
+    )
+
+    # Only remember the id once it is committed, in case of a rollback
+    def remember():
+        environment_cache.set(key, build_environment.id)
+        environment_cache.set(build_environment.id, True)
+
+    transaction.on_commit(remember)
+    return build_environment.id, created
+
+
+def build_environment_exists(build_environment_id):
+    """Determine if a build environment id (e.g., provided by a client) exists"""
+    if environment_cache.get(build_environment_id):
+        return True
+    exists = BuildEnvironment.objects.filter(id=build_environment_id).exists()
+    if exists:
+        transaction.on_commit(lambda: environment_cache.set(build_environment_id, True))
+    return exists
+
+
+def register_build_environment(
+    hostname, kernel_version, host_os, host_target, platform
+):
+    """Register a build environment, returning a stable id that a client can
+    provide instead of the environment when creating builds.
+    """
+    build_environment_id, created = get_build_environment(
+        hostname=hostname,
+        kernel_version=kernel_version,
+        host_os=host_os,
+        host_target=host_target,
+        platform=platform,
+    )
+    return {
+        "message": "Build environment get or create was successful.",
+        "data": {
+            "build_environment_id": build_environment_id,
+            "build_environment_created": created,
+        },
+        "code": 201 if created else 200,
+    }
+
+
 def get_build(
     full_hash,
     spack_version,
-    hostname,
-    kernel_version,
-    host_os,
-    host_target,
-    platform,
-    owner,
+    hostname=None,
+    kernel_version=None,
+    host_os=None,
+    host_target=None,
+    platform=None,
+    owner=None,
     tags=None,
+    build_environment_id=None,
 ):
     """A shared function to first retrieve a spec, then the environment, then the build.
-    This could be made much more efficient if we create a build id to return to the client
-    to store first.
+    The environment can be provided as the id from register_build_environment,
+    otherwise it is looked up (or created) from the environment fields.
     """
+    check_dimensions()
     try:
         spec = Spec.objects.get(full_hash=full_hash, spack_version=spack_version)
     except Spec.DoesNotExist:
@@ -68,36 +295,137 @@ def get_build(
             "code": 400,
         }
 
-    # Get or create the BuildEnvironment
-    build_environment, created = BuildEnvironment.objects.get_or_create(
-        hostname=hostname,
-        kernel_version=kernel_version,
-        host_target=host_target,
-        host_os=host_os,
-        platform=platform,
-    )
+    # Get or create the BuildEnvironment, unless we already have it
+    created = False
+    if build_environment_id is None:
+        build_environment_id, created = get_build_environment(
+            hostname=hostname,
+            kernel_version=kernel_version,
+            host_target=host_target,
+            host_os=host_os,
+            platform=platform,
+        )
+    elif not build_environment_exists(build_environment_id):
+        return {
+            "message": "The build environment %s does not exist."
+            % build_environment_id,
+            "data": {"build_created": False, "build_environment_created": False},
+            "code": 400,
+        }
 
     build, build_created = Build.objects.get_or_create(
-        spec=spec, build_environment=build_environment, owner=owner
+        spec=spec, build_environment_id=build_environment_id, owner=owner
     )
+    if build_created:
+        BuildChange.objects.create(build=build, kind="created", status=build.status)
 
     # Update the tags, the input is comma separated
     if tags:
-        for tag in tags.split(","):
-            build.tags.add(tag)
-        build.save()
+        add_build_tags(build, tags.split(","))
 
     return {
         "message": "Build get or create was successful.",
         "data": {
             "build_created": build_created,
             "build_environment_created": created,
+            "build_environment_id": build_environment_id,
             "build": build.to_dict(),
         },
         "code": 201 if build_created else 200,
     }
 
 
+def add_build_tags(build, names):
+    """Add tags to a build with one bulk insert. Tags that don't exist yet
+    are created, and tags the build already has are skipped.
+    """
+    names = list({name.strip(): None for name in names if name.strip()})
+    if not names:
+        return
+
+    # Tags are case insensitive (TAGGIT_CASE_INSENSITIVE)
+    query = Q()
+    for name in names:
+        query |= Q(name__iexact=name)
+    tags = {tag.name.lower(): tag for tag in Tag.objects.filter(query)}
+    for name in names:
+        if name.lower() not in tags:
+            tags[name.lower()] = Tag.objects.create(name=name)
+
+    existing = set(
+        TaggedBuild.objects.filter(content_object=build).values_list(
+            "tag_id", flat=True
+        )
+    )
+    added = TaggedBuild.objects.bulk_create(
+        [
+            TaggedBuild(content_object=build, tag=tag)
+            for tag in tags.values()
+            if tag.id not in existing
+        ],
+        ignore_conflicts=True,
+    )
+
+    # bulk_create doesn't send signals, so we invalidate tag counts here
+    if added:
+        invalidate_aggregates(
+            owner_ids=[build.owner_id], tag_ids=[x.tag_id for x in added], tags=True
+        )
+
+
+def get_tag_counts(owner_id=None):
+    """Return a list of [tag, build count] for all tags, sorted by tag, and
+    optionally for the builds of one owner. This is cached until the tags
+    for a build change.
+    """
+    filecache = cache.caches["spackmon_api"]
+    key = get_aggregate_key(TAG_COUNTS_CACHE_KEY, owner_id=owner_id)
+    counts = filecache.get(key)
+    if counts is None:
+        tagged = TaggedBuild.objects.all()
+        if owner_id is not None:
+            tagged = tagged.filter(content_object__owner_id=owner_id)
+        counts = [
+            list(x)
+            for x in tagged.values_list("tag__name")
+            .annotate(count=Count("content_object"))
+            .order_by("tag__name")
+        ]
+        filecache.set(key, counts, timeout=86400)
+    return counts
+
+
+def get_build_counts(owner_id=None, tag_id=None):
+    """Return the number of builds, the number per status, and the time of the
+    last activity (the most recent build update) for all builds, or the builds
+    of an owner or tag. This is cached until a build in scope is added, deleted
+    or changes status, so other updates (e.g., metadata) don't move the last
+    activity until then.
+    """
+    filecache = cache.caches["spackmon_api"]
+    key = get_aggregate_key(BUILD_COUNTS_CACHE_KEY, owner_id=owner_id, tag_id=tag_id)
+    counts = filecache.get(key)
+    if counts is None:
+        builds = Build.objects.all()
+        if owner_id is not None:
+            builds = builds.filter(owner_id=owner_id)
+        if tag_id is not None:
+            builds = builds.filter(tags__id=tag_id)
+
+        counts = {"builds": 0, "statuses": {}, "last_activity": None}
+        for status, count, last_activity in (
+            builds.values_list("status")
+            .annotate(count=Count("id"), last_activity=Max("modify_date"))
+            .order_by()
+        ):
+            counts["builds"] += count
+            counts["statuses"][status] = count
+            if not counts["last_activity"] or last_activity > counts["last_activity"]:
+                counts["last_activity"] = last_activity
+        filecache.set(key, counts, timeout=86400)
+    return counts
+
+
 def update_build_status(build, status):
     """Given the metadata (environment and hashes) for a build, retrieve the build based
     on finding the spec and environment
@@ -105,19 +433,137 @@ def update_build_status(build, status):
     # Update the build status
     build.status = status
     build.save()
-    data = {"build": build.to_dict()}
 
-    # If the build's spec has other specs with builds, mark them as cancelled
-    for dep in build.spec.dependencies.all():
-        if dep.spec.build_set.count() > 0:
-            dep_build = dep.spec.build_set.first()
-            if dep_build.status != "SUCCESS":
-                dep_build.status = "CANCELLED"
-                dep_build.save()
+    # If the build failed, cancel builds of every spec it depends on (at any
+    # depth) in the same environment, unless they already succeeded
+    cancelled = []
+    if status == "FAILED":
+        with transaction.atomic():
+
+            # The builds are locked, so one that finishes now waits for us
+            cancelled = list(
+                Build.objects.filter(
+                    spec__dependent_closure__ancestor=build.spec_id,
+                    build_environment=build.build_environment_id,
+                )
+                .exclude(status__in=["SUCCESS", "CANCELLED"])
+                .select_for_update(of=("self",))
+                .values_list("id", flat=True)
+            )
+            builds = Build.objects.filter(id__in=cancelled)
+            builds.exclude(status__in=["SUCCESS", "CANCELLED"]).update(
+                status="CANCELLED", modify_date=timezone.now()
+            )
+        if cancelled:
+
+            # A bulk update doesn't send signals, so we invalidate counts here
+            invalidate_aggregates(
+                owner_ids=builds.values_list("owner_id", flat=True).distinct(),
+                tag_ids=TaggedBuild.objects.filter(content_object__in=cancelled)
+                .values_list("tag_id", flat=True)
+                .distinct(),
+            )
 
+    BuildChange.objects.bulk_create(
+        [BuildChange(build=build, kind="status", status=status)]
+        + [
+            BuildChange(build_id=x, kind="status", status="CANCELLED")
+            for x in cancelled
+        ]
+    )
+    data = {"build": build.to_dict(), "cancelled": cancelled}
     return {"message": "Status updated", "data": data, "code": 200}
 
 
+def get_build_changes(after=None, tag=None, owner=None, limit=100):
+    """Return the changes to builds after a change id (the resume token),
+    oldest first, optionally for builds with a tag or owner (a username).
+    Without a token we start from the latest change, so a new subscriber
+    only sees changes from now on. We also return the token to resume from,
+    which moves past changes that were filtered out.
+
+    A transaction can commit a change after a change with a higher id was
+    read (e.g., concurrent builds on Postgres), so we don't move the token
+    past a gap in the ids until the change after the gap is a few seconds
+    old (a gap that stays is a transaction that was rolled back). A change
+    that commits later than that is skipped, changes are sent at most once.
+    """
+    changes = BuildChange.objects.all()
+    if after is None:
+        return {
+            "changes": [],
+            "after": changes.aggregate(latest=Max("id"))["latest"] or 0,
+        }
+
+    # The last change that we know all changes before it are committed
+    latest = after
+    settled = timezone.now() - timedelta(seconds=CHANGES_COMMIT_SECONDS)
+    for change_id, created in (
+        changes.filter(id__gt=after)
+        .order_by("id")
+        .values_list("id", "created")[:CHANGES_SCAN_SIZE]
+    ):
+        if change_id != latest + 1 and created > settled:
+            break
+        latest = change_id
+    if latest == after:
+        return {"changes": [], "after": after}
+
+    if tag:
+        changes = changes.filter(build__tags__name__iexact=tag).distinct()
+    if owner:
+        changes = changes.filter(build__owner__username=owner)
+    changes = changes.filter(id__gt=after, id__lte=latest).order_by("id")
+    changes = [x.to_dict() for x in changes[:limit]]
+    if len(changes) == limit:
+        latest = changes[-1]["id"]
+    return {"changes": changes, "after": latest}
+
+
+def get_top_build_events(
+    kind="error", days=7, package=None, compiler=None, limit=10, examples=3
+):
+    """Return the most common errors (or warnings) parsed in the last days
+    across all builds, optionally for a package or compiler (e.g., gcc 9.3.0),
+    with the number of times each was seen and a few example builds. This is
+    answered from the rollups, so it costs the same however many events we
+    have stored.
+    """
+    since = timezone.now().date() - timedelta(days=max(days, 1) - 1)
+    rollups = BuildEventRollup.objects.filter(kind=kind, day__gte=since)
+    if package:
+        rollups = rollups.filter(package=package)
+    if compiler:
+        rollups = rollups.filter(compiler=compiler)
+
+    top = list(
+        rollups.values("fingerprint")
+        .annotate(
+            count=Sum("count"),
+            packages=Count("package", distinct=True),
+            last_seen=Max("day"),
+            text=Max("text"),
+        )
+        .order_by("-count", "fingerprint")[:limit]
+    )
+
+    # The latest builds with each event are the examples
+    builds = {}
+    for fingerprint, build_id in (
+        rollups.filter(
+            fingerprint__in=[x["fingerprint"] for x in top], build__isnull=False
+        )
+        .order_by("-day", "-count")
+        .values_list("fingerprint", "build_id")
+    ):
+        found = builds.setdefault(fingerprint, [])
+        if len(found) < examples and build_id not in found:
+            found.append(build_id)
+    for event in top:
+        event["builds"] = builds.get(event["fingerprint"], [])
+    return {"kind": kind, "since": since, "events": top}
+
+
 def update_build_metadata(build, metadata, **kwargs):
     """Given a spec, update it with metadata from the package folder where
     it's installed. We assume that not all data is present. This "metadata"
@@ -134,7 +580,10 @@ def update_build_metadata(build, metadata, **kwargs):
 
         # A generic analyzer is updating features for objects (e.g., libabigail)
         else:
-            build.update_install_files_attributes(analyzer_name, results)
+            for attribute in build.update_install_files_attributes(
+                analyzer_name, results
+            ):
+                index_symbols(attribute)
 
     build.save()
 
@@ -145,31 +594,51 @@ def update_build_metadata(build, metadata, **kwargs):
 def get_target(meta):
     """Given a section of metadata for a target (expected to have name, vendor,
     features, and parents) create the Target objects, which includes also
-    creating Feature and Parent (other Target) objects.
+    creating Feature and Parent (other Target) objects. Targets are interned
+    with their metadata, and an existing target is only saved if it changed.
     """
     # A target can be a string or a data structure
     if isinstance(meta, str):
-        target, _ = Target.objects.get_or_create(name=meta)
+        return get_dimension(Target, name=meta)
+
+    features = meta.get("features", [])
+    parents = meta.get("parents", [])
+    key = (
+        "Target",
+        meta["name"],
+        meta.get("vendor"),
+        meta.get("generation"),
+        tuple(features),
+        tuple(parents),
+    )
+    target = dimension_cache.get(key)
+    if target is not None:
         return target
 
-    target, _ = Target.objects.get_or_create(name=meta["name"])
+    target, created = Target.objects.get_or_create(
+        name=meta["name"],
+        defaults={"generation": meta.get("generation"), "vendor": meta.get("vendor")},
+    )
+    changed = not created and (target.generation, target.vendor) != (
+        meta.get("generation"),
+        meta.get("vendor"),
+    )
     target.generation = meta.get("generation")
     target.vendor = meta.get("vendor")
 
-    # add features
-    features = []
-    for feature_name in meta.get("features", []):
-        feature, _ = Feature.objects.get_or_create(name=feature_name)
-        features.append(feature)
-
-    [target.features.add(x) for x in features]
-
-    # The parent is another target
-    for parent_name in meta.get("parents", []):
-        parent, _ = Target.objects.get_or_create(name=parent_name)
-        target.parents.add(parent)
-
-    target.save()
+    # add features and parents (other targets) that the target doesn't have
+    features = [get_dimension(Feature, name=x) for x in features]
+    parents = [get_dimension(Target, name=x) for x in parents]
+    for related, instances in [(target.features, features), (target.parents, parents)]:
+        existing = set() if created else set(related.values_list("id", flat=True))
+        missing = [x for x in instances if x.id not in existing]
+        if missing:
+            related.add(*missing)
+            changed = changed or not created
+
+    if changed:
+        target.save()
+    transaction.on_commit(lambda: dimension_cache.set(key, target))
     return target
 
 
@@ -179,6 +648,7 @@ def add_dependencies(spec, dependency_list):
     (flattened) specs as a list to generate a configuration.
     """
     # Create dependencies (other specs) - they will be updated later
+    dependency_specs = []
     for dep in dependency_list:
 
         # This assumes the dependencies have the same spack version
@@ -191,11 +661,73 @@ def add_dependencies(spec, dependency_list):
             spec=dependency_spec, dependency_type=dep["type"]
         )
         spec.dependencies.add(dependency)
+        dependency_specs.append(dependency_spec)
 
+    update_spec_closure(spec, dependency_specs)
     spec.save()
     return spec
 
 
+def update_spec_closure(spec, dependency_specs):
+    """Given a spec and the specs it directly depends on, update the closure
+    table. Every ancestor of the spec (and the spec itself) gains every
+    descendant of the dependencies (and the dependencies themselves), and we
+    keep the shortest depth for each pair. Dependencies that are added later
+    (e.g., when their own node is imported) propagate up the same way.
+    """
+    if not dependency_specs:
+        return
+
+    # Depth from each ancestor to the spec
+    ancestors = {spec.id: 0}
+    ancestors.update(
+        SpecClosure.objects.filter(descendant=spec).values_list("ancestor", "depth")
+    )
+
+    # Depth from the spec to each descendant
+    descendants = {dep.id: 1 for dep in dependency_specs}
+    for descendant, depth in SpecClosure.objects.filter(
+        ancestor__in=dependency_specs
+    ).values_list("descendant", "depth"):
+        descendants[descendant] = min(descendants.get(descendant, depth + 1), depth + 1)
+
+    wanted = {}
+    for ancestor, ancestor_depth in ancestors.items():
+        for descendant, descendant_depth in descendants.items():
+            if ancestor != descendant:
+                wanted[(ancestor, descendant)] = ancestor_depth + descendant_depth
+
+    # Only update existing rows if we found a shorter path
+    updated = []
+    for closure in SpecClosure.objects.filter(
+        ancestor__in=list(ancestors), descendant__in=list(descendants)
+    ):
+        depth = wanted.pop((closure.ancestor_id, closure.descendant_id), None)
+        if depth is not None and depth < closure.depth:
+            closure.depth = depth
+            updated.append(closure)
+
+    # Another import that shares the dependencies may add the same rows at
+    # once, so we skip the rows that exist by now and check their depth
+    SpecClosure.objects.bulk_create(
+        [
+            SpecClosure(ancestor_id=ancestor, descendant_id=descendant, depth=depth)
+            for (ancestor, descendant), depth in wanted.items()
+        ],
+        ignore_conflicts=True,
+    )
+    if wanted:
+        for closure in SpecClosure.objects.filter(
+            ancestor__in={x[0] for x in wanted},
+            descendant__in={x[1] for x in wanted},
+        ):
+            depth = wanted.get((closure.ancestor_id, closure.descendant_id))
+            if depth is not None and depth < closure.depth:
+                closure.depth = depth
+                updated.append(closure)
+    SpecClosure.objects.bulk_update(updated, ["depth"])
+
+
 def get_spec(name, meta, spack_version, arch=None, compiler=None):
     """Given a spec name and metadata (hash is required) get or create it"""
     spec, created = Spec.objects.get_or_create(
@@ -210,9 +742,129 @@ def get_spec(name, meta, spack_version, arch=None, compiler=None):
     spec.build_hash = meta.get("build_hash")
     spec.package_hash = meta.get("package_hash")
     spec.save()
+    if created:
+        transaction.on_commit(lambda: remember_spec(spec.full_hash, spack_version))
     return spec, created
 
 
+def get_spec_key(full_hash, spack_version):
+    return "%s/%s" % (full_hash, spack_version)
+
+
+def get_spec_filter():
+    """Return the Bloom filter of the specs in the database, or None if it is
+    disabled (or not built yet). The first time, the filter is built with one
+    scan of the specs, sized for twice the specs so there is room for new
+    ones. After that, every SPEC_FILTER_SECONDS we add the specs with ids
+    after the last one we read (a short scan of the primary key), and only
+    build it again when it is full. A request that finds another thread
+    updating the filter uses the filter that we have.
+    """
+    if not cfg.SPEC_FILTER_SECONDS:
+        return None
+    if (
+        spec_filter["filter"] is not None
+        and spec_filter["expires_at"] >= time.monotonic()
+    ):
+        return spec_filter["filter"]
+    if not spec_filter_lock.acquire(blocking=False):
+        return spec_filter["filter"]
+
+    try:
+        bloom = spec_filter["filter"]
+        last_id = spec_filter["last_id"]
+        specs = Spec.objects.filter(id__gt=max(last_id - SPEC_FILTER_OVERLAP, 0))
+        if bloom is None or len(bloom) + specs.count() > bloom.capacity:
+            bloom = BloomFilter(capacity=2 * Spec.objects.count() + 1024)
+            specs = Spec.objects.all()
+        for spec_id, full_hash, spack_version in specs.values_list(
+            "id", "full_hash", "spack_version"
+        ).iterator():
+            key = get_spec_key(full_hash, spack_version)
+            if key not in bloom:
+                bloom.add(key)
+            last_id = max(last_id, spec_id)
+        spec_filter["filter"] = bloom
+        spec_filter["last_id"] = last_id
+        spec_filter["expires_at"] = time.monotonic() + float(cfg.SPEC_FILTER_SECONDS)
+        return bloom
+    finally:
+        spec_filter_lock.release()
+
+
+def remember_spec(full_hash, spack_version):
+    """Add a new spec to the Bloom filter of this worker (if it is built)"""
+    bloom = spec_filter["filter"]
+    if bloom is not None:
+        bloom.add(get_spec_key(full_hash, spack_version))
+
+
+def get_missing_specs(specs):
+    """Given a list of (full_hash, spack_version) pairs, return the ones that
+    are not in the database, in the same order. A pair that is not in the
+    Bloom filter is definitely missing, so only the pairs that probably
+    exist are looked up, and with one query for each chunk of hashes.
+    """
+    bloom = get_spec_filter()
+    candidates = set(
+        pair for pair in specs if bloom is None or get_spec_key(*pair) in bloom
+    )
+
+    found = set()
+    hashes = sorted(set(full_hash for full_hash, _ in candidates))
+    for start in range(0, len(hashes), 500):
+        found.update(
+            Spec.objects.filter(full_hash__in=hashes[start : start + 500]).values_list(
+                "full_hash", "spack_version"
+            )
+        )
+
+    missing = []
+    for pair in specs:
+        if pair not in found:
+            missing.append(pair)
+            found.add(pair)
+    return missing
+
+
+def check_specs(specs):
+    """Given a list of specs (each with a full_hash and spack_version) that a
+    client has, return the ones that we don't, so a client only needs to
+    upload those.
+    """
+    if not isinstance(specs, list) or len(specs) > MAX_SPECS_CHECKED:
+        return {
+            "message": "specs must be a list of at most %s specs." % MAX_SPECS_CHECKED,
+            "data": {},
+            "code": 400,
+        }
+    pairs = []
+    for spec in specs:
+        if (
+            not isinstance(spec, dict)
+            or not isinstance(spec.get("full_hash"), str)
+            or not isinstance(spec.get("spack_version"), str)
+        ):
+            return {
+                "message": "Each spec requires a full_hash and spack_version.",
+                "data": {},
+                "code": 400,
+            }
+        pairs.append((spec["full_hash"], spec["spack_version"]))
+
+    missing = get_missing_specs(pairs)
+    return {
+        "message": "%s of %s specs are missing." % (len(missing), len(pairs)),
+        "data": {
+            "missing": [
+                {"full_hash": full_hash, "spack_version": spack_version}
+                for full_hash, spack_version in missing
+            ]
+        },
+        "code": 200,
+    }
+
+
 def import_configuration_file(filename, spack_version):
     """import a configuration from file (intended to be run from the command line)"""
     filename = os.path.abspath(filename)
@@ -247,6 +899,7 @@ def import_configuration(config, spack_version):
             "code": 400,
         }
 
+    check_dimensions()
     first_spec = None
     was_created = False
     for i, meta in enumerate(config["nodes"]):
@@ -261,8 +914,9 @@ def import_configuration(config, spack_version):
             target = get_target(meta=meta["arch"]["target"])
 
             # Create architecture
-            arch, _ = Architecture.objects.get_or_create(
-                target=target,
+            arch = get_dimension(
+                Architecture,
+                target_id=target.id,
                 platform=meta["arch"]["platform"],
                 platform_os=meta["arch"]["platform_os"],
             )
@@ -270,8 +924,10 @@ def import_configuration(config, spack_version):
         # Create compiler (only if it's still there)
         compiler = None
         if "compiler" in meta:
-            compiler, _ = Compiler.objects.get_or_create(
-                name=meta["compiler"]["name"], version=meta["compiler"]["version"]
+            compiler = get_dimension(
+                Compiler,
+                name=meta["compiler"]["name"],
+                version=meta["compiler"]["version"],
             )
 
         # Create the spec (full hash and name are unique together)
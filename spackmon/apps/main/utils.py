@@ -4,6 +4,7 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 import json
+import re
 
 import logging
 
@@ -18,6 +19,13 @@ BUILD_STATUS = [
     ("FAILED", "FAILED"),
 ]
 
+# Kinds of changes to a build in the build change feed
+BUILD_CHANGE_KINDS = [
+    ("created", "created"),
+    ("status", "status"),
+    ("phase", "phase"),
+]
+
 
 PHASE_STATUS = [
     ("SUCCESS", "SUCCESS"),
@@ -33,6 +41,18 @@ FILE_CATEGORIES = [
 ]
 
 
+def get_line_offsets(data, base=0):
+    """Return the byte offset of the start of each line of (utf-8 encoded)
+    data, and one past the end of the last line, so line i (counting from
+    zero) is data[offsets[i] : offsets[i + 1] - 1] without its newline. The
+    lines are the same as data.split(b"\\n"), and base is added to each offset.
+    """
+    offsets = [base]
+    offsets += [base + match.end() for match in re.finditer(b"\n", data)]
+    offsets.append(base + len(data) + 1)
+    return offsets
+
+
 def read_json(filename):
     with open(filename, "r") as fd:
         content = json.loads(fd.read())
@@ -226,7 +226,6 @@ def view_analysis_results(request, pkg=None, analysis=None):
     General view to show results (json, values) for some analyzer and a spec
     """
     results = None
-    specs = Spec.objects.exclude(build__installfile__attribute=None).distinct()
     analyses = Attribute.objects.values_list("name", flat=True).distinct()
     if pkg and analysis:
         pkg = Spec.objects.filter(id=pkg)
@@ -243,7 +242,6 @@ def view_analysis_results(request, pkg=None, analysis=None):
         {
             "package": pkg,
             "results": results,
-            "specs": specs,
             "analyses": analyses,
             "analysis": analysis,
         },
@@ -398,7 +396,7 @@ def package_matrix(request, pkg=None, arch=None):
 
         # Convert to a data frame to do summary stats (yes this is actually faster)
         df = pandas.DataFrame(list(specs.values()))
-        df = df.append(pandas.DataFrame(list(failed_concrete.values())))
+        df = pandas.concat([df, pandas.DataFrame(list(failed_concrete.values()))])
 
         # Assemble results by compiler and host os
         rows = []
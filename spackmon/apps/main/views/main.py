@@ -4,8 +4,11 @@
 # SPDX-License-Identifier: (Apache-2.0 OR MIT)
 
 from django.shortcuts import render, get_object_or_404
+from taggit.models import Tag
 from spackmon.apps.main.models import Build
-from spackmon.apps.main.logparser import parse_build_logs
+from spackmon.apps.main.logparser import is_stale, parse_build_logs
+from spackmon.apps.main.tasks import get_build_counts, get_tag_counts
+from spackmon.apps.users.models import User
 
 from ratelimit.decorators import ratelimit
 from spackmon.settings import (
@@ -13,41 +16,56 @@ from spackmon.settings import (
     VIEW_RATE_LIMIT_BLOCK as rl_block,
 )
 
-
 # Dashboard
 
+# Counts for a tag or owner without any builds
+EMPTY_COUNTS = {"builds": 0, "statuses": {}, "last_activity": None}
+
 
 @ratelimit(key="ip", rate=rl_rate, block=rl_block)
 def index(request):
-    builds = Build.objects.all()
-    tags = builds.values_list("tags__name", flat=True).distinct()
-    return render(request, "main/index.html", {"builds": builds, "tags": tags})
+    context = {"counts": get_build_counts(), "tags": get_tag_counts()}
+    return render(request, "main/index.html", context)
 
 
 @ratelimit(key="ip", rate=rl_rate, block=rl_block)
 def builds_by_tag(request, tag):
-    builds = Build.objects.filter(tags__name=tag)
+    tag_id = Tag.objects.filter(name__iexact=tag).values_list("id", flat=True).first()
+    counts = get_build_counts(tag_id=tag_id) if tag_id else EMPTY_COUNTS
     # Present all tags for browsing
-    tags = Build.objects.all().values_list("tags__name", flat=True).distinct()
-    return render(
-        request, "main/index.html", {"builds": builds, "tag": tag, "tags": tags}
-    )
+    context = {"counts": counts, "tag": tag, "tags": get_tag_counts()}
+    return render(request, "main/index.html", context)
 
 
 @ratelimit(key="ip", rate=rl_rate, block=rl_block)
 def builds_by_owner(request, username):
-    builds = Build.objects.filter(owner__username=username)
-    tags = builds.values_list("tags__name", flat=True).distinct()
-    return render(
-        request, "main/index.html", {"builds": builds, "owner": username, "tags": tags}
+    owner_id = (
+        User.objects.filter(username=username).values_list("id", flat=True).first()
     )
+    context = {"counts": EMPTY_COUNTS, "owner": username, "tags": []}
+    if owner_id:
+        context["counts"] = get_build_counts(owner_id=owner_id)
+        context["tags"] = get_tag_counts(owner_id=owner_id)
+    return render(request, "main/index.html", context)
 
 
 @ratelimit(key="ip", rate=rl_rate, block=rl_block)
 def build_detail(request, bid):
     build = get_object_or_404(Build, pk=bid)
 
-    # Generate BuildWarnings and BuildErrors if don't exist
-    if build.logs_parsed == 0:
+    # The events share their phase, so each phase log is loaded once for the
+    # context of its events and the full logs
+    phases = build.buildphase_set.prefetch_related("buildwarning_set", "builderror_set")
+
+    # Generate BuildWarnings and BuildErrors if don't exist (or are stale)
+    if any(is_stale(phase) for phase in phases):
         parse_build_logs(build)
-    return render(request, "builds/detail.html", {"build": build})
+        phases = phases.all()
+
+    context = {
+        "build": build,
+        "phases": phases,
+        "warnings": [x for phase in phases for x in phase.buildwarning_set.all()],
+        "errors": [x for phase in phases for x in phase.builderror_set.all()],
+    }
+    return render(request, "builds/detail.html", context)
@@ -5,6 +5,7 @@
 
 from django.shortcuts import render, get_object_or_404
 from spackmon.apps.main.models import Spec
+from spackmon.apps.main.graph import SpecGraph
 
 from ratelimit.decorators import ratelimit
 from spackmon.settings import (
@@ -19,21 +20,22 @@ import json
 @ratelimit(key="ip", rate=rl_rate, block=rl_block)
 def spec_diff(request, spec1=None, spec2=None):
     """
-    Allow the user to select two specs to diff.
+    Allow the user to select two specs to diff. Specs are searched for
+    with the spec search API, so we don't list them here.
     """
-    specs = Spec.objects.all().order_by("name")
     if not spec1 or not spec2:
-        return render(request, "specs/diff.html", {"specs": specs})
+        return render(request, "specs/diff.html")
 
     spec1 = get_object_or_404(Spec, pk=spec1)
     spec2 = get_object_or_404(Spec, pk=spec2)
-    diff1 = json.dumps(spec1.to_dict(), indent=4).split("\n")
-    diff2 = json.dumps(spec2.to_dict(), indent=4).split("\n")
+    graph = SpecGraph([spec1, spec2], depth=0)
+    diff1 = json.dumps(graph.to_dict(spec1), indent=4).split("\n")
+    diff2 = json.dumps(graph.to_dict(spec2), indent=4).split("\n")
     diff = difflib.HtmlDiff().make_table(diff1, diff2)
     return render(
         request,
         "specs/diff.html",
-        {"specs": specs, "diff": diff, "spec1": spec1, "spec2": spec2},
+        {"diff": diff, "spec1": spec1, "spec2": spec2},
     )
 
 
@@ -43,8 +45,17 @@ def spec_detail(request, specid):
     Show detail for a spec.
     """
     spec = get_object_or_404(Spec, pk=specid)
+    dependencies = spec.dependencies.select_related("spec").prefetch_related(
+        "spec__build_set"
+    )
+    needed_by = spec.get_dependents(max_depth=1).prefetch_related("build_set")
     return render(
         request,
         "specs/detail.html",
-        {"spec": spec},
+        {
+            "spec": spec,
+            "spec_json": SpecGraph([spec], depth=1).to_json(spec),
+            "dependencies": dependencies,
+            "needed_by": needed_by,
+        },
     )
@@ -70,9 +70,9 @@ class User(AbstractUser):
 
     @property
     def builds_count(self):
-        from spackmon.apps.main.models import Build
+        from spackmon.apps.main.tasks import get_build_counts
 
-        return Build.objects.filter(owner=self).count()
+        return get_build_counts(owner_id=self.id)["builds"]
 
     @property
     def token(self):
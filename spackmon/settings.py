@@ -11,6 +11,7 @@ import sys
 from django.core.management.utils import get_random_secret_key
 from datetime import datetime
 from importlib import import_module
+from importlib.util import find_spec
 
 # Build paths inside the project with the base directory
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
@@ -188,10 +189,13 @@ GRAVATAR_DEFAULT_IMAGE = "retro"
 # TODO: add authenticated views here
 AUTHENTICATED_VIEWS = [
     "spackmon.apps.api.views.specs.NewSpec",
+    "spackmon.apps.api.views.specs.CheckSpecs",
     "spackmon.apps.api.views.specs.UpdateSpecMetadata",
     "spackmon.apps.api.views.builds.NewBuild",
+    "spackmon.apps.api.views.builds.NewBuildEnvironment",
     "spackmon.apps.api.views.builds.UpdateBuildStatus",
     "spackmon.apps.api.views.builds.UpdatePhaseStatus",
+    "spackmon.apps.api.views.builds.AppendPhaseOutput",
 ]
 
 # Social Authentication (OAuth2)
@@ -387,6 +391,12 @@ for entry in [
     if entry not in MIDDLEWARE:
         MIDDLEWARE.append(entry)
 
+# Instrumentation and profiling wrap all other middleware to measure total latency
+if cfg.ENABLE_INSTRUMENTATION:
+    MIDDLEWARE.insert(0, "spackmon.apps.api.middleware.InstrumentationMiddleware")
+if cfg.PROFILE_SLOW_REQUESTS_SECONDS is not None:
+    MIDDLEWARE.insert(0, "spackmon.apps.api.middleware.ProfilingMiddleware")
+
 
 # Create a filesystem cache for temporary upload sessions
 cache = cfg.CACHE_DIR or os.path.join(MEDIA_ROOT, "cache")
@@ -455,7 +465,7 @@ REST_FRAMEWORK = {
     #'DEFAULT_PERMISSION_CLASSES': (
     #    'rest_framework.permissions.IsAuthenticated',
     # ),
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.LimitOffsetPagination",
+    "DEFAULT_PAGINATION_CLASS": "spackmon.apps.api.pagination.IdCursorPagination",
     "DEFAULT_AUTHENTICATION_CLASSES": (
         "rest_framework.authentication.SessionAuthentication",
         "rest_framework.authentication.TokenAuthentication",
@@ -469,8 +479,34 @@ REST_FRAMEWORK = {
         "user": "1000/day",
     },
     "PAGE_SIZE": 10,
+    "DEFAULT_RENDERER_CLASSES": [
+        "rest_framework.renderers.JSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+        "spackmon.apps.api.renderers.NDJSONGzipRenderer",
+    ],
+    "DEFAULT_PARSER_CLASSES": [
+        "rest_framework.parsers.JSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ],
 }
 
+# Compact encodings (Accept or Content-Type) if the libraries are installed
+if find_spec("msgpack"):
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append(
+        "spackmon.apps.api.renderers.MsgPackRenderer"
+    )
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append(
+        "spackmon.apps.api.renderers.MsgPackParser"
+    )
+if find_spec("cbor2"):
+    REST_FRAMEWORK["DEFAULT_RENDERER_CLASSES"].append(
+        "spackmon.apps.api.renderers.CBORRenderer"
+    )
+    REST_FRAMEWORK["DEFAULT_PARSER_CLASSES"].append(
+        "spackmon.apps.api.renderers.CBORParser"
+    )
+
 SWAGGER_SETTINGS = {
     "exclude_namespaces": ["internal_apis"],  #  List URL namespaces to ignore
 }
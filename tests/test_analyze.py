@@ -2,16 +2,28 @@
 test spackmon analyze endpoints
 """
 
+from spackmon.apps.api.metrics import registry
 from spackmon.apps.main.models import (
+    Attribute,
     Spec,
     InstallFile,
     BuildPhase,
     Build,
     EnvironmentVariable,
+    Symbol,
+    SymbolCorpus,
+)
+from spackmon.apps.main.analysis.index import diff_libraries, lookup_symbol
+from spackmon.apps.main.analysis.symbols import run_symbols_splice
+from spackmon.apps.main.tasks import (
+    get_build,
+    import_configuration,
+    update_build_metadata,
 )
 from spackmon.apps.users.models import User
 from django.test import TestCase
 
+import json
 import os
 import re
 import sys
@@ -40,6 +52,41 @@ fake_environment = {
 }
 
 
+def make_corpus(path, defined, imported):
+    """Make a (minimal) symbolator corpus for a library"""
+    meta = {
+        "type": "STT_FUNC",
+        "version_info": "VER_NDX_GLOBAL",
+        "binding": "STB_GLOBAL",
+        "visibility": "STV_DEFAULT",
+    }
+    symbols = {name: dict(meta, defined="12") for name in defined}
+    symbols.update({name: dict(meta, defined="UND") for name in imported})
+    return {
+        "corpus": {
+            "metadata": {
+                "path": path,
+                "corpus_name": os.path.basename(path),
+                "corpus_elf_machine": "EM_X86_64",
+                "corpus_elf_class": 64,
+            },
+            "header": {
+                "e_ident": {
+                    "EI_CLASS": "ELFCLASS64",
+                    "EI_DATA": "ELFDATA2LSB",
+                    "EI_VERSION": "EV_CURRENT",
+                    "EI_OSABI": "ELFOSABI_SYSV",
+                    "EI_ABIVERSION": 0,
+                },
+                "e_type": "ET_DYN",
+                "e_machine": "EM_X86_64",
+                "e_version": "EV_CURRENT",
+            },
+            "symbols": symbols,
+        }
+    }
+
+
 def read_environment_file(filename):
     if not os.path.exists(filename):
         return
@@ -160,3 +207,142 @@ class SimpleTest(TestCase):
             == EnvironmentVariable.objects.count()
         )
         assert InstallFile.objects.first().build == build
+
+    def test_symbol_index(self):
+        """Uploaded symbolator results are indexed, so we can find the libraries
+        that define or import a symbol, and compare two libraries
+        """
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+
+        # Two versions of libfoo, and libbar (shared) that needs it
+        foo1 = make_corpus("/opt/foo-1.0/lib/libfoo.so", ["foo_a", "foo_b"], [])
+        foo2 = make_corpus("/opt/foo-2.0/lib/libfoo.so", ["foo_a", "foo_c"], [])
+        bar = make_corpus(
+            "/opt/bar/lib/libbar.so",
+            ["", "bar_a"],
+            ["foo_a@FOO_1.0", "foo_b@@FOO_1.0"],
+        )
+        for name, corpora in [("libfoo1.so", [foo1, bar]), ("libfoo2.so", [foo2, bar])]:
+            symbolator = {
+                "name": "symbolator-json",
+                "install_file": "lib/%s" % name,
+                "json_value": json.dumps(corpora),
+            }
+            update_build_metadata(build, {"symbolator": [symbolator]})
+
+        assert SymbolCorpus.objects.count() == 3
+        assert sorted(Symbol.objects.values_list("name", flat=True)) == [
+            "bar_a",
+            "foo_a",
+            "foo_b",
+            "foo_c",
+        ]
+        libbar = SymbolCorpus.objects.get(path="/opt/bar/lib/libbar.so")
+        assert libbar.attributes.count() == 2
+
+        result = lookup_symbol("foo_a")
+        assert [x["path"] for x in result["defined"]] == [
+            "/opt/foo-1.0/lib/libfoo.so",
+            "/opt/foo-2.0/lib/libfoo.so",
+        ]
+        assert result["imported"] == [libbar.to_dict()]
+        assert lookup_symbol("foo_a@@FOO_1.0") == dict(result, symbol="foo_a")
+        assert lookup_symbol("foo_z") == {
+            "symbol": "foo_z",
+            "defined": [],
+            "imported": [],
+        }
+
+        libfoo1 = SymbolCorpus.objects.get(path="/opt/foo-1.0/lib/libfoo.so")
+        libfoo2 = SymbolCorpus.objects.get(path="/opt/foo-2.0/lib/libfoo.so")
+        result = diff_libraries(libfoo1, libfoo2)
+        assert result["removed"] == ["foo_b"]
+        assert result["added"] == ["foo_c"]
+        assert len(result["importers"]) == 1
+        importer = result["importers"][0]
+        assert importer["id"] == libbar.id and importer["missing"] == 1
+        assert [x["id"] for x in importer["specs"]] == [build.spec.id]
+        assert diff_libraries(libfoo2, libfoo1)["importers"] == []
+
+        response = self.client.get("/ms1/symbols/", {"name": "foo_b"})
+        assert response.status_code == 200
+        assert response.json()["imported"] == [libbar.to_dict()]
+        response = self.client.get("/ms1/symbols/", {"name": "foo_b@@FOO_1.0"})
+        assert response.json()["symbol"] == "foo_b"
+        assert response.json()["imported"] == [libbar.to_dict()]
+        assert self.client.get("/ms1/symbols/").status_code == 400
+        response = self.client.get(
+            "/ms1/symbols/diff/", {"a": libfoo1.id, "b": libfoo2.id}
+        )
+        assert response.status_code == 200
+        assert response.json()["removed"] == ["foo_b"]
+        response = self.client.get("/ms1/symbols/diff/", {"a": libfoo1.id, "b": "x"})
+        assert response.status_code == 400
+        response = self.client.get("/ms1/symbols/diff/", {"a": libfoo1.id, "b": 999})
+        assert response.status_code == 404
+
+    def test_symbols_splice(self):
+        """The solver only runs for a splice that can add missing symbols"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+
+        app = make_corpus("/opt/app/lib/libapp.so", ["app_a"], ["foo_a", "foo_b"])
+        libraries = {
+            "libapp.so": [
+                app,
+                make_corpus("/opt/foo-1.0/lib/libfoo.so.1", ["foo_a", "foo_b"], []),
+            ],
+            "libfoo2.so": [
+                make_corpus(
+                    "/opt/foo-2.0/lib/libfoo.so.2", ["foo_a", "foo_b", "foo_c"], []
+                )
+            ],
+            "libfoo3.so": [make_corpus("/opt/foo-3.0/lib/libfoo.so.3", ["foo_a"], [])],
+        }
+        for name, corpora in libraries.items():
+            symbolator = {
+                "name": "symbolator-json",
+                "install_file": "lib/%s" % name,
+                "json_value": json.dumps(corpora),
+            }
+            update_build_metadata(build, {"symbolator": [symbolator]})
+        attributes = {
+            x.install_file.name: x
+            for x in Attribute.objects.filter(name="symbolator-json")
+        }
+
+        def count(path):
+            return registry.counters.get(("symbol_splices", (("path", path),)), 0)
+
+        fast, solved = count("fast"), count("solver")
+
+        # libfoo 2.0 defines everything 1.0 does
+        result = run_symbols_splice(
+            attributes["lib/libapp.so"], attributes["lib/libfoo2.so"]
+        )
+        assert result["fast_path"] and result["missing"] == []
+        assert result["selected"] == [["libfoo.so.2", "libfoo.so.1"]]
+        assert count("fast") == fast + 1
+
+        # libfoo 3.0 drops a symbol that libapp needs
+        result = run_symbols_splice(
+            attributes["lib/libapp.so"], attributes["lib/libfoo3.so"]
+        )
+        assert not result["fast_path"]
+        assert result["missing"] == ["libapp foo_b"]
+        assert count("solver") == solved + 1
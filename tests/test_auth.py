@@ -0,0 +1,64 @@
+"""
+test spackmon authentication cache
+"""
+
+from spackmon.apps.users.models import User
+from spackmon.apps.api.auth import user_cache
+from rest_framework.authtoken.models import Token
+from django.test import TestCase
+
+import os
+import sys
+
+# Add spackmoncli to the path
+base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+spackmon_dir = os.path.join(base, "script")
+sys.path.insert(0, spackmon_dir)
+
+
+try:
+    from spackmoncli import get_basic_auth
+except ImportError:
+    sys.exit(
+        "Cannot import functions from spackmoncli, "
+        " make sure script folder is added to Python path."
+    )
+
+
+class SimpleTest(TestCase):
+    def setUp(self):
+        user_cache.clear()
+        self.user = User.objects.create_user(
+            username="dinosaur", email="dinosaur@dinosaur.com", password="bigd"
+        )
+
+    def get_token(self, token):
+        headers = {
+            "HTTP_AUTHORIZATION": "Basic %s"
+            % get_basic_auth(self.user.username, token),
+        }
+        return self.client.get("/auth/token/", **headers)
+
+    def test_token_regeneration(self):
+        """A regenerated token invalidates the cached user for the old token"""
+        old_token = self.user.token
+        assert self.get_token(old_token).status_code == 200
+        assert "token:%s" % old_token in user_cache
+
+        # Regenerate the token, the same as the update_token view
+        Token.objects.get(user=self.user).delete()
+        new_token = Token.objects.create(user=self.user).key
+        assert "token:%s" % old_token not in user_cache
+
+        assert self.get_token(old_token).status_code == 403
+        assert self.get_token(new_token).status_code == 200
+
+    def test_user_deactivation(self):
+        """Saving a user evicts every cached entry for that user"""
+        token = self.user.token
+        assert self.get_token(token).status_code == 200
+        assert "token:%s" % token in user_cache
+
+        self.user.is_active = False
+        self.user.save()
+        assert "token:%s" % token not in user_cache
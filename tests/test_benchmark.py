@@ -0,0 +1,37 @@
+"""
+test the spackmon benchmark suite
+"""
+
+from spackmon.apps.main.benchmark import BENCHMARKS, BenchmarkRunner, FleetGenerator
+from spackmon.apps.main.models import Build, Spec
+from django.test import TestCase
+
+
+class SimpleTest(TestCase):
+    def test_fleet(self):
+        """The same seed generates the same fleet"""
+        fleet = FleetGenerator(seed=1, specs=10)
+        again = FleetGenerator(seed=1, specs=10)
+        assert fleet.spec(3) == again.spec(3)
+        assert fleet.spec(3) != FleetGenerator(seed=2, specs=10).spec(3)
+
+        # The top level spec is first, and each dependency is included
+        nodes = fleet.spec(3)["spec"]["nodes"]
+        hashes = set(x["full_hash"] for x in nodes)
+        assert nodes[0] == fleet.root(3)
+        for node in nodes:
+            for dep in node["dependencies"]:
+                assert dep["full_hash"] in hashes
+
+    def test_benchmark(self):
+        """Run each benchmark case against a small fleet"""
+        fleet = FleetGenerator(specs=6, builds=8, log_lines=50, symbols=10)
+        results = BenchmarkRunner(fleet, splices=1).run()
+        assert list(results["results"]) == list(BENCHMARKS)
+        assert results["meta"]["fleet"]["specs"] == 6
+        assert results["results"]["spec_import"]["count"] == 6
+        assert results["results"]["build_create"]["count"] == 8
+        assert results["results"]["log_reparse"]["items"] == 8 * len(fleet.phases)
+        assert results["results"]["log_reparse"]["items_per_second"] > 0
+        assert Spec.objects.filter(spack_version=fleet.spack_version).count() >= 6
+        assert Build.objects.count() == 8
@@ -3,16 +3,51 @@ test spackmon specs endpoints
 """
 
 from spackmon.apps.main.models import (
+    BUILD_COUNTS_CACHE_KEY,
     Spec,
+    BuildChange,
+    BuildError,
+    BuildEventRollup,
     BuildPhase,
+    BuildPhaseSegment,
+    BuildWarning,
     Build,
+    TaggedBuild,
 )
+from spackmon.apps.main.benchmark import FleetGenerator
+from spackmon.apps.main.logparser import (
+    CTestLogParser,
+    LOG_PARSER_VERSION,
+    get_fingerprint,
+    parse_build_logs,
+)
+from spackmon.apps.main.tasks import (
+    add_build_tags,
+    append_build_phase_output,
+    get_build,
+    get_build_changes,
+    get_build_counts,
+    get_tag_counts,
+    get_top_build_events,
+    import_configuration,
+    update_build_metadata,
+    update_build_phase,
+    update_build_status,
+)
+from spackmon.apps.api.views.builds import waiting
 from spackmon.apps.users.models import User
+from django.core import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.utils import timezone
 
+from datetime import timedelta
+
+import io
 import os
 import re
 import sys
+import time
 
 # Add spackmoncli to the path
 base = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
@@ -129,6 +164,17 @@ class SimpleTest(TestCase):
         build = Build.objects.first()
         assert build.status == "NOTRUN"
 
+        # Builds for two dependencies in the same environment, one succeeded
+        deps = [x.spec for x in singularity.dependencies.all()[:2]]
+        dep_builds = [
+            Build.objects.create(
+                spec=dep, build_environment=build.build_environment, owner=self.user
+            )
+            for dep in deps
+        ]
+        dep_builds[1].status = "SUCCESS"
+        dep_builds[1].save()
+
         # Now let's update the build to be failed - this should cancel deps
         response = self.client.post(
             "/ms1/builds/update/",
@@ -140,9 +186,12 @@ class SimpleTest(TestCase):
         data = response.json()
         assert data.get("code") == 200
         assert "build" in data.get("data")
+        assert data["data"]["cancelled"] == [dep_builds[0].id]
 
-        build = Build.objects.first()
+        build = Build.objects.get(spec=singularity)
         assert build.status == "FAILED"
+        assert Build.objects.get(id=dep_builds[0].id).status == "CANCELLED"
+        assert Build.objects.get(id=dep_builds[1].id).status == "SUCCESS"
 
         # Next, let's emulate updating package phases
         phases = ["autoconf", "build", "install"]
@@ -174,3 +223,432 @@ class SimpleTest(TestCase):
             assert build_phase.name == phase
             assert build_phase.output == output
             assert build_phase.status == status
+
+    def test_build_environment_id(self):
+        """A registered build environment id can be used to create builds"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        full_hash = "36u22fm5i3w2tqyiyje22j6x55emekjw"
+
+        response = self.client.post("/ms1/environments/new/", data=fake_environment)
+        assert response.status_code == 401
+        self.add_authentication(response)
+        response = self.client.post(
+            "/ms1/environments/new/",
+            data=fake_environment,
+            content_type="application/json",
+            **self.headers
+        )
+        assert response.status_code == 201
+        data = response.json()["data"]
+        assert data["build_environment_created"]
+        build_environment_id = data["build_environment_id"]
+
+        # Registering again returns the same id
+        response = self.client.post(
+            "/ms1/environments/new/",
+            data=fake_environment,
+            content_type="application/json",
+            **self.headers
+        )
+        assert response.status_code == 200
+        assert response.json()["data"]["build_environment_id"] == build_environment_id
+
+        response = self.client.post(
+            "/ms1/builds/new/",
+            data={
+                "full_hash": full_hash,
+                "spack_version": "1.0.0",
+                "build_environment_id": build_environment_id,
+            },
+            content_type="application/json",
+            **self.headers
+        )
+        assert response.status_code == 201
+        build = Build.objects.get(id=response.json()["data"]["build"]["build_id"])
+        assert build.build_environment_id == build_environment_id
+
+        # An environment that doesn't exist is a bad request
+        response = self.client.post(
+            "/ms1/builds/new/",
+            data={
+                "full_hash": full_hash,
+                "spack_version": "1.0.0",
+                "build_environment_id": build_environment_id + 1,
+            },
+            content_type="application/json",
+            **self.headers
+        )
+        assert response.status_code == 400
+
+        # And so is an id that isn't a number
+        for value in ["abc", [build_environment_id], {"id": build_environment_id}]:
+            response = self.client.post(
+                "/ms1/builds/new/",
+                data={
+                    "full_hash": full_hash,
+                    "spack_version": "1.0.0",
+                    "build_environment_id": value,
+                },
+                content_type="application/json",
+                **self.headers
+            )
+            assert response.status_code == 400
+
+    def test_build_tags(self):
+        """Tags are added in bulk, and the cached tag counts follow them"""
+        cache.caches["spackmon_api"].clear()
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            tags="ci,nightly, ci",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        assert sorted(build.tags.names()) == ["ci", "nightly"]
+        assert get_tag_counts() == [["ci", 1], ["nightly", 1]]
+
+        # Existing tags match case insensitively, and new ones update the counts
+        add_build_tags(build, ["CI", "release"])
+        assert TaggedBuild.objects.filter(content_object=build).count() == 3
+        assert get_tag_counts() == [["ci", 1], ["nightly", 1], ["release", 1]]
+
+        build.tags.remove("nightly")
+        assert get_tag_counts() == [["ci", 1], ["release", 1]]
+        assert self.client.get("/builds/tag/ci/").status_code == 200
+
+    def test_build_counts(self):
+        """Cached build counts are invalidated by build and tag changes"""
+        cache.caches["spackmon_api"].clear()
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        assert get_build_counts()["builds"] == 0
+        assert self.user.builds_count == 0
+
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            tags="ci",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        tag_id = build.tags.get().id
+        for counts in [
+            get_build_counts(),
+            get_build_counts(owner_id=self.user.id),
+            get_build_counts(tag_id=tag_id),
+        ]:
+            assert counts["builds"] == 1
+            assert counts["statuses"] == {"NOTRUN": 1}
+            assert counts["last_activity"] == build.modify_date
+        assert self.user.builds_count == 1
+        assert get_tag_counts(owner_id=self.user.id) == [["ci", 1]]
+
+        # Other updates (e.g., metadata) don't invalidate the counts
+        filecache = cache.caches["spackmon_api"]
+        build = Build.objects.get(id=build.id)
+        update_build_metadata(build, {"config_args": "--enable-suid"})
+        assert filecache.get(BUILD_COUNTS_CACHE_KEY) is not None
+
+        # A status update (including cancelled dependencies) updates counts
+        update_build_status(build, "FAILED")
+        assert filecache.get(BUILD_COUNTS_CACHE_KEY) is None
+        assert get_build_counts(tag_id=tag_id)["statuses"] == {"FAILED": 1}
+        assert get_build_counts(owner_id=self.user.id)["statuses"] == {"FAILED": 1}
+
+        response = self.client.get("/builds/owner/%s/" % self.user.username)
+        assert response.status_code == 200
+        assert response.context["counts"]["builds"] == 1
+        response = self.client.get("/builds/tag/doesnotexist/")
+        assert response.context["counts"]["builds"] == 0
+
+    def test_append_phase_output(self):
+        """A streamed phase output is parsed as it arrives, and is the same
+        as the output parsed at once when it is finalized
+        """
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        output = FleetGenerator(seed=3, log_lines=300).phase_log(0, "build", True)
+        output = output.replace("unused", "unused \u00e9")
+
+        # Chunks split lines (and multibyte characters in bytes, not strings)
+        offset = 0
+        chunks = [output[i : i + 997] for i in range(0, len(output), 997)]
+        for chunk in chunks:
+            result = append_build_phase_output(build, "build", offset, chunk)
+            assert result["code"] == 201
+            offset = result["data"]["offset"]
+        assert offset == len(output.encode("utf-8"))
+        phase = BuildPhase.objects.get(build=build, name="build")
+        assert phase.status is None and phase.output is None
+        assert phase.get_output() == output
+        assert BuildWarning.objects.filter(phase=phase).exists()
+
+        # A retry is a no-op, and a gap or a different chunk are conflicts
+        result = append_build_phase_output(build, "build", 0, chunks[0])
+        assert result["code"] == 200 and result["data"]["offset"] == offset
+        assert append_build_phase_output(build, "build", 0, "nope")["code"] == 409
+        assert append_build_phase_output(build, "build", offset + 1, "x")["code"] == 409
+        assert BuildPhaseSegment.objects.filter(phase=phase).count() == len(chunks)
+
+        # The status finalizes the output, and the events match a full parse
+        update_build_phase(build, "build", "FAILED", None)
+        phase.refresh_from_db()
+        assert phase.output == output
+        assert not BuildPhaseSegment.objects.filter(phase=phase).exists()
+        errors, warnings = CTestLogParser().parse(output, jobs=1)
+        data = output.encode("utf-8")
+        for model, events in [(BuildError, errors), (BuildWarning, warnings)]:
+            saved = model.objects.filter(phase=phase).order_by("line_no")
+            assert [
+                (x.line_no, x.text, x.pre_context, x.post_context) for x in saved
+            ] == [
+                (x.line_no, x.text, "\n".join(x.pre_context), "\n".join(x.post_context))
+                for x in events
+            ]
+            for event in saved:
+                line = data[event.start_offset : event.end_offset].decode("utf-8")
+                assert line.strip() == event.text
+        assert BuildError.objects.filter(phase=phase).exists()
+
+        # An event that we can't find in the log has no context (not the top)
+        unknown = BuildError.objects.filter(phase=phase).first()
+        unknown.start_offset = unknown.end_offset = None
+        assert unknown.pre_context == unknown.post_context == ""
+
+        # The build page loads the phase log once for the context of its events
+        with self.assertNumQueries(8):
+            response = self.client.get("/builds/%s/" % build.id)
+        assert response.status_code == 200
+        content = response.content.decode("utf-8")
+        for error in BuildError.objects.filter(phase=phase):
+            assert "collapse-error-%s" % error.id in content
+
+        # Retries still work, but a finalized phase can't be appended to
+        result = append_build_phase_output(build, "build", 0, chunks[0])
+        assert result["code"] == 200
+        assert append_build_phase_output(build, "build", offset, "x")["code"] == 400
+        update_build_phase(build, "build", "FAILED", None)
+        assert BuildPhase.objects.get(id=phase.id).output == output
+
+    def test_append_phase_output_endpoint(self):
+        """The owner of a build can append output to a phase with a token"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build_id = result["data"]["build"]["build_id"]
+
+        def append(offset, output):
+            return self.client.post(
+                "/ms1/builds/phases/append/",
+                data={
+                    "build_id": build_id,
+                    "phase_name": "build",
+                    "offset": offset,
+                    "output": output,
+                },
+                content_type="application/json",
+                **self.headers
+            )
+
+        response = append(0, "make all\n")
+        assert response.status_code == 401
+        self.add_authentication(response)
+
+        response = append(0, "make all\n")
+        assert response.status_code == 201
+        offset = response.json()["data"]["offset"]
+        assert offset == len("make all\n")
+
+        # A retry is a no-op, and a gap is a conflict
+        assert append(0, "make all\n").status_code == 200
+        assert append(offset + 1, "gcc\n").status_code == 409
+
+        # A finalized phase can't be appended to
+        build = Build.objects.get(id=build_id)
+        update_build_phase(build, "build", "SUCCESS", None)
+        assert append(offset, "gcc\n").status_code == 400
+
+    def test_build_changes(self):
+        """Build changes are a feed that can be resumed, or filtered by tag"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        start = get_build_changes()["after"]
+
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            tags="ci",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        update_build_phase(build, "build", "SUCCESS", "done")
+        update_build_status(build, "SUCCESS")
+
+        result = get_build_changes(start)
+        assert [(x["kind"], x["status"]) for x in result["changes"]] == [
+            ("created", "NOTRUN"),
+            ("phase", "SUCCESS"),
+            ("status", "SUCCESS"),
+        ]
+        assert get_build_changes(result["after"])["changes"] == []
+        build.tags.add("CI")
+        assert len(get_build_changes(start, tag="CI")["changes"]) == 3
+
+        result = get_build_changes(start, tag="nightly")
+        assert result["changes"] == [] and result["after"] > start
+
+        # Long poll and server-sent events, which resume from Last-Event-ID
+        url = "/ms1/builds/changes/"
+        response = self.client.get(url, {"after": start, "owner": self.user.username})
+        assert response.status_code == 200
+        assert [x["build_id"] for x in response.json()["changes"]] == [build.id] * 3
+        response = self.client.get(
+            url,
+            {"wait": 0},
+            HTTP_ACCEPT="text/event-stream",
+            HTTP_LAST_EVENT_ID=str(start + 1),
+        )
+        assert response["Content-Type"] == "text/event-stream"
+        events = b"".join(response.streaming_content).decode("utf-8")
+        assert "event: ready\nid: %s\n" % (start + 1) in events
+        assert events.count("\nid: ") == 3
+        assert self.client.get(url, {"after": "x"}).status_code == 400
+
+        # The token doesn't move past a change that may not be committed yet
+        after = get_build_changes(start)["after"]
+        first, missing, last = [
+            BuildChange.objects.create(build=build, kind="status", status="SUCCESS")
+            for _ in range(3)
+        ]
+        missing.delete()
+        result = get_build_changes(after)
+        assert [x["id"] for x in result["changes"]] == [first.id]
+        assert get_build_changes(result["after"])["changes"] == []
+        BuildChange.objects.filter(id=last.id).update(
+            created=timezone.now() - timedelta(minutes=1)
+        )
+        result = get_build_changes(result["after"])
+        assert [x["id"] for x in result["changes"]] == [last.id]
+
+        # A worker that is serving as many waiting requests as it can answers
+        # others right away
+        waiting.acquire()
+        try:
+            started = time.monotonic()
+            response = self.client.get(url, {"after": result["after"], "wait": 30})
+            assert response.json()["changes"] == []
+            assert time.monotonic() - started < 5
+        finally:
+            waiting.release()
+
+    def test_top_build_events(self):
+        """The same error in different builds has the same fingerprint, and
+        the top errors are counted from the rollups
+        """
+        first = get_fingerprint(
+            "/tmp/spack-stage/spack-stage-zlib-1.2.11-36u22fm5i3w2tqyiyje22j6x55emekjw"
+            "/spack-src/adler32.c:12:5: error: 'x' undeclared"
+        )
+        second = get_fingerprint(
+            "/home/dinosaur/src/inflate.c:93:1: error: 'x' undeclared"
+        )
+        assert first == second
+        assert first[0] == "<path>:<n>:<n>: error: 'x' undeclared"
+        assert get_fingerprint("cc1: error: ccAbC123.s: Error 2")[0] == (
+            "cc1: error: <tmp>.s: Error <n>"
+        )
+
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        output = "\n".join(
+            [
+                "src/a.c:1:1: error: 'x' undeclared",
+                "src/b.c:22:7: error: 'x' undeclared",
+                "collect2: error: ld returned 1 exit status",
+            ]
+        )
+        update_build_phase(build, "build", "FAILED", output)
+        parse_build_logs(build)
+        assert BuildError.objects.filter(phase__build=build).count() == 3
+        assert not BuildError.objects.filter(fingerprint__isnull=True).exists()
+
+        result = get_top_build_events()
+        assert [(x["text"], x["count"]) for x in result["events"]] == [
+            ("<path>:<n>:<n>: error: 'x' undeclared", 2),
+            ("collect2: error: ld returned <n> exit status", 1),
+        ]
+        assert result["events"][0]["builds"] == [build.id]
+        assert BuildEventRollup.objects.get(fingerprint=first[1]).compiler == str(
+            build.spec.compiler
+        )
+        assert get_top_build_events(package="zlib")["events"] == []
+
+        response = self.client.get("/ms1/builds/events/top/", {"limit": 1})
+        assert response.status_code == 200
+        events = response.json()["events"]
+        assert len(events) == 1 and events[0]["count"] == 2
+        response = self.client.get("/ms1/builds/events/top/", {"kind": "notes"})
+        assert response.status_code == 400
+
+    def test_reparse_logs(self):
+        """Phases parsed by an older parser are parsed again, once"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        import_configuration(spec["spec"], "1.0.0")
+        result = get_build(
+            full_hash="36u22fm5i3w2tqyiyje22j6x55emekjw",
+            spack_version="1.0.0",
+            owner=self.user,
+            **fake_environment
+        )
+        build = Build.objects.get(id=result["data"]["build"]["build_id"])
+        output = FleetGenerator(seed=5, log_lines=200).phase_log(0, "build", True)
+        update_build_phase(build, "build", "FAILED", output)
+        assert not build.logs_parsed
+        parse_build_logs(build)
+        assert build.logs_parsed
+
+        phase = BuildPhase.objects.get(build=build, name="build")
+        assert phase.parser_version == LOG_PARSER_VERSION
+        events = list(BuildError.objects.filter(phase=phase).values_list("text"))
+        counts = list(BuildEventRollup.objects.values_list("fingerprint", "count"))
+        assert events and counts
+
+        # Parsing again replaces the events, and they are counted once
+        BuildPhase.objects.update(parser_version=0)
+        assert not build.logs_parsed
+        out = io.StringIO()
+        call_command("reparse_logs", workers=1, batch_size=1, stdout=out)
+        assert build.logs_parsed
+        assert list(BuildError.objects.values_list("text")) == events
+        assert (
+            list(BuildEventRollup.objects.values_list("fingerprint", "count")) == counts
+        )
+
+        # A new output makes the phase stale
+        update_build_phase(build, "build", "FAILED", "done")
+        assert not build.logs_parsed
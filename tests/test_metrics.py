@@ -0,0 +1,99 @@
+"""
+test spackmon request instrumentation
+"""
+
+from spackmon.apps.main.models import RequestProfile
+from spackmon.apps.users.models import User
+from spackmon.apps.api.metrics import registry
+from spackmon.settings import cfg
+from django.test import Client, TestCase, modify_settings
+
+
+@modify_settings(
+    MIDDLEWARE={"prepend": "spackmon.apps.api.middleware.InstrumentationMiddleware"}
+)
+class SimpleTest(TestCase):
+    def setUp(self):
+        self.enabled = cfg.ENABLE_INSTRUMENTATION
+        cfg.ENABLE_INSTRUMENTATION = True
+        registry.reset()
+        self.user = User.objects.create_user(
+            username="dinosaur", email="dinosaur@dinosaur.com", password="bigd"
+        )
+
+    def tearDown(self):
+        cfg.ENABLE_INSTRUMENTATION = self.enabled
+
+    def test_metrics(self):
+        """Requests are recorded per view and exposed to prometheus and staff"""
+        assert self.client.get("/ms1/").status_code == 200
+        view = "spackmon.apps.api.views.base.ServiceInfo"
+
+        response = self.client.get("/metrics")
+        assert response.status_code == 200
+        content = response.content.decode("utf-8")
+        assert 'spackmon_request_duration_seconds_count{view="%s"} 1' % view in content
+        assert "# TYPE spackmon_db_queries histogram" in content
+
+        # The json summary is only for staff
+        assert self.client.get("/ms1/metrics/").status_code == 403
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+        response = self.client.get("/ms1/metrics/")
+        assert response.status_code == 200
+        summary = response.json()["views"][view]
+        for metric in [
+            "request_duration_seconds",
+            "db_duration_seconds",
+            "serialization_duration_seconds",
+            "db_queries",
+        ]:
+            assert summary[metric]["count"] == 1
+
+
+@modify_settings(
+    MIDDLEWARE={"prepend": "spackmon.apps.api.middleware.ProfilingMiddleware"}
+)
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.threshold = cfg.PROFILE_SLOW_REQUESTS_SECONDS
+        cfg.PROFILE_SLOW_REQUESTS_SECONDS = 0
+        self.user = User.objects.create_user(
+            username="dinosaur", email="dinosaur@dinosaur.com", password="bigd"
+        )
+
+    def tearDown(self):
+        cfg.PROFILE_SLOW_REQUESTS_SECONDS = self.threshold
+
+    def test_profiles(self):
+        """Requests over the threshold are saved, and only staff can browse them"""
+        assert self.client.get("/ms1/", {"hello": "world"}).status_code == 200
+        profile = RequestProfile.objects.get(path="/ms1/")
+        assert profile.view_name == "spackmon.apps.api.views.base.ServiceInfo"
+        assert profile.args["query"] == {"hello": "world"}
+        assert "views/base.py" in profile.stats_text(limit=None)
+
+        url = "/ms1/profiles/%s/" % profile.id
+        assert self.client.get(url).status_code == 403
+        self.user.is_staff = True
+        self.user.save()
+        self.client.force_login(self.user)
+
+        response = self.client.get(url, {"sort": "tottime"})
+        assert response.status_code == 200
+        assert "function calls" in response.json()["stats"]
+        response = self.client.get(url + "download/")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/octet-stream"
+        assert self.client.get("/ms1/profiles/", {"limit": "x"}).status_code == 400
+
+    def test_profile_sample_rate(self):
+        """A sample rate of 0 turns profiling off"""
+        sample_rate = cfg.PROFILE_SAMPLE_RATE
+        cfg.PROFILE_SAMPLE_RATE = 0
+        try:
+            assert Client().get("/ms1/").status_code == 200
+        finally:
+            cfg.PROFILE_SAMPLE_RATE = sample_rate
+        assert not RequestProfile.objects.exists()
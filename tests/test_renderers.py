@@ -0,0 +1,184 @@
+"""
+test spackmon api response encodings, pagination and exports
+"""
+
+from spackmon.apps.api.pagination import iter_chunks
+from spackmon.apps.api.auth import generate_jwt
+from spackmon.apps.api.renderers import (
+    cbor2,
+    msgpack,
+    CBORParser,
+    CBORRenderer,
+    MsgPackParser,
+    MsgPackRenderer,
+)
+from spackmon.apps.main.models import Spec
+from spackmon.apps.main.tasks import import_configuration
+from spackmon.apps.users.models import User
+from django.test import TestCase
+from rest_framework.exceptions import ParseError
+
+from datetime import datetime, timezone
+import gzip
+import io
+import json
+import os
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+specs_dir = os.path.join(os.path.dirname(here), "specs")
+
+
+class SimpleTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="dinosaur", email="dinosaur@dinosaur.com", password="bigd"
+        )
+        with open(os.path.join(specs_dir, "singularity-3.8.0.json")) as fd:
+            self.spec = json.loads(fd.read())
+        import_configuration(self.spec, "1.0.0")
+        token = generate_jwt(self.user.username, ["build"], "http://testserver")
+        self.headers = {"HTTP_AUTHORIZATION": "Bearer %s" % token["token"]}
+
+    def check_codec(self, media_type, dumps, loads, parser, renderer, added):
+        """A spec can be sent and returned in an encoding, and the parser
+        reads what the renderer writes
+        """
+        data = {"spec": self.spec["spec"], "spack_version": "1.0.0"}
+        response = self.client.post(
+            "/ms1/specs/new/",
+            data=dumps(data),
+            content_type=media_type,
+            HTTP_ACCEPT=media_type,
+            **self.headers
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"] == media_type
+        result = loads(response.content)
+        assert result["data"]["spec"]["full_hash"] == "36u22fm5i3w2tqyiyje22j6x55emekjw"
+
+        # Dates are encoded as strings, or natively if the encoding has a type
+        data = {"name": "singularity", "added": datetime(2021, 7, 1), "size": [1, 2]}
+        content = renderer().render(data)
+        assert parser().parse(io.BytesIO(content)) == {
+            "name": "singularity",
+            "added": added,
+            "size": [1, 2],
+        }
+        with self.assertRaises(ParseError):
+            parser().parse(io.BytesIO(content[:-1]))
+
+    def test_ndjson(self):
+        """A list can be exported as newline delimited json, gzip compressed
+        if the client accepts it
+        """
+        self.client.force_login(self.user)
+        response = self.client.get(
+            "/api/specs/",
+            {"limit": 5},
+            HTTP_ACCEPT="application/x-ndjson",
+            HTTP_ACCEPT_ENCODING="gzip, deflate",
+        )
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        assert response["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in response["Vary"]
+        assert 'rel="next"' in response["Link"]
+        lines = gzip.decompress(response.content).decode("utf-8").splitlines()
+        assert len(lines) == 5
+        assert json.loads(lines[0])["label"] == "spec"
+
+        response = self.client.get(
+            "/api/specs/", {"limit": 5}, HTTP_ACCEPT="application/x-ndjson"
+        )
+        assert response.status_code == 200
+        assert not response.has_header("Content-Encoding")
+        assert response.content.decode("utf-8").splitlines() == lines
+
+        # json is still the default
+        response = self.client.get("/ms1/specs/name/singularity/")
+        assert response["Content-Type"] == "application/json"
+
+    def test_msgpack(self):
+        """msgpack is only offered (and accepted) if it is installed"""
+        response = self.client.get(
+            "/ms1/specs/name/singularity/", HTTP_ACCEPT="application/msgpack"
+        )
+        if not msgpack:
+            assert response.status_code == 406
+            return
+
+        assert response.status_code == 200
+        specs = msgpack.unpackb(response.content, raw=False)
+        assert specs[0]["name"] == "singularity"
+        assert MsgPackRenderer().render({"a": 1}) == msgpack.packb({"a": 1})
+        self.check_codec(
+            "application/msgpack",
+            msgpack.packb,
+            lambda content: msgpack.unpackb(content, raw=False),
+            MsgPackParser,
+            MsgPackRenderer,
+            added="2021-07-01T00:00:00",
+        )
+
+    @unittest.skipIf(not cbor2, "cbor2 is not installed")
+    def test_cbor(self):
+        """CBOR is offered (and accepted) if it is installed"""
+        response = self.client.get(
+            "/ms1/specs/name/singularity/", HTTP_ACCEPT="application/cbor"
+        )
+        assert response.status_code == 200
+        assert cbor2.loads(response.content)[0]["name"] == "singularity"
+        self.check_codec(
+            "application/cbor",
+            cbor2.dumps,
+            cbor2.loads,
+            CBORParser,
+            CBORRenderer,
+            added=datetime(2021, 7, 1, tzinfo=timezone.utc),
+        )
+
+    def test_export(self):
+        """Lists are paginated with a cursor, and can be exported in full"""
+        self.client.force_login(self.user)
+        ids = []
+        url = "/api/specs/?limit=20"
+        while url:
+            response = self.client.get(url)
+            assert response.status_code == 200
+            data = response.json()
+            assert "count" not in data
+            ids += [x["id"] for x in data["results"]]
+            url = data["next"]
+        assert ids == list(Spec.objects.order_by("id").values_list("id", flat=True))
+        chunks = list(iter_chunks(Spec.objects.all(), chunk_size=10))
+        assert [x.id for chunk in chunks for x in chunk] == ids
+
+        response = self.client.get("/api/specs/export/")
+        assert response.status_code == 200
+        assert response["Content-Type"] == "application/x-ndjson"
+        lines = b"".join(response.streaming_content).decode("utf-8").splitlines()
+        assert [json.loads(x)["id"] for x in lines] == ids
+
+        response = self.client.get("/api/specs/export/", HTTP_ACCEPT_ENCODING="gzip")
+        assert response["Content-Encoding"] == "gzip"
+        content = gzip.decompress(b"".join(response.streaming_content))
+        assert content.decode("utf-8").splitlines() == lines
+
+    def test_sparse_fields(self):
+        """Only the fields that are asked for are loaded and serialized"""
+        self.client.force_login(self.user)
+        response = self.client.get("/api/specs/", {"fields": "name,full_hash"})
+        assert response.status_code == 200
+        for result in response.json()["results"]:
+            assert sorted(result) == ["full_hash", "name"]
+
+        response = self.client.get(
+            "/api/specs/export/", {"omit": "parameters,dependencies"}
+        )
+        spec = json.loads(b"".join(response.streaming_content).splitlines()[0])
+        assert "parameters" not in spec and "dependencies" not in spec
+        assert "full_hash" in spec
+
+        response = self.client.get("/api/specs/", {"fields": "name,password"})
+        assert response.status_code == 400
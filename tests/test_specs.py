@@ -2,10 +2,27 @@
 test spackmon specs endpoints
 """
 
-from spackmon.apps.main.models import Spec, Dependency
+from spackmon.apps.main.models import Compiler, Spec, SpecClosure, Dependency
+from spackmon.apps.main.benchmark import FleetGenerator
+from spackmon.apps.main.graph import SpecGraph
+from spackmon.apps.main.cache import BloomFilter
+from spackmon.apps.main.tasks import (
+    add_dependencies,
+    check_dimensions,
+    check_specs,
+    dimension_cache,
+    import_configuration,
+    spec_filter,
+    update_spec_closure,
+)
 from spackmon.apps.users.models import User
+from django.core import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from unittest import mock
 
+import json
 import os
 import sys
 
@@ -136,3 +153,268 @@ class SimpleTest(TestCase):
             **headers
         )
         assert response.status_code == 200
+
+        # Clients send json without a Content-Type, or with the urllib default
+        body = json.dumps({"spec": spec["spec"], "spack_version": "1.0.0"})
+        for content_type in ["", "application/x-www-form-urlencoded"]:
+            response = self.client.post(
+                "/ms1/specs/new/", data=body, content_type=content_type, **headers
+            )
+            assert response.status_code == 200
+        response = self.client.post(
+            "/ms1/specs/new/", data="{spec", content_type="", **headers
+        )
+        assert response.status_code == 400
+
+    def test_spec_closure(self):
+        """Dependents and dependencies are found at any depth"""
+
+        def get_spec(name):
+            return Spec.objects.create(name=name, full_hash=name, spack_version="1")
+
+        # curl -> openssl -> zlib, curl -> zlib, and git -> curl
+        curl, openssl, zlib, git = [
+            get_spec(x) for x in ["curl", "openssl", "zlib", "git"]
+        ]
+        add_dependencies(git, [{"name": "curl", "full_hash": "curl", "type": ["link"]}])
+        add_dependencies(
+            curl,
+            [
+                {"name": "openssl", "full_hash": "openssl", "type": ["link"]},
+                {"name": "zlib", "full_hash": "zlib", "type": ["link"]},
+            ],
+        )
+
+        # Dependencies added later still propagate up to git and curl
+        add_dependencies(
+            openssl, [{"name": "zlib", "full_hash": "zlib", "type": ["link"]}]
+        )
+        assert SpecClosure.objects.count() == 6
+        assert [(x.name, x.depth) for x in zlib.get_dependents()] == [
+            ("curl", 1),
+            ("openssl", 1),
+            ("git", 2),
+        ]
+        assert [x.name for x in zlib.get_needed_by()] == ["curl", "openssl"]
+
+        response = self.client.get("/ms1/specs/%s/dependencies/" % git.id)
+        assert response.status_code == 200
+        assert [(x["name"], x["depth"]) for x in response.json()] == [
+            ("curl", 1),
+            ("openssl", 2),
+            ("zlib", 2),
+        ]
+        response = self.client.get("/ms1/specs/%s/dependents/" % zlib.id, {"depth": 1})
+        assert [x["name"] for x in response.json()] == ["curl", "openssl"]
+        assert self.client.get("/ms1/specs/1000/dependents/").status_code == 404
+
+        # Updating the closure again (e.g., two imports of a spec) is a no-op
+        fields = ["ancestor", "descendant", "depth"]
+        closure = set(SpecClosure.objects.values_list(*fields))
+        update_spec_closure(openssl, [zlib])
+        update_spec_closure(openssl, [zlib])
+        assert set(SpecClosure.objects.values_list(*fields)) == closure
+
+        # If another import adds rows first (with a longer path), they are kept
+        # once and given the shortest depth
+        SpecClosure.objects.all().delete()
+        bulk_create = SpecClosure.objects.bulk_create
+
+        def concurrent_bulk_create(objs, **kwargs):
+            bulk_create([SpecClosure(ancestor=git, descendant=zlib, depth=5)])
+            return bulk_create(objs, **kwargs)
+
+        update_spec_closure(git, [curl])
+        with mock.patch.object(
+            SpecClosure.objects, "bulk_create", side_effect=concurrent_bulk_create
+        ):
+            update_spec_closure(curl, [openssl, zlib])
+        assert SpecClosure.objects.get(ancestor=git, descendant=zlib).depth == 2
+
+    def test_spec_graph(self):
+        """A spec graph serializes a whole DAG with a fixed number of queries"""
+        spec = read_json(os.path.join(specs_dir, "singularity-3.8.0.json"))
+        singularity = import_configuration(spec["spec"], "1.0.0")["data"]["spec"]
+
+        # The closure, specs, target features and parents, and dependencies
+        with self.assertNumQueries(5):
+            graph = SpecGraph([singularity])
+            documents = [graph.to_dict(x, include_deps=True) for x in graph]
+        assert len(documents) == singularity.get_dependencies().count() + 1
+        assert graph.to_dict(singularity) == singularity.to_dict()
+        assert graph.to_dict_ids(singularity) == singularity.to_dict_ids()
+
+        with self.assertNumQueries(5):
+            result = singularity.to_dict(include_deps=True)
+        assert set(result) == {"singularity"} | set(singularity.list_dependencies())
+        response = self.client.get("/specs/detail/%s" % singularity.id)
+        assert response.status_code == 200
+        assert response.context["spec_json"] == singularity.to_json()
+
+    def test_spec_nodes(self):
+        """A spec exported in the nodes format can be imported again"""
+        cache.caches["spackmon_api"].clear()
+        fleet = FleetGenerator(seed=3, specs=4)
+        nodes = fleet.spec(0)["spec"]["nodes"]
+        root = import_configuration(fleet.spec(0), "1.0.0")["data"]["spec"]
+
+        response = self.client.get("/ms1/specs/%s/nodes/" % root.id)
+        assert response.status_code == 200
+        assert response.streaming
+        exported = json.loads(b"".join(response.streaming_content))
+        assert exported["spec"]["nodes"][0]["full_hash"] == root.full_hash
+        assert sorted(x["full_hash"] for x in exported["spec"]["nodes"]) == sorted(
+            x["full_hash"] for x in nodes
+        )
+        for node in exported["spec"]["nodes"]:
+            original = [x for x in nodes if x["full_hash"] == node["full_hash"]][0]
+            for key in ["name", "version", "arch", "compiler", "build_hash"]:
+                assert node[key] == original[key]
+            assert sorted(node.get("dependencies", []), key=str) == sorted(
+                original["dependencies"], key=str
+            )
+
+        # The second export is cached, until a spec in the graph changes
+        url = "/ms1/specs/hash/%s/nodes/" % root.full_hash
+        response = self.client.get(url)
+        assert not response.streaming
+        assert response.json() == exported
+        dependency = Spec.objects.get(full_hash=nodes[-1]["full_hash"])
+        dependency.version = "0.0.0"
+        dependency.save()
+        assert self.client.get(url).streaming
+
+        # The export imports into the same specs
+        Spec.objects.all().delete()
+        spec = import_configuration(exported, "1.0.0")["data"]["spec"]
+        assert spec.full_hash == root.full_hash
+        assert Spec.objects.count() == len(nodes)
+        assert self.client.get("/ms1/specs/hash/doesnotexist/nodes/").status_code == 404
+
+    def test_conditional_get(self):
+        """Spec endpoints return an etag, and 304 when it still matches"""
+        fleet = FleetGenerator(seed=3, specs=2)
+        root = import_configuration(fleet.spec(0), "1.0.0")["data"]["spec"]
+        url = "/ms1/specs/name/%s/" % root.name
+
+        response = self.client.get(url)
+        assert response.status_code == 200
+        assert response["ETag"] and response["Last-Modified"]
+        assert "public" in response["Cache-Control"]
+        assert "Accept" in response["Vary"]
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+        assert not response.content
+
+        # Another media type or an updated spec has a different etag
+        response = self.client.get(url, HTTP_ACCEPT="application/x-ndjson")
+        assert response["ETag"] != etag
+        root.version = "0.0.0"
+        root.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response.json()[0]["version"] == "0.0.0"
+
+    def test_check_specs(self):
+        """Only the specs that we don't have are reported missing"""
+        bloom = BloomFilter(capacity=100)
+        for i in range(100):
+            bloom.add("spec-%s" % i)
+        assert all("spec-%s" % i in bloom for i in range(100))
+        assert sum("other-%s" % i in bloom for i in range(1000)) < 50
+
+        fleet = FleetGenerator(seed=3, specs=2)
+        nodes = fleet.spec(0)["spec"]["nodes"]
+        import_configuration(fleet.spec(0), "1.0.0")
+        specs = [{"full_hash": x["full_hash"], "spack_version": "1.0.0"} for x in nodes]
+        specs += [
+            {"full_hash": nodes[0]["full_hash"], "spack_version": "2.0.0"},
+            {"full_hash": "doesnotexist", "spack_version": "1.0.0"},
+        ]
+
+        # The filter is built once, and then the existing specs are one query
+        spec_filter["filter"] = None
+        check_specs(specs)
+        with self.assertNumQueries(1):
+            result = check_specs(specs)
+        assert result["code"] == 200
+        assert result["data"]["missing"] == specs[-2:]
+        with self.assertNumQueries(0):
+            assert check_specs(specs[-1:])["data"]["missing"] == specs[-1:]
+        assert check_specs([{"full_hash": "doesnotexist"}])["code"] == 400
+        assert check_specs(specs * 5000)["code"] == 400
+
+        # Specs added by another worker are read when the filter expires,
+        # without scanning all of the specs again
+        bloom = spec_filter["filter"]
+        import_configuration(fleet.spec(1), "1.0.0")
+        specs = [
+            {"full_hash": x["full_hash"], "spack_version": "1.0.0"}
+            for x in fleet.spec(1)["spec"]["nodes"]
+        ]
+        spec_filter["expires_at"] = 0
+        with CaptureQueriesContext(connection) as context:
+            assert check_specs(specs)["data"]["missing"] == []
+        assert spec_filter["filter"] is bloom
+        assert '"main_spec"."id" >' in context.captured_queries[0]["sql"]
+
+        # Checking specs requires a token
+        response = self.client.post(
+            "/ms1/specs/exists/", data={"specs": specs}, content_type="application/json"
+        )
+        assert response.status_code == 401
+
+    def test_dimension_cache(self):
+        """Once targets, architectures and compilers are interned, ingest
+        doesn't look them up again, until one of them changes
+        """
+        check_dimensions()
+        dimension_cache.clear()
+        fleet = FleetGenerator(seed=3, specs=4)
+        with self.captureOnCommitCallbacks(execute=True):
+            import_configuration(fleet.spec(0), "1.0.0")
+        assert len(dimension_cache) > 0
+
+        # e.g., a new build for the spec uploads it again
+        with CaptureQueriesContext(connection) as context:
+            import_configuration(fleet.spec(0), "1.0.0")
+        tables = ["main_target", "main_feature", "main_architecture", "main_compiler"]
+        queries = " ".join(x["sql"] for x in context.captured_queries)
+        assert not any('"%s"' % table in queries for table in tables)
+
+        # Changing a compiler drops what every worker has interned
+        compiler = Compiler.objects.first()
+        compiler.version = "0.0.0"
+        compiler.save()
+        check_dimensions()
+        assert len(dimension_cache) == 0
+
+    def test_spec_search(self):
+        """Specs are found by a name and/or full hash prefix"""
+        fleet = FleetGenerator(seed=3, specs=4)
+        for i in range(4):
+            import_configuration(fleet.spec(i), "1.0.0")
+        spec = Spec.objects.order_by("full_hash").last()
+
+        response = self.client.get("/ms1/specs/search/", {"q": spec.name[:2]})
+        assert response.status_code == 200
+        names = [x["name"] for x in response.json()]
+        assert names and all(x.startswith(spec.name[:2]) for x in names)
+        assert names == sorted(names)
+
+        query = "%s/%s" % (spec.name, spec.full_hash[:6].upper())
+        response = self.client.get("/ms1/specs/search/", {"q": query})
+        assert [x["id"] for x in response.json()] == [spec.id]
+        response = self.client.get("/ms1/specs/search/", {"q": "/" + spec.full_hash})
+        assert response.json()[0]["label"].startswith(spec.pretty_print())
+
+        response = self.client.get("/ms1/specs/search/", {"q": "/", "limit": 2})
+        assert response.json() == []
+        response = self.client.get("/ms1/specs/search/", {"q": "a", "limit": "x"})
+        assert response.status_code == 400
+        assert Spec.objects.count() > 2
+        response = self.client.get("/ms1/specs/search/", {"q": spec.name, "limit": 1})
+        assert len(response.json()) == 1
+        assert self.client.get("/specs/diff/").status_code == 200